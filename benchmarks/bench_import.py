@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+
+Measure the import time of the utils modules and the construction time of
+CovidCountry in fresh interpreters, and check that no heavy module
+(matplotlib, scipy, pandas) nor the http stack (utils.fetcher, ssl) is
+imported before it is needed.
+
+usage: python -m benchmarks.bench_import [repeats]
+"""
+import sys
+import json
+import subprocess
+
+
+# modules that must stay importable without the plotting/fitting stack
+MODULES = ["utils", "utils.dataproc", "utils.metrics", "utils.smoothing", "utils.logisticfit",
+           "utils.sirfit", "utils.sircalib", "utils.compartmental", "utils.stochastic", "utils.rt", "utils.covid_country"]
+HEAVY = ("matplotlib", "scipy", "pandas")
+# only needed once a file is downloaded
+NETWORK = ("utils.fetcher", "ssl")
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter() - start
+construct = None
+if "{module}" == "utils.covid_country":
+    start = time.perf_counter()
+    utils.covid_country.CovidCountry("Tunisia")
+    construct = time.perf_counter() - start
+heavy = sorted({{m.split(".")[0] for m in sys.modules}} & set({heavy!r}))
+network = sorted(set(sys.modules) & set({network!r}))
+print(json.dumps({{"import": imported, "construct": construct, "heavy": heavy + network}}))
+"""
+
+
+def probe(module):
+    """
+    Import a module in a fresh interpreter.
+
+    Parameters
+    ----------
+    module : str
+        Module name.
+
+    Returns
+    -------
+    result : dict
+        Import time, construction time (covid_country) and the heavy or network modules loaded.
+    """
+    output = subprocess.check_output([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY, network=NETWORK)])
+    return json.loads(output)
+
+
+def main(argv=None):
+    """
+    Probe every module and report the import times.
+
+    Parameters
+    ----------
+    argv : list, optional
+        Command line arguments: [repeats]. The default is None (5 repeats).
+
+    Returns
+    -------
+    failed : bool
+        Boolean describing whether a module imported a heavy or network module eagerly.
+    """
+    repeats = int(argv[0]) if argv else 5
+
+    # numpy is the baseline every module pays
+    baseline = min(json.loads(subprocess.check_output([sys.executable, "-c",
+                   "import time, json; s = time.perf_counter(); import numpy; print(json.dumps(time.perf_counter() - s))"]))
+                   for _ in range(repeats))
+    print("%-22s %8.1f ms" % ("numpy (baseline)", 1e3 * baseline))
+
+    failed = False
+    for module in MODULES:
+        results = [probe(module) for _ in range(repeats)]
+        line = "%-22s %8.1f ms" % (module, 1e3 * min(r["import"] for r in results))
+        if results[0]["construct"] is not None:
+            line += "   CovidCountry() %.3f ms" % (1e3 * min(r["construct"] for r in results))
+        if results[0]["heavy"]:
+            line += "   eager imports: " + ", ".join(results[0]["heavy"])
+            failed = True
+        print(line)
+
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main(sys.argv[1:]) else 0)
@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+
+Benchmark the all-countries metrics engine against the per-country methods
+(their results are checked against the original implementation in tests/test_metrics.py).
+
+usage: python -m benchmarks.bench_metrics [confirmed.csv deaths.csv recovered.csv]
+"""
+import sys
+import time
+from utils import dataproc
+from utils.metrics import compute_metrics
+from utils.covid_country import CovidCountry
+
+
+def main(argv=None):
+    """
+    Time the per-country methods and the batch engine over all the countries.
+
+    Parameters
+    ----------
+    argv : list, optional
+        Command line arguments: [confirmed.csv deaths.csv recovered.csv]. The default is None (data_urls).
+    """
+    if argv and len(argv) == 3:
+        dataproc.data_urls.update(confirmed_cases=argv[0], death_cases=argv[1],
+                                  recovered_cases=argv[2])
+
+    # load the world data once (shared by all the countries)
+    cubes = dataproc.get_dataset().cubes()
+    countries = list(cubes["confirmed_cases"].countries)
+    print("countries x dates:", cubes["confirmed_cases"].shape)
+
+    # per-country methods
+    start = time.perf_counter()
+    per_country = {}
+    for country in countries:
+        cc = CovidCountry(country=country)
+        cc.parse_data()
+        cc.compute_death_rate(plot=False)
+        cc.compute_recovery_rate(plot=False)
+        cc.compute_daily_growth(plot=False)
+        cc.compute_growth_factor(smooth=False, plot=False)
+        per_country[country] = cc.covid_df
+    loop_time = time.perf_counter() - start
+
+    # batch engine
+    start = time.perf_counter()
+    batch = compute_metrics(cubes["confirmed_cases"].values, cubes["death_cases"].values,
+                            cubes["recovered_cases"].values)
+    batch_time = time.perf_counter() - start
+
+    print("per-country: %.4f s" % loop_time)
+    print("batch      : %.4f s" % batch_time)
+    print("speedup    : %.1fx" % (loop_time / batch_time))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+
+Compare the derivative (RHS) and jacobian evaluations and the integration time
+of SirFit.fit (odeint without Dfun) with the compartmental models (analytic
+jacobian, vectorized ensembles): single models, a stiff SEIRD (fast incubation)
+and an ensemble of SIR models against one SirFit per member.
+
+The non-stiff SIR never reaches the jacobian (LSODA stays in its Adams mode, nje = 0):
+the single SIR model makes the same derivative evaluations as SirFit.fit. The
+analytic jacobian only saves evaluations on the stiff model, the ensemble saves
+the per-model overhead.
+
+usage: python -m benchmarks.bench_ode [repeats] [members]
+"""
+import sys
+import time
+import numpy as np
+from scipy.integrate import odeint
+from utils.sirfit import SirFit
+from utils.compartmental import SirModel, SeirModel, SeirdModel
+
+
+def best_time(run, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def finite_differences(model):
+    """
+    Integrate a model the way SirFit does: no Dfun, LSODA falls back to finite differences.
+    """
+    k = len(model.compartments)
+    banded = {} if model.single else {"ml": k - 1, "mu": k - 1}
+    _, info = odeint(model.rhs, model.y0, model.t, full_output=True, **banded)
+    return int(info["nfe"][-1]), int(info["nje"][-1])
+
+
+def sirfit_counts(fit):
+    _, info = odeint(fit.deriv, (fit.S0, fit.I0, fit.R0), fit.t, args=(fit.N, fit.beta, fit.gamma), full_output=True)
+    return int(info["nfe"][-1]), int(info["nje"][-1])
+
+
+def row(name, nfe, nje, seconds):
+    print("%-40s %8d %6d %12.3f" % (name, nfe, nje, 1e3 * seconds))
+
+
+def main(argv=()):
+    """
+    Print the evaluation counts and best integration times of every case.
+
+    Parameters
+    ----------
+    argv : list, optional
+        Command line arguments: [repeats] [members]. The default is () (20 repeats, 200 members).
+    """
+    repeats = int(argv[0]) if len(argv) > 0 else 20
+    members = int(argv[1]) if len(argv) > 1 else 200
+    print("%-40s %8s %6s %12s" % ("case", "nfe", "nje", "best (ms)"))
+
+    # single models on the main.py parameters
+    args = (12000000, 5000, 1000, .5, 1 / 14, 120)
+    fit = SirFit(*args)
+    row("SirFit.fit", *sirfit_counts(fit), best_time(fit.fit, repeats))
+    for model in (SirModel(*args), SeirModel(*args, E0=3000), SeirdModel(*args, E0=3000, D0=50)):
+        model.fit()
+        row(type(model).__name__ + ".fit", model.nfe, model.nje, best_time(model.fit, repeats))
+
+    # stiff model: hours long incubation, LSODA switches to BDF and needs jacobians
+    stiff = SeirdModel(12000000, 5000, 1000, .5, 1 / 14, 365, E0=100, incubation_rate=50, death_rate=0.002)
+    row("stiff SeirdModel, finite differences", *finite_differences(stiff), best_time(lambda: finite_differences(stiff), repeats))
+    stiff.fit()
+    row("stiff SeirdModel, analytic jacobian", stiff.nfe, stiff.nje, best_time(stiff.fit, repeats))
+
+    # ensemble: one SirFit per member against one vectorized integration
+    rng = np.random.default_rng(0)
+    I0, beta, gamma = rng.uniform(10, 1e4, members), rng.uniform(.1, 1, members), rng.uniform(1 / 21, 1 / 5, members)
+    fits = [SirFit(12000000, I0[i], 0, beta[i], gamma[i], 120) for i in range(members)]
+    counts = np.sum([sirfit_counts(f) for f in fits], axis=0)
+    row("%d x SirFit.fit" % members, counts[0], counts[1], best_time(lambda: [f.fit() for f in fits], max(1, repeats // 10)))
+    ensemble = SirModel(12000000, I0, 0, beta, gamma, 120)
+    ensemble.fit()
+    row("SirModel ensemble of %d" % members, ensemble.nfe, ensemble.nje, best_time(ensemble.fit, max(1, repeats // 10)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
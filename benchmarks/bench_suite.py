@@ -0,0 +1,349 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+
+Time every stage of the pipeline (read, cube build, long view, parse_data,
+compute_* metrics, Rt, logistic fit, SIR integration and calibration, rendering) on synthetic CSSE
+fixtures, track the peak memory of each stage and save the results as json.
+
+usage: python -m benchmarks.bench_suite [--scale real|small|medium|large | --regions N --days N]
+                                        [--stages read,cube,...] [--repeat N] [--countries N]
+                                        [--fixtures DIR] [--out results.json] [--compare old.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import numpy as np
+from benchmarks.fixtures import SCALES, make_csse
+
+
+def _reset(paths):
+    """
+    Fresh process-wide state: dataset on the fixtures, empty smoothing cache.
+    """
+    from utils import dataproc, smoothing
+    dataproc.data_urls.update(paths)
+    dataproc.reset_dataset()
+    smoothing.clear_cache()
+
+
+def _countries(paths, n):
+    from utils import dataproc
+    _reset(paths)
+    return [str(c) for c in dataproc.get_dataset().cube("confirmed_cases").countries[:n]]
+
+
+def _country_objects(paths, countries):
+    """
+    CovidCountry objects on a loaded dataset (data parsed outside of the timed stage).
+    """
+    from utils import dataproc
+    from utils.covid_country import CovidCountry
+    _reset(paths)
+    dataproc.get_dataset().cubes()
+    objects = [CovidCountry(country) for country in countries]
+    for cc in objects:
+        cc.parse_data()
+    return objects
+
+
+def stage_read(paths, countries):
+    import pandas as pd
+    return lambda: [pd.read_csv(path) for path in paths.values()]
+
+
+def stage_cube(paths, countries):
+    import pandas as pd
+    from utils.datacube import cube_from_csse
+    frames = [pd.read_csv(path) for path in paths.values()]
+    return lambda: [cube_from_csse(df) for df in frames]
+
+
+def stage_melt(paths, countries):
+    from utils import dataproc
+    _reset(paths)
+    cubes = dataproc.get_dataset().cubes()
+    return lambda: [cube.to_long() for cube in cubes.values()]
+
+
+def stage_load(paths, countries):
+    from utils import dataproc
+
+    def run():
+        _reset(paths)
+        return dataproc.get_dataset().cubes()
+    return run
+
+
+def stage_parse_data(paths, countries):
+    from utils import dataproc
+    from utils.covid_country import CovidCountry
+    _reset(paths)
+    dataproc.get_dataset().cubes()
+    return lambda: [CovidCountry(country).parse_data() for country in countries]
+
+
+def _metric_stage(method, **kwargs):
+    def stage(paths, countries):
+        from utils import smoothing
+        objects = _country_objects(paths, countries)
+
+        def run():
+            smoothing.clear_cache()
+            for cc in objects:
+                cc.invalidate()
+            return [getattr(cc, method)(plot=False, **kwargs) for cc in objects]
+        return run
+    return stage
+
+
+def stage_metrics_batch(paths, countries):
+    from utils import dataproc
+    from utils.metrics import compute_metrics
+    _reset(paths)
+    cubes = dataproc.get_dataset().cubes()
+    values = [np.asarray(cubes[t].values) for t in ("confirmed_cases", "death_cases", "recovered_cases")]
+    return lambda: compute_metrics(*values)
+
+
+def stage_estimation_sweep(paths, countries):
+    from utils import dataproc
+    from utils.metrics import sweep_estimated_cases
+    _reset(paths)
+    cubes = dataproc.get_dataset().cubes()
+    values = [np.asarray(cubes[t].values) for t in ("confirmed_cases", "death_cases")]
+    return lambda: sweep_estimated_cases(*values, g=np.linspace(0, 0.3, 20), j=np.arange(1, 21))
+
+
+def stage_rt(paths, countries):
+    from utils import dataproc, rt
+    from utils.metrics import compute_new_cases
+    _reset(paths)
+    incidence = compute_new_cases(dataproc.get_dataset().cube("confirmed_cases").values)
+    return lambda: rt.estimate_rt(incidence)
+
+
+def stage_logistic_fit(paths, countries):
+    from utils.logisticfit import LogisticFit
+    objects = _country_objects(paths, countries)
+    series = [cc.covid_df["confirmed_cases"].values for cc in objects]
+
+    def run():
+        fits = [LogisticFit(np.arange(len(y)), y) for y in series]
+        for fit in fits:
+            fit.fit_data()
+        return fits
+    return run
+
+
+def stage_logistic_refit(paths, countries):
+    from utils.logisticfit import LogisticFit
+    objects = _country_objects(paths, countries)
+    series = [cc.covid_df["confirmed_cases"].values for cc in objects]
+
+    # states of the fits of the day before
+    states = []
+    for y in series:
+        fit = LogisticFit(np.arange(len(y) - 1), y[:-1])
+        fit.fit_data()
+        states.append(fit.state())
+
+    def run():
+        fits = [LogisticFit(np.arange(len(y)), y) for y in series]
+        for fit, state in zip(fits, states):
+            fit.fit_data(state)
+        return fits
+    return run
+
+
+def stage_logistic_bootstrap(paths, countries):
+    from utils.logisticfit import LogisticFit
+    objects = _country_objects(paths, countries[:1])
+    y = objects[0].covid_df["confirmed_cases"].values
+    fit = LogisticFit(np.arange(len(y)), y)
+    fit.fit_data()
+    return lambda: fit.bootstrap(1000, seed=0)
+
+
+def stage_sir(paths, countries):
+    from utils.sirfit import SirFit
+    objects = _country_objects(paths, countries)
+    starts = [(cc.covid_df["confirmed_cases"].values[-1], cc.covid_df["recovered_cases"].values[-1])
+              for cc in objects]
+    return lambda: [SirFit(12000000, I0, R0, .5, 1 / 14, 120).fit() for I0, R0 in starts]
+
+
+def stage_sir_ensemble(paths, countries):
+    from utils.sirfit import SirEnsemble
+    objects = _country_objects(paths, countries)
+    I0 = [cc.covid_df["confirmed_cases"].values[-1] for cc in objects]
+    R0 = [cc.covid_df["recovered_cases"].values[-1] for cc in objects]
+    return lambda: SirEnsemble(12000000, I0, R0, .5, 1 / 14, 120).fit()
+
+
+def stage_sir_calibrate(paths, countries):
+    from utils.sircalib import calibrate_country
+    objects = _country_objects(paths, countries)
+    return lambda: [calibrate_country(cc.covid_df, 12000000) for cc in objects]
+
+
+def stage_sir_stochastic(paths, countries):
+    from utils.stochastic import StochasticSir
+    return lambda: StochasticSir(12000000, 10, 0, .5, 1 / 14, 120, n_runs=10000, seed=0).simulate()
+
+
+def stage_render(paths, countries):
+    from utils import dataproc
+    from utils.render import render_charts
+    _reset(paths)
+    dataproc.get_dataset().cubes()
+    out_dir = tempfile.mkdtemp(prefix="covid-bench-")
+    return lambda: render_charts(out_dir, countries=countries, world_countries=countries, processes=1)
+
+
+# stage name -> factory(paths, countries) returning the timed function
+STAGES = {"read"                 : stage_read,
+          "cube"                 : stage_cube,
+          "melt"                 : stage_melt,
+          "load"                 : stage_load,
+          "parse_data"           : stage_parse_data,
+          "compute_death_rate"   : _metric_stage("compute_death_rate"),
+          "compute_recovery_rate": _metric_stage("compute_recovery_rate"),
+          "compute_estimations"  : _metric_stage("compute_estimations"),
+          "compute_daily_growth" : _metric_stage("compute_daily_growth"),
+          "compute_growth_factor": _metric_stage("compute_growth_factor"),
+          "metrics_batch"        : stage_metrics_batch,
+          "estimation_sweep"     : stage_estimation_sweep,
+          "rt"                   : stage_rt,
+          "logistic_fit"         : stage_logistic_fit,
+          "logistic_refit"       : stage_logistic_refit,
+          "logistic_bootstrap"   : stage_logistic_bootstrap,
+          "sir"                  : stage_sir,
+          "sir_ensemble"         : stage_sir_ensemble,
+          "sir_calibrate"        : stage_sir_calibrate,
+          "sir_stochastic"       : stage_sir_stochastic,
+          "render"               : stage_render}
+
+
+def run_stage(factory, paths, countries, repeat=3):
+    """
+    Time a stage (best of repeat after a warm-up run) and measure its peak traced memory in a separate run.
+
+    Parameters
+    ----------
+    factory : function
+        Stage factory.
+    paths : dict
+        Fixture path per data type.
+    countries : list
+        Countries the per-country stages run on.
+    repeat : int, optional
+        Number of timed runs. The default is 3.
+
+    Returns
+    -------
+    result : dict
+        Run times, best time and peak memory in bytes.
+    """
+    run = factory(paths, countries)
+
+    # warm-up: lazy imports and first-call caches are not part of the stage
+    run()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    # memory on its own run: tracing slows the allocations down
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(times), "runs": times, "peak_bytes": peak}
+
+
+def environment():
+    """
+    Describe the machine and the code version the results were measured on.
+    """
+    import pandas as pd
+    import scipy
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "scipy": scipy.__version__, "platform": platform.platform(), "cpus": os.cpu_count(),
+            "commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(results, previous):
+    """
+    Print the time and memory ratios of the results over previous ones.
+    """
+    print("\n%-22s %10s %10s %8s %10s" % ("stage", "old (s)", "new (s)", "ratio", "mem ratio"))
+    for name, new in results["stages"].items():
+        old = previous["stages"].get(name)
+        if old is None:
+            continue
+        print("%-22s %10.4f %10.4f %7.2fx %9.2fx" % (name, old["seconds"], new["seconds"],
+                                                     new["seconds"] / max(old["seconds"], 1e-12),
+                                                     new["peak_bytes"] / max(old["peak_bytes"], 1)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="COVID-19-study pipeline benchmarks")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="real")
+    parser.add_argument("--regions", type=int, help="number of CSV rows (overrides --scale)")
+    parser.add_argument("--days", type=int, help="number of date columns (overrides --scale)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma separated stages")
+    parser.add_argument("--countries", type=int, default=10, help="countries of the per-country stages")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fixtures", default=os.path.join(tempfile.gettempdir(), "covid-bench-fixtures"))
+    parser.add_argument("--out", help="json results file")
+    parser.add_argument("--compare", help="previous json results file")
+    args = parser.parse_args(argv)
+
+    regions, days = SCALES[args.scale]
+    regions, days = args.regions or regions, args.days or days
+
+    # fixtures (reused across runs)
+    start = time.perf_counter()
+    paths = make_csse(args.fixtures, regions, days, seed=args.seed)
+    print("fixtures: %d regions x %d days (%.1f s)" % (regions, days, time.perf_counter() - start))
+
+    countries = _countries(paths, args.countries)
+    results = {"environment": environment(),
+               "scale": {"regions": regions, "days": days, "seed": args.seed, "countries": len(countries)},
+               "stages": {}}
+
+    print("%-22s %10s %12s" % ("stage", "best (s)", "peak (MiB)"))
+    for name in args.stages.split(","):
+        result = run_stage(STAGES[name], paths, countries, args.repeat)
+        results["stages"][name] = result
+        print("%-22s %10.4f %12.1f" % (name, result["seconds"], result["peak_bytes"] / 2 ** 20))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare(results, json.load(f))
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
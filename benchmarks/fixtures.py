@@ -0,0 +1,149 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+
+Synthetic CSSE time-series CSVs (confirmed, deaths, recovered) at any scale,
+generated offline and deterministically from a seed.
+
+usage: python -m benchmarks.fixtures out_dir [regions days]
+"""
+import os
+import sys
+import datetime
+import numpy as np
+
+
+# named scales: (regions, days), "real" is about the size of the CSSE global files
+SCALES = {"real"  : (280, 1100),
+          "small" : (1000, 1000),
+          "medium": (10000, 2000),
+          "large" : (50000, 5000)}
+
+DATA_TYPES = ("confirmed_cases", "death_cases", "recovered_cases")
+
+# real country names first, so that the usual examples work on the fixtures
+COUNTRIES = ["Tunisia", "Germany", "US", "Italy", "France", "Spain", "China", "Iran",
+             "Algeria", "Sweden", "Turkey", "United Kingdom"]
+
+
+def csse_dates(n_days, start=datetime.date(2020, 1, 22)):
+    """
+    CSSE date headers (month/day/two-digit year) of n_days consecutive days.
+
+    Parameters
+    ----------
+    n_days : int
+        Number of days.
+    start : datetime.date, optional
+        First day. The default is 2020-01-22 (first CSSE day).
+
+    Returns
+    -------
+    list
+        Date headers.
+    """
+    days = (start + datetime.timedelta(d) for d in range(n_days))
+    return ["%d/%d/%02d" % (d.month, d.day, d.year % 100) for d in days]
+
+
+def _keys(n_regions, n_countries):
+    """
+    (Province/State, Country/Region) keys: the first rows of a country have provinces.
+    """
+    countries = COUNTRIES + ["Country %d" % i for i in range(len(COUNTRIES), n_countries)]
+    country = np.arange(n_regions) % n_countries
+    rank = np.arange(n_regions) // n_countries
+    provinces = ["" if r == 0 else "Province %d" % r for r in rank]
+    return provinces, [countries[c] for c in country]
+
+
+def _curves(rng, n_days, rows):
+    """
+    Cumulative case curves of some regions: noisy logistic waves.
+
+    Returns
+    -------
+    confirmed, deaths, recovered : numpy.ndarray
+        Cumulative counts (rows x days).
+    """
+    t = np.arange(n_days)
+    n = len(rows)
+
+    # one to three waves per region
+    size = rng.lognormal(8, 2, (n, 3)) * (rng.random((n, 3)) < [1, .6, .3])
+    center = rng.uniform(30, max(31, n_days - 30), (n, 3))
+    speed = rng.uniform(0.05, 0.3, (n, 3))
+    with np.errstate(over="ignore"):
+        waves = size[:, :, None] / (1 + np.exp(-speed[:, :, None] * (t - center[:, :, None])))
+    expected = np.diff(waves.sum(axis=1), axis=1, prepend=0)
+
+    # daily counts: poisson noise, deaths and recoveries delayed fractions
+    new = rng.poisson(np.maximum(expected, 0))
+    confirmed = np.cumsum(new, axis=1)
+    deaths = np.cumsum(rng.binomial(new, rng.uniform(0.005, 0.05, (n, 1))), axis=1)
+    recovered = np.zeros_like(confirmed)
+    recovered[:, 14:] = (confirmed[:, :-14] * rng.uniform(0.5, 0.95, (n, 1))).astype(confirmed.dtype)
+    return confirmed, deaths, recovered
+
+
+def make_csse(out_dir, n_regions=280, n_days=1100, n_countries=None, seed=0, chunk=1000):
+    """
+    Write the three CSSE time-series CSVs, rows generated and written in chunks.
+
+    Parameters
+    ----------
+    out_dir : str
+        Output directory.
+    n_regions : int, optional
+        Number of rows (regions). The default is 280.
+    n_days : int, optional
+        Number of date columns. The default is 1100.
+    n_countries : int, optional
+        Number of countries. The default is None (about 190, at most n_regions).
+    seed : int, optional
+        Random seed. The default is 0.
+    chunk : int, optional
+        Number of rows generated at once. The default is 1000.
+
+    Returns
+    -------
+    paths : dict
+        Path per data type.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    n_countries = min(n_regions, 190) if n_countries is None else n_countries
+    paths = {t: os.path.join(out_dir, "%s_%dx%d_%d.csv" % (t, n_regions, n_days, seed)) for t in DATA_TYPES}
+    if all(os.path.exists(p) for p in paths.values()):
+        return paths
+
+    rng = np.random.default_rng(seed)
+    provinces, countries = _keys(n_regions, n_countries)
+    header = ",".join(["Province/State", "Country/Region", "Lat", "Long"] + csse_dates(n_days)) + "\n"
+
+    files = {t: open(paths[t] + ".tmp", "w") for t in DATA_TYPES}
+    try:
+        for f in files.values():
+            f.write(header)
+
+        for start in range(0, n_regions, chunk):
+            rows = range(start, min(start + chunk, n_regions))
+            keys = ['"%s","%s",0.0,0.0,' % (provinces[i], countries[i]) for i in rows]
+            for data_type, values in zip(DATA_TYPES, _curves(rng, n_days, rows)):
+                lines = [key + ",".join(map(str, row)) for key, row in zip(keys, values.tolist())]
+                files[data_type].write("\n".join(lines) + "\n")
+    finally:
+        for f in files.values():
+            f.close()
+
+    for data_type, path in paths.items():
+        os.replace(path + ".tmp", path)
+    return paths
+
+
+if __name__ == "__main__":
+    regions, days = (int(sys.argv[2]), int(sys.argv[3])) if len(sys.argv) > 3 else SCALES["real"]
+    for data_type, path in make_csse(sys.argv[1], regions, days).items():
+        print(data_type, path)
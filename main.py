@@ -11,7 +11,7 @@ import matplotlib
 import pandas as pd
 import arabic_reshaper
 import matplotlib.pyplot as plt
-from utils.sirfit import SirFit
+from utils.sirfit import SirEnsemble
 from bidi import algorithm as bidialg
 from utils.covid_world import CovidWorld
 from utils.covid_country import CovidCountry
@@ -27,7 +27,6 @@ pd.set_option('expand_frame_repr', False)
 
 # world 
 world = CovidWorld()
-world.parse_data()
 
 # define list of dates
 num_of_days = 7
@@ -37,7 +36,6 @@ dates_list = [base + datetime.timedelta(days=x) for x in range(num_of_days)]
 
 for date in dates_list:
     try:
-        world.parse_data()
         world.plot_countries(filter_date=str(date.date()),
                              filter_countries=["Algeria", "Iran", "Sweden", "China", "Italy",
                                                "France", "Spain", "Tunisia", "Turkey",
@@ -55,7 +53,6 @@ dates_list = [base + datetime.timedelta(days=x) for x in range(num_of_days)]
 
 for date in dates_list:
     try:
-        world.parse_data()
         world.plot_countries(filter_date=str(date.date()),
                              filter_countries=["Algeria", "Iran", "Sweden", "China", "Italy",
                                                "France", "Spain", "Tunisia", "Turkey",
@@ -83,18 +80,19 @@ tn.compute_growth_factor(smooth=False, plot=True, title=bidialg.get_display(arab
 
 # modelling and fits
 # logistic curve model
-tn.logisitc_fit(p0=[0, 1, 1, 1], plot=True, title='Least-squares 4PL fit to covid-19 data for Tunisia')
+lgf = tn.logisitc_fit(plot=True, title='Least-squares 4PL fit to covid-19 data for Tunisia')
+print("4PL fit: %d function evaluations" % lgf.nfev)
 plt.show()
 
 
 # SIR model
-ij = list(zip(tn.covid_df.confirmed_cases.values, tn.covid_df.recovered_cases.values))
-for i, j in ij[-7:]:
-    sf = SirFit(total_population=12000000, I0=i, R0=j, 
-                contract_rate=.5, recovery_rate=1/14,
-                number_of_days=120)
-    t, S, I, R = sf.fit()
-    sf.plot_fit(t, S, I, R, title="SIR model applied on Covid data in Tunisia")
+sf = SirEnsemble(total_population=12000000,
+                 I0=tn.covid_df.confirmed_cases.values[-7:],
+                 R0=tn.covid_df.recovered_cases.values[-7:],
+                 contract_rate=.5, recovery_rate=1/14,
+                 number_of_days=120)
+t, S, I, R = sf.fit()
+sf.plot_fit(t, S, I, R, title="SIR model applied on Covid data in Tunisia")
 plt.show()
 
 
@@ -113,16 +111,17 @@ de.compute_growth_factor(smooth=False, plot=True, title="Growth factor of Covid-
 
 # modelling and fits
 # logistic curve model
-de.logisitc_fit(p0=[0, 1, 1, 1], plot=True, title='Least-squares 4PL fit to covid-19 data in Germany')
+lgf = de.logisitc_fit(plot=True, title='Least-squares 4PL fit to covid-19 data in Germany')
+print("4PL fit: %d function evaluations" % lgf.nfev)
 plt.show()
 
 
 # SIR model
-ij = list(zip(de.covid_df.confirmed_cases.values, de.covid_df.recovered_cases.values))
-for i, j in ij[-7:]:
-    sf = SirFit(total_population=83000000, I0=i, R0=j, 
-                contract_rate=.5, recovery_rate=1/14,
-                number_of_days=120)
-    t, S, I, R = sf.fit()
-    sf.plot_fit(t, S, I, R, title="SIR model applied on Covid data in Germany")
+sf = SirEnsemble(total_population=83000000,
+                 I0=de.covid_df.confirmed_cases.values[-7:],
+                 R0=de.covid_df.recovered_cases.values[-7:],
+                 contract_rate=.5, recovery_rate=1/14,
+                 number_of_days=120)
+t, S, I, R = sf.fit()
+sf.plot_fit(t, S, I, R, title="SIR model applied on Covid data in Germany")
 plt.show()
@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import os
+import sys
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# headless plots
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+
+class StandIn:
+    def __init__(self):
+        """
+        Init StandIn class: state of the local stand-in of the CSSE server.
+        """
+        self.body = b"Country/Region,1/22/20\nTunisia,1\n"
+        self.etag = '"v1"'
+        # status of every request (e.g. 503), statuses of the next requests only
+        self.status = None
+        self.failures = []
+        # gzip the transfers when asked, cut the next full transfer after this many bytes
+        self.gzip = False
+        self.cut = None
+        self.requests = []
+        self.ports = []
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        stand_in = self.server.stand_in
+        stand_in.requests.append(dict(self.headers))
+        stand_in.ports.append(self.client_address[1])
+
+        # forced failure status
+        status = stand_in.failures.pop(0) if stand_in.failures else stand_in.status
+        if status is not None:
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if self.headers.get("If-None-Match") == stand_in.etag:
+            self.send_response(304)
+            self.send_header("ETag", stand_in.etag)
+            self.end_headers()
+            return
+
+        body = stand_in.body
+        gzipped = stand_in.gzip and "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            body = gzip.compress(body)
+
+        # resumed transfer of the same representation
+        offset = 0
+        if self.headers.get("Range", "").startswith("bytes=") and self.headers.get("If-Range") == stand_in.etag:
+            offset = int(self.headers["Range"][len("bytes="):].rstrip("-"))
+
+        self.send_response(206 if offset else 200)
+        self.send_header("ETag", stand_in.etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(body) - offset))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        if offset:
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (offset, len(body) - 1, len(body)))
+        self.end_headers()
+
+        # connection dropped in the middle of the transfer
+        if stand_in.cut is not None and not offset:
+            self.wfile.write(body[:stand_in.cut])
+            stand_in.cut = None
+            self.close_connection = True
+            return
+        self.wfile.write(body[offset:])
+
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in():
+    """
+    Serve StandIn on a local port, yield (stand_in, url) and count the requests it gets.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.stand_in = StandIn()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server.stand_in, "http://127.0.0.1:%d/time_series_covid19_confirmed_global.csv" % server.server_port
+    server.shutdown()
+    server.server_close()
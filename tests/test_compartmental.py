@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+import pytest
+from utils.sirfit import SirFit
+from utils.compartmental import SirModel, SeirModel, SeirdModel
+
+
+ARGS = (12000000, 5000, 1000, .5, 1 / 14, 120)
+MODELS = [SirModel(*ARGS), SeirModel(*ARGS, E0=3000), SeirdModel(*ARGS, E0=3000, D0=50, death_rate=0.002)]
+
+
+def finite_differences(model, y, h=1.0):
+    J = np.empty((len(y), len(y)))
+    for j in range(len(y)):
+        e = np.zeros(len(y))
+        e[j] = h
+        J[:, j] = (np.asarray(model.rhs(y + e, 0)) - np.asarray(model.rhs(y - e, 0))) / (2 * h)
+    return J
+
+
+@pytest.mark.parametrize("model", MODELS, ids=lambda m: type(m).__name__)
+def test_jacobian_matches_finite_differences(model):
+    rng = np.random.default_rng(0)
+    y = rng.uniform(1e3, 1e6, len(model.compartments))
+    np.testing.assert_allclose(model.jacobian(y, 0), finite_differences(model, y), rtol=1e-6, atol=1e-12)
+
+
+@pytest.mark.parametrize("cls", [SirModel, SeirModel, SeirdModel])
+def test_banded_jacobian_of_an_ensemble(cls):
+    rng = np.random.default_rng(1)
+    model = cls(12000000, rng.uniform(10, 1e4, 3), 0, rng.uniform(.1, 1, 3), rng.uniform(1 / 21, 1 / 5, 3), 120)
+    k, y = len(cls.compartments), rng.uniform(1e3, 1e6, 3 * len(cls.compartments))
+
+    # banded form back to the dense block diagonal jacobian
+    banded, dense = model.jacobian(y, 0), np.zeros((len(y), len(y)))
+    for i in range(len(y)):
+        for j in range(max(0, i - k + 1), min(len(y), i + k)):
+            dense[i, j] = banded[k - 1 + i - j, j]
+    np.testing.assert_allclose(dense, finite_differences(model, y), rtol=1e-6, atol=1e-12)
+
+
+def test_sir_model_reproduces_sirfit():
+    t, S, I, R = SirFit(*ARGS).fit()
+    model = SirModel(*ARGS)
+    fit = model.fit()
+    np.testing.assert_allclose(fit[0], t)
+    for expected, y in zip((S, I, R), fit[1:]):
+        np.testing.assert_allclose(y, expected, rtol=1e-6, atol=1e-2)
+    assert model.nje == 0
+
+
+@pytest.mark.parametrize("cls", [SirModel, SeirModel, SeirdModel])
+def test_ensemble_rows_match_single_models(cls):
+    rng = np.random.default_rng(2)
+    N, I0, beta, gamma = rng.uniform(1e6, 1e7, 5), rng.uniform(10, 1e4, 5), rng.uniform(.1, 1, 5), rng.uniform(1 / 21, 1 / 5, 5)
+    ensemble = cls(N, I0, 0, beta, gamma, 120).fit(rtol=1e-10, atol=1e-6)
+    for i in range(5):
+        single = cls(N[i], I0[i], 0, beta[i], gamma[i], 120).fit(rtol=1e-10, atol=1e-6)
+        for y, expected in zip(ensemble[1:], single[1:]):
+            np.testing.assert_allclose(y[i], expected, rtol=1e-6, atol=1e-3)
+
+
+def test_stiff_model_uses_the_jacobian():
+    stiff = SeirdModel(12000000, 5000, 1000, .5, 1 / 14, 365, E0=100, incubation_rate=50, death_rate=0.002)
+    stiff.fit()
+    assert stiff.nje > 0
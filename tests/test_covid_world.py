@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.fixtures import make_csse
+from utils import dataproc
+from utils.covid_world import CovidWorld
+
+
+COUNTRIES = ["China", "France", "Germany", "Italy", "Spain", "Tunisia", "US"]
+
+
+@pytest.fixture(scope="module")
+def world(tmp_path_factory):
+    # several regions per country
+    paths = make_csse(str(tmp_path_factory.mktemp("csse")), n_regions=40, n_days=90, n_countries=15)
+    saved = dict(dataproc.data_urls)
+    dataproc.data_urls.update(paths)
+    dataproc.reset_dataset()
+    yield paths
+    dataproc.data_urls.update(saved)
+    dataproc.reset_dataset()
+
+
+def filter_and_groupby(paths, date, countries):
+    # original path: long table of the CSSE rows, filtered on the date and countries, summed per country
+    long = []
+    for name in ("confirmed_cases", "death_cases", "recovered_cases"):
+        df = pd.read_csv(paths[name]).drop(columns=["Province/State", "Lat", "Long"])
+        df = df.melt(id_vars="Country/Region", var_name="date", value_name=name)
+        df["date"] = pd.to_datetime(df["date"], format="%m/%d/%y")
+        long.append(df.rename(columns={"Country/Region": "country"}).set_index(["country", "date"], append=True)[name])
+    df = pd.concat(long, axis=1).reset_index(["country", "date"])
+    df = df[df.date == date]
+    if countries is not None:
+        df = df[df.country.isin(countries)]
+    df = df.groupby("country")[["confirmed_cases", "death_cases", "recovered_cases"]].sum()
+    df["death_rate"] = df["death_cases"] / df["confirmed_cases"]
+    return df
+
+
+@pytest.mark.parametrize("countries", [COUNTRIES, None])
+def test_snapshot_matches_filter_and_groupby(world, countries):
+    cw = CovidWorld()
+    for date in ("2020-01-22", "2020-03-25", "2020-04-20"):
+        expected = filter_and_groupby(world, date, countries)
+        df = cw.snapshot(date, countries).sort_index()
+        assert list(df.index) == list(expected.index)
+        for column in expected:
+            np.testing.assert_allclose(df[column].to_numpy(), expected[column].to_numpy(), equal_nan=True)
+
+
+def test_snapshots_for(world):
+    cw = CovidWorld()
+    dates = ["2020-02-01", "2020-03-01"]
+    snapshots = cw.snapshots_for(dates, COUNTRIES)
+    assert list(snapshots) == dates
+    for date in dates:
+        pd.testing.assert_frame_equal(snapshots[date], cw.snapshot(date, COUNTRIES))
+    assert not cw.snapshots["confirmed_cases"].flags.writeable
+
+
+def test_plot_countries_leaves_the_world_data(world):
+    import matplotlib.pyplot as plt
+    cw = CovidWorld()
+    cw.parse_data()
+    before = cw.world_covid_df.copy()
+    cw.plot_countries()
+    cw.plot_countries(filter_date="2020-04-01", filter_countries=["Tunisia", "US"])
+    plt.close("all")
+    pd.testing.assert_frame_equal(cw.world_covid_df, before)
+    pd.testing.assert_frame_equal(cw.snapshot("2020-03-25"), CovidWorld().snapshot("2020-03-25"))
@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import os
+import urllib.error
+import pytest
+from utils import datacache
+from utils.datacache import cached_path
+from utils.fetcher import fetch_settings
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_first_download(stand_in, tmp_path):
+    server, url = stand_in
+    path = cached_path(url, cache_dir=str(tmp_path), ttl=3600, offline=False)
+    assert len(server.requests) == 1
+    assert read(path) == server.body
+
+
+def test_fresh_ttl_hit(stand_in, tmp_path):
+    server, url = stand_in
+    first = cached_path(url, cache_dir=str(tmp_path), ttl=3600, offline=False)
+    second = cached_path(url, cache_dir=str(tmp_path), ttl=3600, offline=False)
+    assert second == first
+    assert len(server.requests) == 1
+
+
+def test_etag_revalidation(stand_in, tmp_path):
+    server, url = stand_in
+    path = cached_path(url, cache_dir=str(tmp_path), ttl=0, offline=False)
+    mtime = os.stat(path).st_mtime_ns
+
+    # unchanged file: one conditional request, answered 304
+    assert cached_path(url, cache_dir=str(tmp_path), ttl=0, offline=False) == path
+    assert len(server.requests) == 2
+    assert server.requests[1].get("If-None-Match") == server.etag
+    assert os.stat(path).st_mtime_ns == mtime
+    assert read(path) == server.body
+
+    # changed file: downloaded again
+    server.body, server.etag = server.body + b"Germany,2\n", '"v2"'
+    cached_path(url, cache_dir=str(tmp_path), ttl=0, offline=False)
+    assert len(server.requests) == 3
+    assert read(path) == server.body
+
+
+def test_offline(stand_in, tmp_path):
+    server, url = stand_in
+    with pytest.raises(FileNotFoundError):
+        cached_path(url, cache_dir=str(tmp_path), offline=True)
+    assert len(server.requests) == 0
+
+    path = cached_path(url, cache_dir=str(tmp_path), ttl=0, offline=False)
+    assert cached_path(url, cache_dir=str(tmp_path), ttl=0, offline=True) == path
+    assert len(server.requests) == 1
+
+
+def test_local_path(tmp_path):
+    path = str(tmp_path / "local.csv")
+    assert cached_path(path, cache_dir=str(tmp_path)) == path
+
+
+def test_server_error_serves_stale_copy(stand_in, tmp_path, monkeypatch):
+    server, url = stand_in
+    monkeypatch.setitem(fetch_settings, "backoff", 0)
+    path = cached_path(url, cache_dir=str(tmp_path), ttl=0, offline=False)
+
+    server.status = 503
+    with pytest.warns(UserWarning, match="HTTP 503"):
+        assert cached_path(url, cache_dir=str(tmp_path), ttl=0, offline=False) == path
+    assert len(server.requests) == 2 + fetch_settings["retries"]
+    assert read(path) == server.body
+
+
+def test_server_error_without_cached_copy(stand_in, tmp_path, monkeypatch):
+    server, url = stand_in
+    monkeypatch.setitem(fetch_settings, "backoff", 0)
+    server.status = 503
+    with pytest.raises(urllib.error.HTTPError):
+        cached_path(url, cache_dir=str(tmp_path), ttl=0, offline=False)
+
+
+def test_client_error_is_raised(stand_in, tmp_path):
+    server, url = stand_in
+    cached_path(url, cache_dir=str(tmp_path), ttl=0, offline=False)
+    server.status = 404
+    with pytest.raises(urllib.error.HTTPError):
+        cached_path(url, cache_dir=str(tmp_path), ttl=0, offline=False)
+    assert len(server.requests) == 2
+
+
+def test_unreachable_server_serves_stale_copy(stand_in, tmp_path, monkeypatch):
+    server, url = stand_in
+    path = cached_path(url, cache_dir=str(tmp_path), ttl=0, offline=False)
+
+    def unreachable(*args, **kwargs):
+        raise urllib.error.URLError("connection refused")
+    monkeypatch.setattr(datacache, "download", unreachable)
+    with pytest.warns(UserWarning, match="connection refused"):
+        assert cached_path(url, cache_dir=str(tmp_path), ttl=0, offline=False) == path
+    with pytest.raises(urllib.error.URLError):
+        cached_path(url, cache_dir=str(tmp_path / "empty"), ttl=0, offline=False)
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from utils.datacube import cube_from_csse
+from utils.datastore import convert_csse, read_index, update_cube
+
+
+def csse(n_days):
+    dates = pd.date_range("2020-01-22", periods=n_days)
+    values = 1000 * np.arange(3)[:, None] + np.arange(n_days)
+    df = pd.DataFrame(values, columns=["%d/%d/%s" % (d.month, d.day, d.strftime("%y")) for d in dates])
+    keys = pd.DataFrame({"Province/State": [None, "Bavaria", "Berlin"],
+                         "Country/Region": ["Tunisia", "Germany", "Germany"],
+                         "Lat": 0.0, "Long": 0.0})
+    return pd.concat([keys, df], axis=1)
+
+
+def assert_matches(cube, df):
+    expected = cube_from_csse(df)
+    assert list(cube.countries) == list(expected.countries)
+    np.testing.assert_array_equal(np.asarray(cube.values), expected.values)
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / "confirmed.csv")
+    df = csse(40)
+    df.to_csv(path, index=False)
+    convert_csse(str(tmp_path / "store"), {"confirmed": path}, check_days=10)
+    return str(tmp_path / "store"), path, df
+
+
+def test_append_new_dates(store):
+    store_dir, path, df = store
+    df = csse(45)
+    df.to_csv(path, index=False)
+    assert_matches(update_cube(store_dir, "confirmed", path, check_days=10), df)
+    assert read_index(store_dir, "confirmed")["capacity"] == 40 + 64
+
+
+def test_revised_recent_date(store):
+    store_dir, path, df = store
+    df = csse(41)
+    df.iloc[1, -5] += 1000
+    df.to_csv(path, index=False)
+    assert_matches(update_cube(store_dir, "confirmed", path, check_days=10), df)
+
+
+def test_revised_without_new_dates(store):
+    store_dir, path, df = store
+    df.iloc[2, -1] += 1000
+    df.to_csv(path, index=False)
+    assert_matches(update_cube(store_dir, "confirmed", path, check_days=10), df)
+
+
+def test_changed_rows(store):
+    store_dir, path, df = store
+    df = csse(41).iloc[:2]
+    df.to_csv(path, index=False)
+    assert_matches(update_cube(store_dir, "confirmed", path, check_days=10), df)
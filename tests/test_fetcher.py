@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import os
+import urllib.error
+import pytest
+from utils.fetcher import HttpSession, download, fetch_all
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def session():
+    session = HttpSession(timeout=5)
+    yield session
+    session.close()
+
+
+def test_gzip_transfer(stand_in, session, tmp_path):
+    server, url = stand_in
+    server.gzip = True
+    path = str(tmp_path / "data.csv")
+    status, headers = download(url, path, session=session)
+    assert status == 200
+    assert headers["Content-Encoding"] == "gzip"
+    assert server.requests[0]["Accept-Encoding"] == "gzip"
+    assert read(path) == server.body
+    assert not os.path.exists(path + ".part")
+
+
+def test_keep_alive(stand_in, session, tmp_path):
+    server, url = stand_in
+    for name in ("a.csv", "b.csv", "c.csv"):
+        download(url, str(tmp_path / name), session=session)
+    assert len(server.requests) == 3
+    assert len(set(server.ports)) == 1
+
+
+def test_not_modified(stand_in, session, tmp_path):
+    server, url = stand_in
+    path = str(tmp_path / "data.csv")
+    status, _ = download(url, path, {"If-None-Match": server.etag}, session=session)
+    assert status == 304
+    assert not os.path.exists(path)
+
+
+def test_retry_server_errors(stand_in, session, tmp_path):
+    server, url = stand_in
+    server.failures = [503, 429]
+    path = str(tmp_path / "data.csv")
+    status, _ = download(url, path, session=session, retries=2, backoff=0)
+    assert status == 200
+    assert len(server.requests) == 3
+    assert read(path) == server.body
+
+
+def test_out_of_retries(stand_in, session, tmp_path):
+    server, url = stand_in
+    server.status = 503
+    with pytest.raises(urllib.error.HTTPError) as e:
+        download(url, str(tmp_path / "data.csv"), session=session, retries=2, backoff=0)
+    assert e.value.code == 503
+    assert len(server.requests) == 3
+
+
+def test_client_error_is_not_retried(stand_in, session, tmp_path):
+    server, url = stand_in
+    server.status = 404
+    with pytest.raises(urllib.error.HTTPError) as e:
+        download(url, str(tmp_path / "data.csv"), session=session, retries=2, backoff=0)
+    assert e.value.code == 404
+    assert len(server.requests) == 1
+
+
+@pytest.mark.parametrize("gzipped", [False, True])
+def test_resume_cut_transfer(stand_in, session, tmp_path, gzipped):
+    server, url = stand_in
+    server.body = b"".join(b"Country %d,%d\n" % (i, i * i) for i in range(2000))
+    server.gzip, server.cut = gzipped, 1000
+    path = str(tmp_path / "data.csv")
+    status, _ = download(url, path, session=session, retries=2, backoff=0)
+    assert status == 206
+    assert len(server.requests) == 2
+    assert server.requests[1]["Range"] == "bytes=1000-"
+    assert server.requests[1]["If-Range"] == server.etag
+    assert read(path) == server.body
+
+
+def test_fetch_all_keeps_order(stand_in, tmp_path):
+    server, url = stand_in
+    paths = [str(tmp_path / ("%d.csv" % i)) for i in range(4)]
+    results = fetch_all(lambda path: (download(url, path), path)[1], paths)
+    assert results == paths
+    assert all(read(path) == server.body for path in paths)
+
+
+def test_failed_transfer_is_not_pooled(stand_in, session, tmp_path, monkeypatch):
+    server, url = stand_in
+    server.cut = 10
+    pooled = []
+    release = session._release
+    monkeypatch.setattr(session, "_release", lambda key, connection: pooled.append(connection) or release(key, connection))
+    download(url, str(tmp_path / "data.csv"), session=session, retries=2, backoff=0)
+    assert len(server.requests) == 2
+    assert len(pooled) == 1 and pooled[0].sock.getsockname()[1] == server.ports[1]
@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.fixtures import make_csse
+from utils import fitstate
+from utils.datacube import cube_from_csse
+from utils.logisticfit import LogisticFit
+
+
+@pytest.fixture(scope="module")
+def series(tmp_path_factory):
+    paths = make_csse(str(tmp_path_factory.mktemp("csse")), n_regions=20, n_days=200)
+    return cube_from_csse(pd.read_csv(paths["confirmed_cases"])).values[:8].astype(np.float64)
+
+
+def fit(y, state=None):
+    lgf = LogisticFit(np.arange(len(y), dtype=np.float64), y)
+    lgf.fit_data(state)
+    return lgf
+
+
+def test_state_round_trip(series, tmp_path):
+    state_dir = str(tmp_path)
+    key, state = ("Tunisia", "confirmed_cases"), fit(series[0]).state()
+    assert fitstate.load_state(key, state_dir) is None
+    fitstate.save_state(key, state, state_dir)
+    fitstate.save_state(("Germany", "confirmed_cases"), state, state_dir)
+    assert fitstate.load_state(key, state_dir) == state
+
+    # read back from disk by a new process
+    fitstate._states.clear()
+    assert fitstate.load_state(key, state_dir) == state
+
+    fitstate.clear_state(key, state_dir)
+    assert fitstate.load_state(key, state_dir) is None
+    assert fitstate.load_state(("Germany", "confirmed_cases"), state_dir) == state
+    fitstate.clear_state(state_dir=state_dir)
+    fitstate._states.clear()
+    assert fitstate.load_state(("Germany", "confirmed_cases"), state_dir) is None
+
+
+def test_loaded_state_is_a_copy(series, tmp_path):
+    key, state = ("Tunisia", "confirmed_cases"), fit(series[0]).state()
+    fitstate.save_state(key, state, str(tmp_path))
+    state["params"][0] = np.nan
+    loaded = fitstate.load_state(key, str(tmp_path))
+    loaded["params"][1] = np.nan
+    assert np.isfinite(fitstate.load_state(key, str(tmp_path))["params"]).all()
+
+
+def test_warm_start_from_the_previous_day(series):
+    for y in series:
+        previous, cold = fit(y[:-1]), fit(y)
+        warm = fit(y, previous.state())
+        assert warm.warm
+        assert warm.nfev <= cold.nfev and warm.nfev <= 10
+        np.testing.assert_allclose(warm.cost, cold.cost, rtol=1e-6)
+
+
+def test_diverging_warm_start_falls_back_to_a_cold_start(series):
+    for y in series:
+        cold = fit(y)
+        lgf = fit(y, {"params": [1e9, -50, 1e-3, -1e9]})
+        assert not lgf.warm
+        np.testing.assert_array_equal(lgf.plsq[0], cold.plsq[0])
+        assert lgf.cost == cold.cost
@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import os
+import sys
+import json
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# numpy is imported first: the budgets only cover the utils modules
+PROBE = """
+import sys, time, json
+import numpy
+start = time.perf_counter()
+import utils.covid_country
+imported = time.perf_counter() - start
+start = time.perf_counter()
+utils.covid_country.CovidCountry("Tunisia")
+construct = time.perf_counter() - start
+print(json.dumps({"import": imported, "construct": construct, "modules": sorted(sys.modules)}))
+"""
+
+
+def probe():
+    output = subprocess.check_output([sys.executable, "-c", PROBE], cwd=ROOT)
+    return json.loads(output)
+
+
+def test_covid_country_import_is_light():
+    results = [probe() for _ in range(3)]
+    modules = {m.split(".")[0] for m in results[0]["modules"]}
+    assert not modules & {"matplotlib", "scipy", "pandas"}
+    assert not set(results[0]["modules"]) & {"utils.fetcher", "ssl"}
+
+    # best of 3 fresh interpreters: about 10 ms and a few microseconds here
+    assert min(r["import"] for r in results) < 0.5
+    assert min(r["construct"] for r in results) < 0.01
@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.fixtures import make_csse
+from utils.datacube import cube_from_csse
+from utils.logisticfit import LogisticFit, fit_logistic4_batch, logistic4, logistic4_jacobian, refit_logistic4_batch
+
+
+@pytest.fixture(scope="module")
+def series(tmp_path_factory):
+    paths = make_csse(str(tmp_path_factory.mktemp("csse")), n_regions=60, n_days=300)
+    Y = cube_from_csse(pd.read_csv(paths["confirmed_cases"])).values.astype(np.float64)
+    return np.arange(Y.shape[1], dtype=np.float64), Y
+
+
+def leastsq_cost(x, y, p0):
+    lgf = LogisticFit(x, y, p0=p0)
+    lgf.fit_data()
+    return lgf.cost
+
+
+def assert_local_minima(x, Y, P, cost, converged):
+    # leastsq started from a converged fit does not improve it
+    for i in np.flatnonzero(converged):
+        assert leastsq_cost(x, Y[i], P[i]) >= cost[i] * (1 - 1e-6)
+
+
+def test_batch_matches_leastsq(series):
+    x, Y = series
+    P, converged, cost, n_iter = fit_logistic4_batch(x, Y)
+    reference = np.array([leastsq_cost(x, y, None) for y in Y])
+
+    assert converged.mean() >= 0.9
+    np.testing.assert_allclose(np.median(cost[converged] / reference[converged]), 1, rtol=1e-6)
+    assert np.mean(np.abs(cost[converged] / reference[converged] - 1) < 1e-6) >= 0.9
+    assert_local_minima(x, Y, P, cost, converged)
+
+
+def test_poor_start_is_not_flagged_converged(series):
+    # p0 of the original fits: most series stall far from the fit and must not be flagged converged
+    x, Y = series
+    P, converged, cost, n_iter = fit_logistic4_batch(x, Y, np.array([0, 1, 1, 1.0]))
+    reference = np.array([leastsq_cost(x, y, None) for y in Y])
+
+    assert not converged[cost > 10 * reference].any()
+    assert_local_minima(x, Y, P, cost, converged)
+
+
+def test_refit_falls_back_to_cold_starts(series):
+    x, Y = series
+    P_prev = np.tile([0, 1, 1, 1.0], (len(Y), 1))
+    P_prev[::2] = np.nan
+    P, converged, cost, n_iter, warm = refit_logistic4_batch(x, Y, P_prev)
+    cold = fit_logistic4_batch(x, Y)
+
+    # stalled warm starts are refitted cold: as good as the cold fits
+    assert not warm[::2].any()
+    np.testing.assert_allclose(cost[~warm], cold[2][~warm], rtol=1e-9)
+    assert np.all(cost[warm] <= cold[2][warm] * (1 + 1e-6))
+
+
+def test_jacobian_matches_finite_differences():
+    x, p = np.arange(0, 200, dtype=np.float64), np.array([10, 4, 80, 5000.0])
+    J = logistic4_jacobian(x, *p)
+    for k in range(4):
+        h = np.zeros(4)
+        h[k] = 1e-6 * abs(p[k])
+        expected = (logistic4(x, *(p + h)) - logistic4(x, *(p - h))) / (2 * h[k])
+        np.testing.assert_allclose(J[:, k], expected, rtol=1e-5, atol=1e-6 * np.abs(expected).max())
+
+
+def test_jacobian_of_steep_curves_is_finite():
+    # (x / c)**b overflows: the curve is a step, the derivatives are those of the saturated curve
+    with np.errstate(all="raise"):
+        J = logistic4_jacobian(np.array([0, 50, 300.0]), 1e4, 700, 100, 0)
+    np.testing.assert_array_equal(J, [[1, 0, 0, 0], [1, 0, 0, 0], [0, 0, 0, 1]])
+    J = logistic4_jacobian(np.arange(300.0), np.array([[0.0], [1.0]]), np.array([[700.0], [-700.0]]), 100, 1e4)
+    assert np.isfinite(J).all()
+
+
+def test_steep_series(series):
+    # a jump of one day: finite costs, no saturated fit flagged converged
+    x, _ = series
+    Y = np.where(x >= 150.5, 1e4, 0.0)[None, :] + np.arange(4)[:, None]
+    P, converged, cost, n_iter = fit_logistic4_batch(x, Y)
+    assert np.isfinite(P).all() and np.isfinite(cost).all()
+    assert not (converged & (cost > 1e-6 * (Y**2).sum(axis=1))).any()
+
+
+@pytest.mark.parametrize("method", ["residual", "parametric"])
+def test_bootstrap_bands(series, method):
+    x, Y = series
+    lgf = LogisticFit(x, Y[0])
+    bands = lgf.bootstrap(n_boot=200, method=method, seed=0)
+    assert lgf.bands is bands
+    np.testing.assert_array_equal(bands["x"], np.arange(2 * len(x)))
+    assert bands["bands"].shape == (3, 2 * len(x))
+    assert bands["params"].shape == (200, 4) and bands["converged"].shape == (200,)
+    lower, median, upper = bands["bands"]
+    assert np.all(lower <= median) and np.all(median <= upper)
+    assert np.all(upper - lower > 0)
+
+    # same seed, same bands; the process pool refits the same replicates
+    again = LogisticFit(x, Y[0]).bootstrap(n_boot=200, method=method, seed=0)
+    np.testing.assert_array_equal(again["bands"], bands["bands"])
+    pooled = LogisticFit(x, Y[0]).bootstrap(n_boot=200, method=method, seed=0, processes=2)
+    np.testing.assert_allclose(pooled["params"], bands["params"], rtol=1e-12)
+    np.testing.assert_allclose(pooled["bands"], bands["bands"], rtol=1e-12)
+    np.testing.assert_array_equal(pooled["converged"], bands["converged"])
+
+
+def test_bootstrap_unknown_method(series):
+    x, Y = series
+    with pytest.raises(ValueError):
+        LogisticFit(x, Y[0]).bootstrap(n_boot=10, method="jackknife")
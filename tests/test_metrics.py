@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+
+The metrics engine and CovidCountry are checked against a frozen copy of the
+original per-country pandas implementation (CovidCountry.parse_data and
+compute_* before the engine), where the chained-indexing clamps and the
+replace(np.inf, series) are written with mask so that they run on current pandas.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.signal
+from benchmarks.fixtures import make_csse
+from utils import dataproc, smoothing
+from utils.datacube import cube_from_csse
+from utils.metrics import compute_metrics
+from utils.covid_country import CovidCountry
+
+
+def baseline_metrics(confirmed, deaths, recovered, smooth, ws=7, po=3):
+    covid_df = pd.DataFrame({"confirmed_cases": confirmed, "death_cases": deaths, "recovered_cases": recovered})
+
+    # parse_data
+    covid_df["new_cases"] = abs(covid_df["confirmed_cases"] - covid_df["confirmed_cases"].shift(1).fillna(0))
+
+    # compute_death_rate, compute_recovery_rate
+    for rate, cases in (("death_rate", "death_cases"), ("recovery_rate", "recovered_cases")):
+        covid_df[rate] = covid_df[cases] / covid_df["confirmed_cases"]
+        covid_df[rate] = covid_df[rate].fillna(0)
+        covid_df[rate] = covid_df[rate].mask(covid_df[rate] < 0, 0)
+
+    # compute_daily_growth
+    covid_df["daily_growth"] = abs(covid_df["confirmed_cases"] - covid_df["confirmed_cases"].shift(1).fillna(0))
+    covid_df["daily_growth"] /= covid_df["confirmed_cases"].shift(1).fillna(0)
+    covid_df["daily_growth"] = covid_df["daily_growth"].fillna(0)
+    covid_df["daily_growth"] = covid_df["daily_growth"].mask(covid_df["daily_growth"] == np.inf, covid_df["new_cases"])
+    covid_df["daily_growth"] = covid_df["daily_growth"].mask(covid_df["daily_growth"] < 0, 0)
+
+    # compute_growth_factor
+    covid_df["growth_factor"] = covid_df["new_cases"] / covid_df["new_cases"].shift(1).fillna(0)
+    covid_df["growth_factor"] = covid_df["growth_factor"].fillna(0)
+    covid_df["growth_factor"] = covid_df["growth_factor"].mask(covid_df["growth_factor"] == np.inf, covid_df["new_cases"])
+    if smooth: covid_df["growth_factor"] = scipy.signal.savgol_filter(covid_df["growth_factor"], ws, po)
+    covid_df["growth_factor"] = covid_df["growth_factor"].mask(covid_df["growth_factor"] < 0, 0)
+    return covid_df
+
+
+METRICS = ("new_cases", "death_rate", "recovery_rate", "daily_growth", "growth_factor")
+
+
+@pytest.fixture(scope="module")
+def cubes(tmp_path_factory):
+    paths = make_csse(str(tmp_path_factory.mktemp("csse")), n_regions=40, n_days=150)
+    saved = dict(dataproc.data_urls)
+    dataproc.data_urls.update(paths)
+    dataproc.reset_dataset()
+    smoothing.clear_cache()
+    yield {t: cube_from_csse(pd.read_csv(p)) for t, p in paths.items()}
+    dataproc.data_urls.update(saved)
+    dataproc.reset_dataset()
+
+
+def edge_series():
+    # zeros, a first case after zeros, a downward revision, a drop back to 0 and a restart
+    confirmed = np.array([0, 0, 3, 3, 5, 4, 4, 0, 0, 7, 9, 9, 12, 20, 20, 25, 24, 30], dtype=np.float64)
+    deaths = np.array([0, 0, 0, 1, 1, 1, 2, 2, 0, 0, 1, 1, 1, 2, 2, 3, 3, 3], dtype=np.float64)
+    recovered = np.array([0, 1, 0, 0, 1, 2, 2, 3, 3, 3, 4, 4, -1, 5, 6, 6, 7, 8], dtype=np.float64)
+    return confirmed, deaths, recovered
+
+
+@pytest.mark.parametrize("smooth", [False, True])
+def test_engine_matches_baseline(cubes, smooth):
+    confirmed, deaths, recovered = (cubes[t].values for t in ("confirmed_cases", "death_cases", "recovered_cases"))
+    batch = compute_metrics(confirmed, deaths, recovered, smooth=smooth, kernel="savgol")
+    for i in range(confirmed.shape[0]):
+        expected = baseline_metrics(confirmed[i], deaths[i], recovered[i], smooth)
+        for name in METRICS:
+            np.testing.assert_allclose(batch[name][i], expected[name].to_numpy(), rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize("smooth", [False, True])
+def test_engine_matches_baseline_edge_cases(smooth):
+    series = edge_series()
+    batch = compute_metrics(*(np.atleast_2d(s) for s in series), smooth=smooth, kernel="savgol")
+    expected = baseline_metrics(*series, smooth)
+    for name in METRICS:
+        np.testing.assert_allclose(batch[name][0], expected[name].to_numpy(), rtol=1e-12, atol=1e-12)
+
+
+def test_covid_country_matches_baseline(cubes):
+    for country in ("Tunisia", "Germany", "US"):
+        i = list(cubes["confirmed_cases"].countries).index(country)
+        expected = baseline_metrics(*(cubes[t].values[i] for t in ("confirmed_cases", "death_cases", "recovered_cases")),
+                                    smooth=True)
+        cc = CovidCountry(country)
+        cc.parse_data()
+        np.testing.assert_allclose(cc.compute_death_rate(plot=False), expected["death_rate"], rtol=1e-12)
+        np.testing.assert_allclose(cc.compute_recovery_rate(plot=False), expected["recovery_rate"], rtol=1e-12)
+        np.testing.assert_allclose(cc.compute_daily_growth(plot=False), expected["daily_growth"], rtol=1e-12)
+        np.testing.assert_allclose(cc.compute_growth_factor(plot=False), expected["growth_factor"], rtol=1e-12, atol=1e-12)
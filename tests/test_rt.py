@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+import pandas as pd
+from scipy import stats
+from utils import rt
+from utils.covid_country import CovidCountry
+
+
+def cori_reference(incidence, w, window, interval=0.95, a=1.0, b=5.0):
+    # day by day renewal equation of Cori et al. (2013)
+    n = len(incidence)
+    pressure = np.array([sum(incidence[t - k] * w[k] for k in range(1, min(t + 1, len(w)))) for t in range(n)])
+    result = {key: np.full(n, np.nan) for key in ("mean", "std", "lower", "upper")}
+    for t in range(window, n):
+        days = range(t - window + 1, t + 1)
+        if sum(pressure[s] for s in days) == 0:
+            continue
+        shape, rate = a + sum(incidence[s] for s in days), 1 / b + sum(pressure[s] for s in days)
+        posterior = stats.gamma(shape, scale=1 / rate)
+        result["mean"][t], result["std"][t] = posterior.mean(), posterior.std()
+        result["lower"][t], result["upper"][t] = posterior.ppf((1 - interval) / 2), posterior.ppf((1 + interval) / 2)
+    return result
+
+
+def epidemic(n_days=150, seed=0):
+    # small and large counts (exact and approximated gamma quantiles) with a pause of zero incidence
+    rng = np.random.default_rng(seed)
+    incidence = rng.poisson(5 * np.exp(0.06 * np.arange(n_days))).astype(np.float64)
+    incidence[50:75] = 0
+    return incidence
+
+
+def test_matches_loop_reference():
+    w = rt.serial_interval(4.7, 2.9)
+    Y = np.stack([epidemic(seed=s) for s in range(3)])
+    estimate = rt.estimate_rt(Y, si=w, window=7, prior_shape=1.0, prior_scale=5.0)
+    for i in range(len(Y)):
+        expected = cori_reference(Y[i], w, 7)
+        for key in expected:
+            np.testing.assert_allclose(estimate[key][i], expected[key], rtol=1e-6)
+
+
+def test_interval_ordering():
+    estimate = rt.estimate_rt(epidemic())
+    known = np.isfinite(estimate["mean"])
+    assert known.sum() > 100
+    assert np.all(estimate["lower"][known] <= estimate["mean"][known])
+    assert np.all(estimate["mean"][known] <= estimate["upper"][known])
+    assert np.all(estimate["std"][known] > 0)
+    assert not np.isfinite(estimate["lower"][~known]).any()
+
+
+def test_zero_incidence():
+    w = rt.serial_interval()
+    incidence = epidemic()
+    estimate = rt.estimate_rt(incidence, si=w, window=7)
+
+    # no pressure once the pause outlasts the serial interval, estimates again after the restart
+    assert np.isnan(estimate["mean"][75 - 1])
+    assert np.isfinite(estimate["mean"][75 + 1])
+    assert np.isnan(rt.estimate_rt(np.zeros(100))["mean"]).all()
+
+    # a run of zeros right after cases: Rt goes to 0, the upper bound stays positive
+    assert estimate["mean"][55] < 0.5 and estimate["upper"][55] > 0
+
+
+def test_covid_country_estimates_once(monkeypatch):
+    calls = []
+    estimate_rt = rt.estimate_rt
+    monkeypatch.setattr(rt, "estimate_rt", lambda *args, **kwargs: calls.append(1) or estimate_rt(*args, **kwargs))
+
+    confirmed = np.cumsum(epidemic())
+    cc = CovidCountry("Tunisia")
+    dates = pd.date_range("2020-01-22", periods=len(confirmed))
+    cc.confirmed_cases_df = pd.DataFrame({"date": dates, "confirmed_cases": confirmed})
+    cc.death_cases_df = cc.recovered_cases_df = pd.DataFrame({"date": dates, "confirmed_cases": 0.0})
+    values = [cc.metric(name) for name in ("rt", "rt_lower", "rt_upper")]
+    assert len(calls) == 1
+    expected = estimate_rt(cc.metric("new_cases"))
+    for value, key in zip(values, ("mean", "lower", "upper")):
+        np.testing.assert_array_equal(value, expected[key])
+    assert "_rt_estimate" not in cc.covid_df and "rt" in cc.covid_df
+
+    # the estimate is recomputed once the source changes
+    cc.confirmed_cases_df = cc.confirmed_cases_df.assign(confirmed_cases=2 * confirmed)
+    cc.metric("rt_upper")
+    assert len(calls) == 2
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+from utils.sircalib import calibrate_sir, sir_sensitivities
+
+
+def simulate(n_days, N, beta, gamma, I0=50.0):
+    N, beta, gamma = (np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in (N, beta, gamma))
+    X, _ = sir_sensitivities(n_days, N, N - I0, np.full(len(N), I0), np.zeros(len(N)), beta, gamma)
+    return X[:, 1], X[:, 2]
+
+
+def test_sensitivities_match_finite_differences():
+    N, beta, gamma = np.array([1e6]), np.array([0.3]), np.array([0.1])
+    X, dX = sir_sensitivities(100, N, N - 10, np.array([10.0]), np.array([0.0]), beta, gamma)
+    for k, (db, dg) in enumerate(((1e-6, 0), (0, 1e-6))):
+        Xp, _ = sir_sensitivities(100, N, N - 10, np.array([10.0]), np.array([0.0]), beta + db, gamma + dg)
+        Xm, _ = sir_sensitivities(100, N, N - 10, np.array([10.0]), np.array([0.0]), beta - db, gamma - dg)
+        np.testing.assert_allclose(dX[0, :, k], (Xp - Xm)[0] / 2e-6, rtol=1e-4, atol=1e-3 * np.abs(dX[0, :, k]).max())
+
+
+def test_recent_wave_of_a_real_length_series():
+    # 1100 days, the wave of the last 100 days is fitted from the default window
+    I, R = simulate(100, 12e6, 0.3, 1 / 14)
+    infected = np.concatenate([np.zeros(1000), I[0]])
+    removed = np.concatenate([np.zeros(1000), R[0]])
+    result = calibrate_sir(infected, removed, 12e6)
+    assert result["start"][0] == 1000
+    assert result["converged"][0]
+    np.testing.assert_allclose(result["beta"], 0.3, rtol=5e-3)
+    np.testing.assert_allclose(result["gamma"], 1 / 14, rtol=5e-3)
+
+
+def test_whole_series_batch():
+    rng = np.random.default_rng(0)
+    N, beta, gamma = rng.uniform(1e6, 1e8, 20), rng.uniform(.15, .5, 20), rng.uniform(1 / 21, 1 / 7, 20)
+    I, R = simulate(300, N, beta, gamma)
+    result = calibrate_sir(I, R, N, start_offsets=(0, 7), max_days=None)
+    assert result["converged"].all()
+    np.testing.assert_allclose(result["beta"], beta, rtol=5e-3)
+    np.testing.assert_allclose(result["gamma"], gamma, rtol=5e-3)
+
+
+def test_window_without_cases_converges():
+    # the epidemic is over long before the window: nothing to fit, no iterations to stall
+    I, R = simulate(100, 1e6, 0.3, 0.1)
+    infected = np.concatenate([I[0], np.zeros(1000)])
+    removed = np.concatenate([R[0], np.full(1000, R[0, -1] + I[0, -1])])
+    result = calibrate_sir(infected, removed, 1e6)
+    assert result["converged"][0]
+    assert result["start"][0] == 1100 - 120
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+import pytest
+from utils.sirfit import SirEnsemble, SirFit
+
+
+@pytest.fixture
+def pyplot():
+    import matplotlib.pyplot as plt
+    plt.figure()
+    yield plt
+    plt.close("all")
+
+
+def legend_texts(plt):
+    return [text.get_text() for text in plt.gca().get_legend().get_texts()]
+
+
+def test_sirfit_plot_fit(pyplot):
+    fit = SirFit(12000000, 5000, 1000, .5, 1 / 14, 120)
+    t, S, I, R = fit.fit()
+    fit.plot_fit(t, S, I, R, title="SIR model applied on Covid data in Tunisia")
+    assert legend_texts(pyplot) == ["Susceptible", "Infected", "Recovered"]
+    assert pyplot.gca().get_title() == "SIR model applied on Covid data in Tunisia"
+
+
+def test_sir_ensemble_plot_fit(pyplot):
+    ensemble = SirEnsemble(12000000, np.array([5000, 6000, 7000]), 1000, .5, 1 / 14, 120)
+    t, S, I, R = ensemble.fit()
+    ensemble.plot_fit(t, S, I, R)
+    assert len(pyplot.gca().lines) == 3 * 3
+    assert legend_texts(pyplot) == ["Susceptible", "Infected", "Recovered"]
+    np.testing.assert_allclose(S + I + R, 12000000, rtol=1e-6)
+
+
+def test_sir_ensemble_matches_sirfit():
+    rng = np.random.default_rng(0)
+    N = rng.uniform(1e6, 5e7, 8).round()
+    I0, R0 = rng.uniform(10, 1e4, 8).round(), rng.uniform(0, 1e3, 8).round()
+    beta, gamma = rng.uniform(.1, 1, 8), rng.uniform(1 / 21, 1 / 5, 8)
+    t, S, I, R = SirEnsemble(N, I0, R0, beta, gamma, 120).fit()
+    for i in range(8):
+        expected = SirFit(N[i], I0[i], R0[i], beta[i], gamma[i], 120).fit()
+        np.testing.assert_allclose(t, expected[0])
+        for y, y_expected in zip((S[i], I[i], R[i]), expected[1:]):
+            np.testing.assert_allclose(y, y_expected, rtol=1e-6, atol=1e-6 * N[i])
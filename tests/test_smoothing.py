@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.signal
+from utils import smoothing
+from utils.smoothing import StreamingSmoother, smooth
+
+
+@pytest.fixture
+def X():
+    rng = np.random.default_rng(0)
+    smoothing.clear_cache()
+    return np.cumsum(rng.poisson(20, (5, 60)), axis=1).astype(np.float64)
+
+
+def test_savgol_matches_scipy(X):
+    np.testing.assert_allclose(smooth(X, "savgol", 7, 3), scipy.signal.savgol_filter(X, 7, 3), rtol=1e-12)
+    for x in X:
+        np.testing.assert_allclose(smooth(x, "savgol", 9, 2), scipy.signal.savgol_filter(x, 9, 2), rtol=1e-12)
+
+
+def test_rolling_and_ewma_match_pandas(X):
+    df = pd.DataFrame(X.T)
+    np.testing.assert_allclose(smooth(X, "rolling", 7, causal=True), df.rolling(7, min_periods=1).mean().values.T)
+    np.testing.assert_allclose(smooth(X, "rolling", 7), df.rolling(7, min_periods=1, center=True).mean().values.T)
+    np.testing.assert_allclose(smooth(X, "ewma", 7), df.ewm(span=7, adjust=False).mean().values.T)
+
+
+@pytest.mark.parametrize("kernel", ["savgol", "rolling", "ewma"])
+def test_streaming_matches_causal_smoothing(X, kernel):
+    expected = smooth(X, kernel, 7, 3, causal=True)
+
+    # blocks of days, then single days
+    streaming = StreamingSmoother(kernel, 7, 3)
+    for start, stop in ((0, 3), (3, 20)):
+        np.testing.assert_allclose(streaming.append(X[:, start:stop]), expected[:, start:stop], rtol=1e-10)
+    for t in range(20, X.shape[1]):
+        np.testing.assert_allclose(streaming.append(X[:, t]), expected[:, t], rtol=1e-10)
+    np.testing.assert_allclose(streaming.values, expected, rtol=1e-10)
+    assert streaming.n == X.shape[1]
+
+    # one series, one day at a time
+    streaming = StreamingSmoother(kernel, 7, 3)
+    for value in X[0]:
+        streaming.append(value)
+    np.testing.assert_allclose(streaming.values, expected[0], rtol=1e-10)
+
+
+def test_cache_hits_return_copies(X, monkeypatch):
+    calls = []
+    savgol = smoothing.KERNELS["savgol"]["smooth"]
+    monkeypatch.setitem(smoothing.KERNELS["savgol"], "smooth", lambda *args: calls.append(1) or savgol(*args))
+
+    first = smooth(X, "savgol", 7, 3)
+    expected = first.copy()
+    first[:] = 0
+    second = smooth(X, "savgol", 7, 3)
+    assert len(calls) == 1
+    np.testing.assert_array_equal(second, expected)
+    assert second.flags.writeable and not np.shares_memory(first, second)
+
+    # other data or parameters are computed
+    smooth(X + 1, "savgol", 7, 3)
+    smooth(X, "savgol", 9, 3)
+    smooth(X, "savgol", 7, 3, causal=True)
+    assert len(calls) == 4
+
+
+def test_cache_disabled(X, monkeypatch):
+    monkeypatch.setitem(smoothing.smoothing_settings, "cache_size", 0)
+    first = smooth(X, "rolling", 7)
+    first[:] = 0
+    assert smooth(X, "rolling", 7).any()
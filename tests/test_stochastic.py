@@ -0,0 +1,29 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+from utils.stochastic import StochasticSir
+
+
+def test_extinction_is_about_one_over_r0_at_any_horizon():
+    # R0 = 3 from a single case: a third of the runs die out early, the others burn out well before a year
+    summaries = [StochasticSir(10000, 1, 0, 0.3, 0.1, days, n_runs=4000, seed=0).simulate() for days in (120, 365)]
+    for summary in summaries:
+        np.testing.assert_allclose(summary["extinction_probability"], 1 / 3, atol=0.03)
+        np.testing.assert_allclose(summary["extinction_probability"] + summary["major_outbreak_probability"], 1)
+    assert summaries[0]["extinction_probability"] == summaries[1]["extinction_probability"]
+
+    # the final size of the major outbreaks is about the deterministic one (94% of the population)
+    np.testing.assert_allclose(summaries[1]["final_size_major"][2], 0.94 * 10000, rtol=0.01)
+    assert summaries[1]["final_size"][0] < 10
+
+
+def test_no_major_outbreak():
+    summary = StochasticSir(10000, 1, 0, 0.05, 0.1, 365, n_runs=1000, seed=0).simulate()
+    assert summary["major_outbreak_probability"] == 0
+    assert summary["extinction_probability"] == 1
+    assert np.isnan(summary["final_size_major"]).all()
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.fixtures import make_csse
+from utils import dataproc, smoothing
+from utils.datacube import cube_from_csse
+from utils.metrics import sweep_estimated_cases
+
+
+G, J = np.array([2, 5, 8, 14, 20.0]), np.array([1, 3, 7, 20])
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+@pytest.fixture(scope="module")
+def cases(tmp_path_factory):
+    paths = make_csse(str(tmp_path_factory.mktemp("csse")), n_regions=12, n_days=120)
+    return tuple(cube_from_csse(pd.read_csv(paths[t])).values.astype(np.float64) for t in ("confirmed_cases", "death_cases"))
+
+
+def loop_reference(confirmed, deaths, smooth):
+    # one estimate per (g, j) with the original per-country estimator
+    C, D = pd.DataFrame({"confirmed_cases": confirmed}), pd.DataFrame({"confirmed_cases": deaths})
+    grid = []
+    for g in G:
+        for j in J:
+            I = dataproc.compute_estimated_infected_population(C, D, g=g, j=j).to_numpy()
+            if smooth:
+                I = smoothing.smooth(I, "savgol", 7, 3)
+                I[I < 0] = 0
+            grid.append(I)
+    return np.quantile(np.array(grid), QUANTILES, axis=0)
+
+
+@pytest.mark.parametrize("smooth", [False, True])
+def test_sweep_matches_loop(cases, smooth):
+    confirmed, deaths = cases
+    summary = sweep_estimated_cases(confirmed, deaths, G, J, QUANTILES, smooth=smooth, kernel="savgol",
+                                    dtype=np.float64, chunk=1000)
+    single = sweep_estimated_cases(confirmed[3], deaths[3], G, J, QUANTILES, smooth=smooth, kernel="savgol")
+    assert summary.shape == (len(QUANTILES),) + confirmed.shape and single.shape == (len(QUANTILES), confirmed.shape[1])
+    for i in range(len(confirmed)):
+        expected = loop_reference(confirmed[i], deaths[i], smooth)
+        np.testing.assert_allclose(summary[:, i], expected, rtol=1e-9, atol=1e-9 * expected.max())
+        if i == 3:
+            np.testing.assert_allclose(single, expected, rtol=1e-5, atol=1e-6 * expected.max())
@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import os
+import sys
+import json
+import subprocess
+import tracemalloc
+import numpy as np
+import pytest
+from utils import tracing
+from utils.tracing import span, traced
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setitem(tracing.trace_settings, "enabled", True)
+    monkeypatch.setitem(tracing.trace_settings, "memory", False)
+    tracing.reset()
+    yield
+    tracing.reset()
+
+
+@traced("test.square")
+def square(x):
+    return x * x
+
+
+def test_nested_spans(enabled):
+    with span("outer", country="Tunisia"):
+        with span("inner"):
+            pass
+        with span("inner"):
+            pass
+    events = tracing.events()
+    assert [e["name"] for e in events] == ["inner", "inner", "outer"]
+    outer = events[-1]
+    assert outer["args"] == {"country": "Tunisia"} and outer["pid"] == os.getpid()
+    for inner in events[:2]:
+        assert outer["start"] <= inner["start"]
+        assert inner["start"] + inner["duration"] <= outer["start"] + outer["duration"]
+
+    # events() is a copy, drain empties the record
+    tracing.events().clear()
+    assert len(tracing.events()) == 3
+    assert len(tracing.drain()) == 3 and tracing.events() == []
+    assert tracing.summarize() == {}
+
+
+def test_traced_decorator(enabled):
+    assert square(3) == 9 and square(4) == 16
+    assert square.__name__ == "square"
+    events = tracing.events()
+    assert [e["name"] for e in events] == ["test.square"] * 2
+    stats = tracing.summarize()["test.square"]
+    assert stats["calls"] == 2 and stats["memory"] is None
+    assert "test.square" in tracing.summary_table()
+
+
+def test_memory_peaks(enabled, monkeypatch):
+    monkeypatch.setitem(tracing.trace_settings, "memory", True)
+    started = not tracemalloc.is_tracing()
+    tracemalloc.start()
+    try:
+        with span("outer"):
+            with span("inner"):
+                x = np.ones(2**20)
+                del x
+    finally:
+        if started: tracemalloc.stop()
+    inner, outer = tracing.events()
+    assert inner["memory"] >= 8 * 2**20
+    assert outer["memory"] >= inner["memory"]
+
+
+def test_exports(enabled, tmp_path):
+    with span("data.read_csv", path="x.csv"):
+        pass
+    tracing.export_chrome_trace(str(tmp_path / "out.trace.json"))
+    tracing.export_json(str(tmp_path / "out.json"))
+    with open(str(tmp_path / "out.trace.json")) as f:
+        trace = json.load(f)["traceEvents"]
+    assert trace[0]["name"] == "data.read_csv" and trace[0]["ph"] == "X" and trace[0]["args"] == {"path": "x.csv"}
+    with open(str(tmp_path / "out.json")) as f:
+        assert json.load(f)["summary"]["data.read_csv"]["calls"] == 1
+
+
+def test_disabled_is_a_no_op(monkeypatch):
+    monkeypatch.setitem(tracing.trace_settings, "enabled", False)
+    tracing.reset()
+    assert span("outer") is tracing._null_span
+    with span("outer"):
+        assert square(2) == 4
+    assert tracing.events() == []
+
+
+def test_disabled_without_covid_trace():
+    # a fresh interpreter without COVID_TRACE records nothing and reports nothing at exit
+    env = {k: v for k, v in os.environ.items() if not k.startswith("COVID_TRACE")}
+    code = ("from utils import tracing\n"
+            "from utils.smoothing import smooth\n"
+            "smooth([1.0, 2, 3, 4, 5, 6, 7, 8], 'rolling', 3)\n"
+            "print(tracing.trace_settings['enabled'], len(tracing.events()), tracing.span('x') is tracing._null_span)")
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.stdout.split() == ["False", "0", "True"]
+    assert result.stderr == ""
@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from utils.usdata import UsDataset, read_us_csse
+
+
+DATES = ["1/22/20", "1/23/20", "1/24/20", "1/25/20", "1/26/20"]
+COUNTIES = [("Autauga", "Alabama"), ("Baldwin", "Alabama"), ("Barbour", "Alabama"), ("Aleutians East", "Alaska"),
+            ("Anchorage", "Alaska"), ("Apache", "Arizona"), ("Cochise", "Arizona"), ("Coconino", "Arizona"),
+            ("Unassigned", "Arizona"), ("Adams", "Colorado"), ("Alamosa", "Colorado")]
+
+
+def write_us_csse(path, seed, population=False):
+    # layout of time_series_covid19_{confirmed,deaths}_US.csv, with a missing FIPS and a missing value
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i, (county, state) in enumerate(COUNTIES):
+        row = {"UID": 84001001 + i, "iso2": "US", "iso3": "USA", "code3": 840,
+               "FIPS": np.nan if county == "Unassigned" else 1001.0 + i, "Admin2": county,
+               "Province_State": state, "Country_Region": "US", "Lat": 32.5, "Long_": -86.6,
+               "Combined_Key": "%s, %s, US" % (county, state)}
+        if population:
+            row["Population"] = 1000 * (i + 1)
+        row.update(zip(DATES, np.cumsum(rng.integers(0, 50, len(DATES)))))
+        rows.append(row)
+    df = pd.DataFrame(rows)
+    df.loc[3, "1/24/20"] = np.nan
+    df.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def us_paths(tmp_path):
+    return {"confirmed_cases": write_us_csse(str(tmp_path / "confirmed_US.csv"), 0),
+            "death_cases": write_us_csse(str(tmp_path / "deaths_US.csv"), 1, population=True)}
+
+
+def test_chunked_read_matches_read_csv(us_paths):
+    expected = pd.read_csv(us_paths["death_cases"])
+    for chunksize in (1, 3, 2000):
+        cube, meta = read_us_csse(us_paths["death_cases"], chunksize=chunksize)
+        assert list(cube.countries) == list(expected["Combined_Key"])
+        assert list(cube.dates) == list(pd.to_datetime(DATES, format="%m/%d/%y"))
+        np.testing.assert_array_equal(cube.values, expected[DATES].fillna(0).to_numpy(dtype=np.int32))
+        assert list(meta.columns) == ["UID", "FIPS", "county", "state", "country", "Combined_Key", "Population"]
+        np.testing.assert_array_equal(meta["FIPS"], expected["FIPS"])
+        np.testing.assert_array_equal(meta["Population"], expected["Population"])
+
+
+@pytest.mark.parametrize("level,column", [("state", "Province_State"), ("country", "Country_Region")])
+def test_rollup_matches_groupby(us_paths, level, column):
+    dataset = UsDataset(us_paths, chunksize=4)
+    cubes = dataset.level_cubes(level)
+    for data_type, path in us_paths.items():
+        expected = pd.read_csv(path).fillna({d: 0 for d in DATES}).groupby(column)[DATES].sum()
+        cube = cubes[data_type]
+        assert sorted(cube.countries) == sorted(expected.index)
+        for region in expected.index:
+            np.testing.assert_array_equal(cube.row(region), expected.loc[region].to_numpy())
+
+
+def test_region_data(us_paths):
+    dataset = UsDataset(us_paths)
+    df = dataset.region_data("Alabama", "confirmed_cases")
+    assert list(df.columns) == ["country", "date", "confirmed_cases"] and len(df) == len(DATES)
+    assert not dataset.region_data("Alabama", "recovered_cases")["confirmed_cases"].any()
+    assert dataset.region_data("Atlantis", "confirmed_cases").empty
+    assert dataset.counties.loc["Apache, Arizona, US", "Population"] == 6000
+    with pytest.raises(ValueError):
+        dataset.level_cubes("city")
@@ -0,0 +1,357 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+from .tracing import span, traced
+
+
+class CompartmentalModel:
+    # compartment names, in state order
+    compartments = ()
+
+    def __init__(self, total_population, initial, rates, number_of_days):
+        """
+        Init a compartmental model, or an ensemble of models integrated together.
+
+        Every count and rate is a scalar or an array, they are broadcast to the ensemble size;
+        with scalars only, the model is a single one and fit returns one curve per compartment.
+
+        Parameters
+        ----------
+        total_population : int or array
+            Total count of the study population.
+        initial : dict
+            Initial count per compartment, the susceptible compartment S gets the rest of the population.
+        rates : dict
+            Rates of the model (e.g. beta, gamma), set as attributes.
+        number_of_days : int
+            Number of days to foresee in the model (shared).
+        """
+        values = [total_population] + [initial.get(c, 0) for c in self.compartments[1:]] + list(rates.values())
+        self.single = all(np.ndim(v) == 0 for v in values)
+        values = [v.ravel() for v in np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in values))]
+
+        # populations and rates: floats for a single model (fast scalar derivatives), arrays for an ensemble
+        if self.single: values = [float(v[0]) for v in values]
+        self.N = values[0]
+        for name, value in zip(rates, values[len(self.compartments):]):
+            setattr(self, name, value)
+
+        # initial state (members x compartments, flattened), everyone else is susceptible
+        counts = np.array(values[1:len(self.compartments)], dtype=np.float64).reshape(len(self.compartments) - 1, -1)
+        self.y0 = np.vstack([values[0] - counts.sum(axis=0), counts]).T.ravel()
+
+        # A grid of time points (in days)
+        self.t = np.linspace(0, number_of_days, number_of_days)
+
+        # integration statistics: derivative and jacobian evaluations
+        self.nfe, self.nje = 0, 0
+
+
+    def __len__(self):
+        return len(self.y0) // len(self.compartments)
+
+
+    @classmethod
+    def from_data(cls, covid_df, total_population, number_of_days, **kwargs):
+        """
+        Init a model from the last day of a country dataframe (see CovidCountry.covid_df).
+
+        Active cases start in I, deaths in D (in R without a D compartment) and recoveries in R.
+
+        Parameters
+        ----------
+        covid_df : pandas.Dataframe
+            Country data with confirmed_cases, death_cases and recovered_cases.
+        total_population : int
+            Total count of the study population.
+        number_of_days : int
+            Number of days to foresee in the model.
+        **kwargs : dict
+            Rates and other initial counts of the model constructor.
+
+        Returns
+        -------
+        CompartmentalModel
+            Model.
+        """
+        last = covid_df.iloc[-1]
+        D, R = float(last["death_cases"]), float(last["recovered_cases"])
+        I = max(float(last["confirmed_cases"]) - D - R, 0.0)
+        initial = {"I0": I, "R0": R, "D0": D} if "D" in cls.compartments else {"I0": I, "R0": R + D}
+        return cls(total_population, number_of_days=number_of_days, **dict(initial, **kwargs))
+
+
+    def derivatives(self, *y):
+        """
+        Compute the derivatives of the compartments (scalars or arrays of the members).
+        """
+        raise NotImplementedError
+
+
+    def jacobian_entries(self, *y):
+        """
+        Compute the non-zero entries {(i, j): d(dy_i/dt) / dy_j} of the jacobian of a member.
+        """
+        raise NotImplementedError
+
+
+    def rhs(self, y, t):
+        """
+        Compute the derivatives of the model or of the whole ensemble.
+
+        Parameters
+        ----------
+        y : array
+            Flat state, the compartments of each member one after the other.
+        t : float
+            Time in days (autonomous model, unused).
+
+        Returns
+        -------
+        tuple or array
+            Derivatives, same layout as y.
+        """
+        if self.single:
+            return self.derivatives(*y)
+        return np.stack(self.derivatives(*y.reshape(-1, len(self.compartments)).T), axis=1).ravel()
+
+
+    def jacobian(self, y, t):
+        """
+        Compute the analytic jacobian of the derivatives.
+
+        Members only couple their own compartments: the jacobian of an ensemble is
+        block diagonal and given in the banded form of odeint (k - 1 sub- and super-diagonals).
+
+        Parameters
+        ----------
+        y : array
+            Flat state.
+        t : float
+            Time in days (autonomous model, unused).
+
+        Returns
+        -------
+        J : array
+            Dense jacobian (compartments x compartments) of a single model, J[i, j] = d(dy_i/dt) / dy_j,
+            banded jacobian (2 k - 1 x state size) of an ensemble, J[k - 1 + i - j, j] = d(dy_i/dt) / dy_j.
+        """
+        k = len(self.compartments)
+        if self.single:
+            J = np.zeros((k, k))
+            for (i, j), value in self.jacobian_entries(*y).items():
+                J[i, j] = value
+            return J
+
+        J = np.zeros((2 * k - 1, len(self), k))
+        for (i, j), value in self.jacobian_entries(*y.reshape(-1, k).T).items():
+            J[k - 1 + i - j, :, j] = value
+        return J.reshape(2 * k - 1, -1)
+
+
+    def fit(self, rtol=None, atol=None):
+        """
+        Integrate the model (or ensemble) with LSODA using the analytic jacobian.
+
+        LSODA only evaluates the jacobian in its stiff (BDF) mode: a non-stiff model
+        such as the SIR of main.py is integrated by the Adams method without any jacobian,
+        with the same derivative evaluations as SirFit.fit (see nfe and nje).
+
+        Parameters
+        ----------
+        rtol : float, optional
+            Relative tolerance. The default is None (odeint default).
+        atol : float, optional
+            Absolute tolerance. The default is None (odeint default).
+
+        Returns
+        -------
+        t : array
+            Time array in days.
+        *compartments : array
+            Predicted counts of every compartment in compartments order, days or members x days.
+        """
+        from scipy.integrate import odeint
+        k = len(self.compartments)
+        banded = {} if self.single else {"ml": k - 1, "mu": k - 1}
+        with span("ode.odeint", model=type(self).__name__, members=len(self)):
+            ret, info = odeint(self.rhs, self.y0, self.t, Dfun=self.jacobian, rtol=rtol, atol=atol,
+                               full_output=True, **banded)
+        self.nfe, self.nje = int(info["nfe"][-1]), int(info["nje"][-1])
+        ret = ret.reshape(len(self.t), -1, k).transpose(2, 1, 0)
+        return (self.t,) + tuple(y[0] if self.single else y for y in ret)
+
+
+    @traced("render.ode")
+    def plot_fit(self, t, *compartments, title=None, ax=None):
+        """
+        Plot fit/model results.
+
+        Parameters
+        ----------
+        t : array
+            Time array in days.
+        *compartments : array
+            Predicted counts of every compartment (as returned by fit).
+        title : str, optional
+            Plot title. The default is None (model name applied on Covid data).
+        ax : matplotlib.axes.Axes, optional
+            Axes to draw on. The default is None (current pyplot axes).
+        """
+        if ax is None:
+            import matplotlib.pyplot as plt
+            ax = plt.gca()
+
+        names = {"S": "Susceptible", "E": "Exposed", "I": "Infected", "R": "Recovered", "D": "Deaths"}
+        colors = {"S": "b", "E": "orange", "I": "r", "R": "g", "D": "k"}
+        for name, y in zip(self.compartments, compartments):
+            lines = ax.plot(t, np.atleast_2d(y).T, colors[name], alpha=0.5, lw=1)
+            lines[0].set_label(names[name])
+        ax.set_xlabel('Number of days')
+        ax.set_ylabel('Number of individuals')
+        ax.grid(True, which='major', lw=1, ls='-')
+        ax.legend(loc='center right')
+        ax.set_title(title or "%s model applied on Covid data" % type(self).__name__[:-len("Model")].upper())
+
+
+class SirModel(CompartmentalModel):
+    compartments = ("S", "I", "R")
+
+    def __init__(self, total_population, I0, R0, contract_rate, recovery_rate, number_of_days):
+        """
+        Init SIR model class (same parameters as SirFit).
+
+        Parameters
+        ----------
+        total_population : int or array
+            Total count of the study population.
+        I0 : int or array
+            Initial number of infected.
+        R0 : int or array
+            Initial number of recoveries.
+        contract_rate : float or array
+            Contract/ disease propagation rate (beta).
+        recovery_rate : float or array
+            Rate of recoveries (gamma).
+        number_of_days : int
+            Number of days to foresee in the model.
+        """
+        CompartmentalModel.__init__(self, total_population, {"I": I0, "R": R0},
+                                    {"beta": contract_rate, "gamma": recovery_rate}, number_of_days)
+
+
+    def derivatives(self, S, I, R):
+        infections = self.beta * S * I / self.N
+        recoveries = self.gamma * I
+        return -infections, infections - recoveries, recoveries
+
+
+    def jacobian_entries(self, S, I, R):
+        dS, dI = self.beta * I / self.N, self.beta * S / self.N
+        return {(0, 0): -dS, (0, 1): -dI,
+                (1, 0): dS,  (1, 1): dI - self.gamma,
+                (2, 1): self.gamma}
+
+
+class SeirModel(CompartmentalModel):
+    compartments = ("S", "E", "I", "R")
+
+    def __init__(self, total_population, I0, R0, contract_rate, recovery_rate, number_of_days,
+                 E0=0, incubation_rate=1/5.2):
+        """
+        Init SEIR model class: infected people are exposed (not yet infectious) for 1 / incubation_rate days.
+
+        Parameters
+        ----------
+        total_population : int or array
+            Total count of the study population.
+        I0 : int or array
+            Initial number of infected.
+        R0 : int or array
+            Initial number of recoveries.
+        contract_rate : float or array
+            Contract/ disease propagation rate (beta).
+        recovery_rate : float or array
+            Rate of recoveries (gamma).
+        number_of_days : int
+            Number of days to foresee in the model.
+        E0 : int or array, optional
+            Initial number of exposed. The default is 0.
+        incubation_rate : float or array, optional
+            Rate at which the exposed become infectious (sigma). The default is 1/5.2.
+        """
+        CompartmentalModel.__init__(self, total_population, {"E": E0, "I": I0, "R": R0},
+                                    {"beta": contract_rate, "sigma": incubation_rate, "gamma": recovery_rate},
+                                    number_of_days)
+
+
+    def derivatives(self, S, E, I, R):
+        infections = self.beta * S * I / self.N
+        incubations = self.sigma * E
+        recoveries = self.gamma * I
+        return -infections, infections - incubations, incubations - recoveries, recoveries
+
+
+    def jacobian_entries(self, S, E, I, R):
+        dS, dI = self.beta * I / self.N, self.beta * S / self.N
+        return {(0, 0): -dS, (0, 2): -dI,
+                (1, 0): dS,  (1, 1): -self.sigma, (1, 2): dI,
+                (2, 1): self.sigma, (2, 2): -self.gamma,
+                (3, 2): self.gamma}
+
+
+class SeirdModel(CompartmentalModel):
+    compartments = ("S", "E", "I", "R", "D")
+
+    def __init__(self, total_population, I0, R0, contract_rate, recovery_rate, number_of_days,
+                 E0=0, D0=0, incubation_rate=1/5.2, death_rate=0.001):
+        """
+        Init SEIRD model class: SEIR with deaths (D matches the death_cases column).
+
+        Parameters
+        ----------
+        total_population : int or array
+            Total count of the study population.
+        I0 : int or array
+            Initial number of infected.
+        R0 : int or array
+            Initial number of recoveries.
+        contract_rate : float or array
+            Contract/ disease propagation rate (beta).
+        recovery_rate : float or array
+            Rate of recoveries (gamma).
+        number_of_days : int
+            Number of days to foresee in the model.
+        E0 : int or array, optional
+            Initial number of exposed. The default is 0.
+        D0 : int or array, optional
+            Initial number of deaths. The default is 0.
+        incubation_rate : float or array, optional
+            Rate at which the exposed become infectious (sigma). The default is 1/5.2.
+        death_rate : float or array, optional
+            Rate of deaths of the infected (mu). The default is 0.001.
+        """
+        CompartmentalModel.__init__(self, total_population, {"E": E0, "I": I0, "R": R0, "D": D0},
+                                    {"beta": contract_rate, "sigma": incubation_rate, "gamma": recovery_rate,
+                                     "mu": death_rate}, number_of_days)
+
+
+    def derivatives(self, S, E, I, R, D):
+        infections = self.beta * S * I / self.N
+        incubations = self.sigma * E
+        recoveries, deaths = self.gamma * I, self.mu * I
+        return -infections, infections - incubations, incubations - recoveries - deaths, recoveries, deaths
+
+
+    def jacobian_entries(self, S, E, I, R, D):
+        dS, dI = self.beta * I / self.N, self.beta * S / self.N
+        return {(0, 0): -dS, (0, 2): -dI,
+                (1, 0): dS,  (1, 1): -self.sigma, (1, 2): dI,
+                (2, 1): self.sigma, (2, 2): -self.gamma - self.mu,
+                (3, 2): self.gamma,
+                (4, 2): self.mu}
@@ -5,19 +5,32 @@ Copyright (c) 2020 Ayoub Malek
 This source code is licensed under the terms of the MIT license.
 For a copy, see <https://opensource.org/licenses/MIT>.
 """
-import scipy
-import scipy.stats
 import numpy as np
-import scipy.signal
-from .visproc import plot_data
-import matplotlib.pyplot as plt
+from . import metrics, rt, smoothing
+from .tracing import span, traced
 from .logisticfit import LogisticFit
-from .dataproc import (get_country_data, compute_estimated_infected_population)
+from .dataproc import get_country_data, get_region_data
 
 
 
+# metric graph: metric -> (inputs, CovidCountry method computing it from the inputs),
+# the intermediate nodes (leading underscore) are not covid_df columns
+SOURCES = ("confirmed_cases", "death_cases", "recovered_cases")
+METRICS = {"new_cases"              : (("confirmed_cases",), "_new_cases"),
+           "death_rate"             : (("death_cases", "confirmed_cases"), "_rate"),
+           "recovery_rate"          : (("recovered_cases", "confirmed_cases"), "_rate"),
+           "daily_growth"           : (("confirmed_cases", "new_cases"), "_daily_growth"),
+           "growth_factor"          : (("new_cases",), "_growth_factor"),
+           "smoothed_growth_factor" : (("growth_factor",), "_smoothed_growth_factor"),
+           "estimated_cases"        : (("confirmed_cases", "death_cases"), "_estimated_cases"),
+           "_rt_estimate"           : (("new_cases",), "_rt_estimate"),
+           "rt"                     : (("_rt_estimate",), "_rt"),
+           "rt_lower"               : (("_rt_estimate",), "_rt_lower"),
+           "rt_upper"               : (("_rt_estimate",), "_rt_upper")}
+
+
 class CovidCountry:
-    def __init__(self, country="Tunisia", g=14, j=1, ws=7, po=3):
+    def __init__(self, country="Tunisia", g=14, j=1, ws=7, po=3, kernel="savgol", headless=False, level=None):
         """
         Init the CovidCountry class.
 
@@ -33,40 +46,287 @@ class CovidCountry:
             The smoothing window in days. The default is 7.
         po : TYPE, optional
             the smoothing polynomial order. The default is 3.
+        kernel : str, optional
+            The smoothing kernel (see smoothing.KERNELS). The default is "savgol".
+        headless : bool, optional
+            Boolean describing whether to draw on Agg figures instead of pyplot (no windows). The default is False.
+        level : str, optional
+            US region level of country: "county", "state" or "country" (US files, no recovered cases).
+            The default is None (global data).
         """
         self.country = country
-        self.confirmed_cases_df = get_country_data(self.country, "confirmed_cases")
-        self.death_cases_df     = get_country_data(self.country, "death_cases")
-        self.recovered_cases_df = get_country_data(self.country, "recovered_cases")
+        self.level = level
+
+        # computed metrics (see METRICS) and the settings they were computed with
+        self._metrics, self._metrics_settings = {}, None
+        self._covid_df = None
+
+        # country data, loaded on first access
+        self._sources = {}
 
         # init infections estimations vars
         self.g, self.j = g, j
 
-        # window size in days and polynomial order
-        self.ws, self.po = ws, po
+        # smoothing kernel, window size in days and polynomial order
+        self.kernel, self.ws, self.po = kernel, ws, po
 
+        # render mode
+        self.headless = headless
 
-    def parse_data(self):
+
+    @property
+    def confirmed_cases_df(self):
+        return self._source("confirmed_cases")
+
+
+    @confirmed_cases_df.setter
+    def confirmed_cases_df(self, df):
+        self._set_source("confirmed_cases", df)
+
+
+    @property
+    def death_cases_df(self):
+        return self._source("death_cases")
+
+
+    @death_cases_df.setter
+    def death_cases_df(self, df):
+        self._set_source("death_cases", df)
+
+
+    @property
+    def recovered_cases_df(self):
+        return self._source("recovered_cases")
+
+
+    @recovered_cases_df.setter
+    def recovered_cases_df(self, df):
+        self._set_source("recovered_cases", df)
+
+
+    def _source(self, name):
+        if name not in self._sources:
+            self._sources[name] = self._load(name)
+        return self._sources[name]
+
+
+    def _load(self, name):
+        if self.level is None:
+            return get_country_data(self.country, name)
+        return get_region_data(self.country, name, self.level)
+
+
+    def _set_source(self, name, df):
+        self._sources[name] = df
+        self.invalidate(name)
+
+
+    def reload(self):
         """
-        Get COVID-19 data for a certain country [source: CSSE at Johns Hopkins University].
+        Re-read the loaded country data from the dataset, dropping the metrics of the sources that changed.
+        """
+        for name in list(self._sources):
+            df = self._load(name)
+            if not df.equals(self._sources[name]):
+                self._set_source(name, df)
+
+
+    def invalidate(self, name=None):
+        """
+        Drop a computed metric and every metric depending on it.
 
         Parameters
         ----------
-        country : str
-            Country to collect data for.
-        type_of_data : str
-            Type of data to collect.
+        name : str, optional
+            Source or metric name. The default is None (all metrics).
+        """
+        if name is None:
+            self._metrics.clear()
+            self._covid_df = None
+            return
+
+        # drop the metric, then its dependents
+        stale = [name]
+        while stale:
+            node = stale.pop()
+            self._metrics.pop(node, None)
+            stale += [m for m, (inputs, _) in METRICS.items() if node in inputs and m in self._metrics]
+        self._covid_df = None
+
+
+    def metric(self, name):
+        """
+        Get a metric, computing it and its missing inputs only once.
+
+        Parameters
+        ----------
+        name : str
+            Source (confirmed_cases, death_cases, recovered_cases) or metric name (key of METRICS).
+
+        Returns
+        -------
+        array or dict
+            Read-only metric values, one per date (dict of them for the intermediate nodes).
+        """
+        # smoothing and estimation settings changed: recompute everything
+        settings = (self.g, self.j, self.kernel, self.ws, self.po, tuple(rt.rt_settings.items()))
+        if settings != self._metrics_settings:
+            self.invalidate()
+            self._metrics_settings = settings
+
+        if name not in self._metrics:
+            if name in SOURCES:
+                values = np.asarray(self._source(name)["confirmed_cases"].values)
+                values.flags.writeable = False
+            else:
+                inputs, method = METRICS[name]
+                args = [self.metric(i) for i in inputs]
+                with span("metric." + name, country=self.country):
+                    values = getattr(self, method)(*args)
+                values = {key: self._frozen(v) for key, v in values.items()} if isinstance(values, dict) else self._frozen(values)
+            self._metrics[name] = values
+        return self._metrics[name]
+
+
+    @staticmethod
+    def _frozen(values):
+        values = np.array(values, dtype=np.float64)
+        values.flags.writeable = False
+        return values
+
+
+    def _new_cases(self, confirmed_cases):
+        return metrics.compute_new_cases(confirmed_cases)
+
+
+    def _rate(self, cases, confirmed_cases):
+        return metrics.compute_rate(cases, confirmed_cases)
+
+
+    def _daily_growth(self, confirmed_cases, new_cases):
+        # linear growth rate (negative values removed)
+        return metrics.compute_daily_growth(confirmed_cases, new_cases)
+
+
+    def _growth_factor(self, new_cases):
+        return metrics.compute_growth_factor(new_cases, smooth=False)
+
+
+    def _smoothed_growth_factor(self, growth_factor):
+        # smoothen results: window size 7 (1 week), polynomial order 3 (negative values removed)
+        factor = smoothing.smooth(growth_factor, self.kernel, self.ws, self.po)
+        factor[factor < 0] = 0
+        return factor
+
+
+    def _estimated_cases(self, confirmed_cases, death_cases):
+        # compute estimated infected population
+        I = metrics.compute_estimated_cases(confirmed_cases, death_cases, g=self.g, j=self.j)
+
+        # smoothen results: window size 7 (1 week), polynomial order 3 by default
+        I = smoothing.smooth(I, self.kernel, self.ws, self.po)
+        I[I < 0] = 0
+        return I
+
+
+    def _rt_estimate(self, new_cases):
+        # one estimation for the mean and the bounds
+        return rt.estimate_rt(new_cases)
+
+
+    def _rt(self, estimate):
+        return estimate["mean"]
+
+
+    def _rt_lower(self, estimate):
+        return estimate["lower"]
+
+
+    def _rt_upper(self, estimate):
+        return estimate["upper"]
+
+
+    @property
+    def covid_df(self):
+        """
+        Dataframe of the country data and of the metrics computed so far.
+        """
+        if self._covid_df is None:
+            import pandas as pd
+            sources = {name: self.metric(name) for name in SOURCES}
+            self._covid_df = pd.DataFrame(dict({"country": self.country,
+                                                "date": self.confirmed_cases_df["date"].values}, **sources))
+
+        # expose the metrics computed since
+        for name, values in self._metrics.items():
+            if name not in self._covid_df and not name.startswith("_"):
+                self._covid_df[name] = values
+        return self._covid_df
+
+
+    @traced("country.parse_data")
+    def parse_data(self):
+        """
+        Get COVID-19 data for a certain country [source: CSSE at Johns Hopkins University].
+
+        Metrics are computed on demand (see metric), this only builds covid_df
+        with the confirmed, death and recovered cases and the new cases.
 
         Returns
         -------
         df : pandas.Dataframe
             Dataframe with COVID-19 information.
         """
-        # merge data columns
-        self.covid_df = self.confirmed_cases_df
-        self.covid_df["death_cases"] = self.death_cases_df["confirmed_cases"]
-        self.covid_df["recovered_cases"] = self.recovered_cases_df["confirmed_cases"]
-        self.covid_df["new_cases"] = abs(self.covid_df["confirmed_cases"] - self.covid_df["confirmed_cases"].shift(1).fillna(0))
+        self.metric("new_cases")
+        return self.covid_df
+
+
+    def plot_chart(self, chart, smooth=True, title=None, save=False, fname=None, columns=None):
+        """
+        Plot a chart of the country metrics, on pyplot or on an Agg figure in headless mode.
+
+        Parameters
+        ----------
+        chart : str
+            Chart name (key of render.CHARTS).
+        smooth : bool, optional
+            Boolean describing whether or not to smooth the curves. The default is True.
+        title : str, optional
+            Plot title. The default is None (chart title).
+        save : bool, optional
+            Boolean describing whether to save plot or not. The default is False.
+        fname : str, optional
+            Name of plot. The default is None.
+        columns : dict, optional
+            Curves replacing the chart metrics. The default is None.
+
+        Returns
+        -------
+        fig : matplotlib.figure.Figure
+            Headless figure, None with pyplot.
+        """
+        # deferred: matplotlib is only needed to plot
+        import matplotlib.pyplot as plt
+        from .render import CHARTS, new_figure, draw_chart
+
+        # compute the chart metrics only
+        columns = dict({column: self.metric(column) for column, _ in CHARTS[chart][1]
+                        if column not in (columns or {})}, **(columns or {}))
+        dates = self.confirmed_cases_df["date"].values
+
+        if self.headless:
+            with span("render.chart", chart=chart, country=self.country):
+                fig, ax = new_figure()
+                draw_chart(ax, chart, dates, columns, smooth, title,
+                           self.kernel, self.ws, self.po)
+                if save: fig.savefig(fname)
+            return fig
+
+        with span("render.chart", chart=chart, country=self.country):
+            draw_chart(plt.gca(), chart, dates, columns, smooth, title,
+                       self.kernel, self.ws, self.po)
+            if save: plt.savefig(fname)
+        plt.show()
 
 
     def compute_death_rate(self, smooth=True,
@@ -87,22 +347,16 @@ class CovidCountry:
             Boolean describing whether to save plot or not. The default is False.
         fname : str, optional
             Name of plot. The default is "death_rate.png".
-        """
-        self.covid_df["death_rate"]  = self.covid_df["death_cases"] / self.covid_df["confirmed_cases"]
-        self.covid_df["death_rate"]  = self.covid_df["death_rate"].fillna(0)
-        self.covid_df["death_rate"][self.covid_df["death_rate"] < 0] = 0
 
+        Returns
+        -------
+        array
+            Death rate.
+        """
         # plot data
         if plot:
-            plot_data(self.covid_df.date, self.covid_df["death_rate"],
-                      smooth=smooth, label="Death rate of COVID-19",
-                      color="grey", ls="--", save=False)
-            plt.title(title)
-            plt.show()
-
-        # save plot to file
-        if save:
-            plt.savefig(fname)
+            self.plot_chart("death_rate", smooth, title, save, fname)
+        return self.metric("death_rate")
 
 
     def compute_recovery_rate(self, smooth=True,
@@ -123,22 +377,16 @@ class CovidCountry:
             Boolean describing whether to save plot or not. The default is False.
         fname : str, optional
             Name of plot. The default is "recovery_rate.png".
-        """
-        self.covid_df["recovery_rate"]  = self.covid_df["recovered_cases"] / self.covid_df["confirmed_cases"]
-        self.covid_df["recovery_rate"]  = self.covid_df["recovery_rate"].fillna(0)
-        self.covid_df["recovery_rate"][self.covid_df["recovery_rate"] < 0] = 0
 
+        Returns
+        -------
+        array
+            Recovery rate.
+        """
         # plot data
         if plot:
-            plot_data(self.covid_df.date, self.covid_df["recovery_rate"],
-                      smooth=smooth, label="Recovery rate of COVID-19",
-                      color="grey", ls="--", save=False)
-            plt.title(title)
-            plt.show()
-
-        # save plot to file
-        if save:
-            plt.savefig(fname)
+            self.plot_chart("recovery_rate", smooth, title, save, fname)
+        return self.metric("recovery_rate")
 
 
     def compute_estimations(self, smooth=True,
@@ -162,30 +410,13 @@ class CovidCountry:
 
         Returns
         -------
-        df : pandas.Dataframe
-            Dataframe with COVID-19 information.
+        array
+            Estimated number of cases.
         """
-        # compute estimated infected population
-        I = compute_estimated_infected_population(self.confirmed_cases_df, self.death_cases_df, g=self.g, j=self.j)
-        self.covid_df["estimated_cases"] = I
-
-        # smoothen results: window size 7 (1 week), polynomial order 3
-        self.covid_df["estimated_cases"] = scipy.signal.savgol_filter(I, self.ws, self.po)
-        self.covid_df["estimated_cases"][self.covid_df["estimated_cases"] < 0] = 0
-
         # plot data
         if plot:
-            plot_data( self.covid_df.date, self.confirmed_cases_df["confirmed_cases"],
-                      label="Confirmed COVID-19 cases", color="orange")
-            plot_data(self.covid_df.date, self.covid_df["estimated_cases"],
-                      smooth=smooth, label="Estimated COVID-19 cases",
-                      color="purple", ls="--")
-            plt.title(title)
-            plt.show()
-
-        # save plot to file
-        if save:
-            plt.savefig(fname)
+            self.plot_chart("estimated_cases", smooth, title, save, fname)
+        return self.metric("estimated_cases")
 
 
     def compute_daily_growth(self, smooth=True,
@@ -206,27 +437,16 @@ class CovidCountry:
             Boolean describing whether to save plot or not. The default is False.
         fname : str, optional
             Name of plot. The default is "daily_growth.png".
-        """
-        # compute linear growth rate
-        self.covid_df["daily_growth"]  = abs(self.covid_df["confirmed_cases"] - self.covid_df["confirmed_cases"].shift(1).fillna(0))
-        self.covid_df["daily_growth"] /= self.covid_df["confirmed_cases"].shift(1).fillna(0)
-        self.covid_df["daily_growth"]  = self.covid_df["daily_growth"].fillna(0)
-        self.covid_df["daily_growth"]  = self.covid_df["daily_growth"].replace(np.inf, self.covid_df["new_cases"])
-
-        # remove negative values
-        self.covid_df["daily_growth"][self.covid_df["daily_growth"] < 0] = 0
 
+        Returns
+        -------
+        array
+            Daily growth.
+        """
         # plot data
         if plot:
-            plot_data(self.covid_df.date, self.covid_df["daily_growth"],
-                      smooth=smooth, label="Daily growth of COVID-19 cases",
-                      color="grey", ls="--", save=False)
-            plt.title(title)
-            plt.show()
-
-        # save plot to file
-        if save:
-            plt.savefig(fname)
+            self.plot_chart("daily_growth", smooth, title, save, fname)
+        return self.metric("daily_growth")
 
 
     def compute_growth_factor(self, smooth=True,
@@ -247,40 +467,58 @@ class CovidCountry:
             Boolean describing whether to save plot or not. The default is False.
         fname : str, optional
             Name of plot. The default is "growth_factor.png".
+
+        Returns
+        -------
+        array
+            Growth factor.
         """
-        self.covid_df["growth_factor"] = self.covid_df["new_cases"] / self.covid_df["new_cases"].shift(1).fillna(0)
-        self.covid_df["growth_factor"] = self.covid_df["growth_factor"].fillna(0)
-        self.covid_df["growth_factor"] = self.covid_df["growth_factor"].replace(np.inf, self.covid_df["new_cases"])
+        factor = self.metric("smoothed_growth_factor" if smooth else "growth_factor")
 
-        # smoothen results: window size 7 (1 week), polynomial order 3
-        if smooth: self.covid_df["growth_factor"] = scipy.signal.savgol_filter(self.covid_df["growth_factor"], self.ws, self.po)
+        # plot data
+        if plot:
+            self.plot_chart("growth_factor", smooth, title, save, fname, {"growth_factor": factor})
+        return factor
 
-        # remove negative values
-        self.covid_df["growth_factor"][self.covid_df["growth_factor"] < 0] = 0
 
-        # plot growth factor
-        if plot:
-            plot_data(self.covid_df.date, self.covid_df["growth_factor"],
-                      smooth=smooth, label="Growth factor of COVID-19 cases",
-                      color="grey", ls="--", save=False)
-            plt.title(title)
-            plt.show()
+    def compute_rt(self,
+                   plot=True, title="Covid-19 reproduction number (Rt)",
+                   save=False, fname="rt.png"):
+        """
+        Compute and plot the reproduction number Rt and its 95% credible interval (see rt.estimate_rt).
 
-        # save plot to file
-        if save:
-            plt.savefig(fname)
+        Parameters
+        ----------
+        plot : bool, optional
+            Boolean describing whether to plot data or not. The default is True.
+        title : str, optional
+            Plot title. The default is "Covid-19 reproduction number (Rt)".
+        save : bool, optional
+            Boolean describing whether to save plot or not. The default is False.
+        fname : str, optional
+            Name of plot. The default is "rt.png".
+
+        Returns
+        -------
+        array
+            Rt posterior mean, NaN before the first cases.
+        """
+        # plot data
+        if plot:
+            self.plot_chart("rt", False, title, save, fname)
+        return self.metric("rt")
 
 
-    def logisitc_fit(self, p0=[0, 1, 1, 1],
+    def logisitc_fit(self, p0=None,
                      plot=True, title='Least-squares 4PL fit to covid-19 data',
-                     save=False, fname="logistic_fit.png"):
+                     save=False, fname="logistic_fit.png", warm=None, n_boot=0, bootstrap="residual"):
         """
         Fit to a logistic curve model.
 
         Parameters
         ----------
-        smooth : bool, optional
-            Boolean describing whether or not to smooth the curve. The default is True.
+        p0 : list, optional
+            Initial 4PL parameters. The default is None (estimated from the data).
         plot : bool, optional
             Boolean describing whether to plot data or not. The default is True.
         title : str, optional
@@ -289,15 +527,37 @@ class CovidCountry:
             Boolean describing whether to save plot or not. The default is False.
         fname : str, optional
             Name of plot. The default is "logistic_fit.png".
+        warm : bool, optional
+            Boolean describing whether to warm-start from the last saved fit of the country
+            (without p0) and to save this one. The default is None (fit_state_settings).
+        n_boot : int, optional
+            Number of bootstrap replicates of the prediction bands (see LogisticFit.bootstrap). The default is 0 (no bands).
+        bootstrap : str, optional
+            Bootstrap method: "residual" or "parametric". The default is "residual".
+
+        Returns
+        -------
+        lgf : LogisticFit
+            Fitted model (parameters in lgf.plsq, function evaluations in lgf.nfev).
         """
         # init data
         t = np.arange(0, self.covid_df.shape[0])
         v = self.covid_df["confirmed_cases"].values
 
-        # fit
+        # fit, from the previous state of the series if any (fitstate pulls in the http stack)
+        from . import fitstate
+        warm = fitstate.fit_state_settings["enabled"] if warm is None else warm
+        key = (self.country if self.level is None else self.level + ":" + self.country, "confirmed_cases")
         lgf = LogisticFit(t, v, p0)
-        lgf.fit_data()
+        lgf.fit_data(fitstate.load_state(key) if warm and p0 is None else None)
+        if warm:
+            fitstate.save_state(key, lgf.state())
+
+        # prediction bands
+        if n_boot:
+            lgf.bootstrap(n_boot, bootstrap)
 
         # plot fit
         if plot:
             lgf.plot_results(self.covid_df["date"].values, save, fname, title)
+        return lgf
@@ -5,8 +5,12 @@ Copyright (c) 2020 Ayoub Malek
 This source code is licensed under the terms of the MIT license.
 For a copy, see <https://opensource.org/licenses/MIT>.
 """
-from .dataproc import get_world_data
+import numpy as np
+import pandas as pd
+from .dataproc import get_dataset
+from .metrics import sweep_estimated_cases
 from .visproc import plot_points_cloud
+from .tracing import span, traced
 
 
 class CovidWorld:
@@ -14,26 +18,148 @@ class CovidWorld:
         """
         Init Covid world class.
         """
-        # world data
-        self.world_confirmed_cases_df = get_world_data(data_type="confirmed_cases")
-        self.world_death_cases_df     = get_world_data(data_type="death_cases")
-        self.world_recovered_cases_df = get_world_data(data_type="recovered_cases")
+        # world data: aligned country x date cubes
+        cubes = get_dataset().cubes()
+        self.confirmed_cases_cube = cubes["confirmed_cases"]
+        self.death_cases_cube     = cubes["death_cases"]
+        self.recovered_cases_cube = cubes["recovered_cases"]
 
+        # date x country snapshot index, built on first use
+        self._snapshots = None
 
+
+    @property
+    def world_confirmed_cases_df(self):
+        return self.confirmed_cases_cube.to_long()
+
+
+    @property
+    def world_death_cases_df(self):
+        return self.death_cases_cube.to_long()
+
+
+    @property
+    def world_recovered_cases_df(self):
+        return self.recovered_cases_cube.to_long()
+
+
+    @traced("world.parse_data")
     def parse_data(self):
         """
         Parse dataframe data.
         """
-        # merge data columns
-        self.world_covid_df = self.world_confirmed_cases_df
-        self.world_covid_df["death_cases"] = self.world_death_cases_df["confirmed_cases"]
-        self.world_covid_df["recovered_cases"] = self.world_recovered_cases_df["confirmed_cases"]
+        # merge data columns (cubes share countries and dates, date-major order)
+        self.world_covid_df = self.confirmed_cases_cube.to_long()
+        self.world_covid_df["death_cases"] = self.death_cases_cube.values.T.ravel()
+        self.world_covid_df["recovered_cases"] = self.recovered_cases_cube.values.T.ravel()
 
         # compute death rates
         self.world_covid_df["death_rate"]  = self.world_covid_df["death_cases"] / self.world_covid_df["confirmed_cases"]
         self.world_covid_df["death_rate"]  = self.world_covid_df["death_rate"].fillna(0)
 
 
+    @property
+    def snapshots(self):
+        """
+        Immutable date x country index: one read-only (dates x countries) matrix
+        per data type, built once so that any date cross-section is a row lookup.
+
+        Returns
+        -------
+        snapshots : dict
+            dates, countries and the confirmed_cases, death_cases and recovered_cases matrices.
+        """
+        if self._snapshots is None:
+            snapshots = {"dates": self.confirmed_cases_cube.dates,
+                         "countries": pd.Index(self.confirmed_cases_cube.countries.astype(str), name="country")}
+            for name, cube in (("confirmed_cases", self.confirmed_cases_cube),
+                               ("death_cases", self.death_cases_cube),
+                               ("recovered_cases", self.recovered_cases_cube)):
+                snapshots[name] = np.ascontiguousarray(np.asarray(cube.values).T)
+                snapshots[name].flags.writeable = False
+            self._snapshots = snapshots
+        return self._snapshots
+
+
+    def snapshot(self, date, countries=None):
+        """
+        Get the per-country cross-section of a date.
+
+        Parameters
+        ----------
+        date : str
+            Date of the cross-section.
+        countries : list, optional
+            Countries to keep. The default is None (all countries).
+
+        Returns
+        -------
+        df : pandas.Dataframe
+            Confirmed, death and recovered cases and death rate, indexed by country.
+        """
+        snapshots = self.snapshots
+        k = snapshots["dates"].get_loc(pd.Timestamp(date))
+        df = pd.DataFrame({name: snapshots[name][k] for name in ("confirmed_cases", "death_cases", "recovered_cases")},
+                          index=snapshots["countries"])
+        if countries is not None:
+            df = df[df.index.isin(countries)]
+        df["death_rate"] = df["death_cases"] / df["confirmed_cases"]
+        return df
+
+
+    def snapshots_for(self, dates, countries=None):
+        """
+        Get the cross-sections of several dates from the same index.
+
+        Parameters
+        ----------
+        dates : list
+            Dates of the cross-sections.
+        countries : list, optional
+            Countries to keep. The default is None (all countries).
+
+        Returns
+        -------
+        dict
+            Cross-section dataframe per date.
+        """
+        return {date: self.snapshot(date, countries) for date in dates}
+
+
+    def sweep_estimations(self, g, j, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), smooth=False, ws=7, po=3, kernel=None):
+        """
+        Evaluate the estimated infected population of every country over a grid of (g, j) values.
+
+        Parameters
+        ----------
+        g : array
+            Values of g (average number of days taken for a case to lead to death).
+        j : array
+            Values of j (number of days to estimate the rates on).
+        quantiles : array, optional
+            Quantiles computed over the grid. The default is (0.05, 0.25, 0.5, 0.75, 0.95).
+        smooth : bool, optional
+            Boolean describing whether or not to smooth the estimates. The default is False.
+        ws : int, optional
+            The smoothing window in days. The default is 7.
+        po : int, optional
+            The smoothing polynomial order. The default is 3.
+        kernel : str, optional
+            Smoothing kernel (see smoothing.KERNELS). The default is None (smoothing_settings).
+
+        Returns
+        -------
+        sweep : dict
+            quantiles, countries, dates and the (quantiles x countries x dates) estimates.
+        """
+        with span("world.sweep_estimations", grid=np.size(g) * np.size(j)):
+            estimates = sweep_estimated_cases(self.confirmed_cases_cube.values, self.death_cases_cube.values,
+                                              g, j, quantiles, smooth, ws, po, kernel)
+        return {"quantiles": np.asarray(quantiles), "countries": self.confirmed_cases_cube.countries,
+                "dates": self.confirmed_cases_cube.dates, "estimates": estimates}
+
+
+    @traced("render.world")
     def plot_countries(self, filter_date="2020-03-25",
                        filter_countries=["China", "France", "Germany", "Italy", "Spain", "Tunisia", "US"],
                        title="Covid-19 Confirmed cases to death cases on "):
@@ -49,14 +175,11 @@ class CovidWorld:
         title : str, optional
             Plot title. The default is "Covid-19 Confirmed cases to death cases on ".
         """
-        # filter data on date
-        self.world_covid_df = self.world_covid_df[self.world_covid_df.date == filter_date]
-        self.world_covid_df = self.world_covid_df[self.world_covid_df.country.isin(filter_countries)]
-        self.world_covid_df = self.world_covid_df.groupby("country").sum()
-        self.world_covid_df["death_rate"] = self.world_covid_df["death_cases"] / self.world_covid_df["confirmed_cases"]
-        self.world_covid_df["country"]    = self.world_covid_df.index
+        # cross-section of the date (the world data is left untouched)
+        df = self.snapshot(filter_date, filter_countries)
+        df["country"] = df.index
 
         # plot cloud
-        plot_points_cloud(self.world_covid_df, title + filter_date,
+        plot_points_cloud(df, title + filter_date,
                           "death_cases", "confirmed_cases", "country",
                           color='red')
@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import os
+import json
+import time
+import hashlib
+import warnings
+import urllib.error
+from .fetcher import RETRY_STATUSES, download, fetch_all
+
+
+cache_settings = {"cache_dir": os.environ.get("COVID_CACHE_DIR",
+                                              os.path.join(os.path.expanduser("~"), ".cache", "covid-19-study")),
+                  "ttl"      : float(os.environ.get("COVID_CACHE_TTL", 3600)),
+                  "offline"  : os.environ.get("COVID_OFFLINE", "0").lower() in ("1", "true", "yes")}
+
+
+def configure_cache(cache_dir=None, ttl=None, offline=None):
+    """
+    Update the download cache settings.
+
+    Parameters
+    ----------
+    cache_dir : str, optional
+        Directory holding the cached files. The default is None (unchanged).
+    ttl : float, optional
+        Time in seconds during which a cached file is used without revalidation. The default is None (unchanged).
+    offline : bool, optional
+        Boolean describing whether to never touch the network. The default is None (unchanged).
+    """
+    if cache_dir is not None: cache_settings["cache_dir"] = cache_dir
+    if ttl is not None: cache_settings["ttl"] = float(ttl)
+    if offline is not None: cache_settings["offline"] = bool(offline)
+
+
+def _cache_paths(url, cache_dir):
+    """
+    Get the data and metadata file paths of a cached url.
+
+    Parameters
+    ----------
+    url : str
+        Cached url.
+    cache_dir : str
+        Cache directory.
+
+    Returns
+    -------
+    data_path : str
+        Path of the cached file.
+    meta_path : str
+        Path of the cached file metadata (ETag, Last-Modified, fetch time).
+    """
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    name = key + "_" + os.path.basename(url.split("?")[0])
+    data_path = os.path.join(cache_dir, name)
+    return data_path, data_path + ".json"
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(meta_path, meta):
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def cached_path(url, cache_dir=None, ttl=None, offline=None):
+    """
+    Get a local path for the given url, downloading it only when needed.
+
+    A cached copy younger than ttl is used as is. An older copy is revalidated
+    with its ETag/Last-Modified headers and only re-downloaded if it changed.
+    When the server cannot be reached or keeps answering with a retryable
+    error status, the stale copy is used with a warning.
+    Urls that are not http(s) are treated as local paths and returned untouched.
+
+    Parameters
+    ----------
+    url : str
+        Url of the file to get.
+    cache_dir : str, optional
+        Cache directory. The default is None (use cache_settings).
+    ttl : float, optional
+        Time to live in seconds of a cached copy. The default is None (use cache_settings).
+    offline : bool, optional
+        Boolean describing whether to never touch the network. The default is None (use cache_settings).
+
+    Returns
+    -------
+    data_path : str
+        Path of the local copy.
+    """
+    if not url.startswith(("http://", "https://")):
+        return url
+
+    # resolve settings
+    cache_dir = cache_settings["cache_dir"] if cache_dir is None else cache_dir
+    ttl = cache_settings["ttl"] if ttl is None else ttl
+    offline = cache_settings["offline"] if offline is None else offline
+
+    os.makedirs(cache_dir, exist_ok=True)
+    data_path, meta_path = _cache_paths(url, cache_dir)
+    meta = _read_meta(meta_path)
+    is_cached = os.path.exists(data_path)
+
+    # serve from cache without touching the network
+    if is_cached and (offline or time.time() - meta.get("fetched", 0) < ttl):
+        return data_path
+    if offline:
+        raise FileNotFoundError("No cached copy of %s in offline mode." % url)
+
+    # conditional request
+    headers = {}
+    if is_cached and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if is_cached and meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        status, response_headers = download(url, data_path, headers)
+        if status != 304:
+            meta = {"url": url,
+                    "etag": response_headers.get("ETag"),
+                    "last_modified": response_headers.get("Last-Modified")}
+
+    except urllib.error.HTTPError as e:
+        # server errors (5xx, 429, ...) that outlived the retries: serve the stale copy
+        if not is_cached or e.code not in RETRY_STATUSES:
+            raise
+        warnings.warn("Could not revalidate %s (HTTP %d), using the cached copy." % (url, e.code))
+        return data_path
+
+    except urllib.error.URLError as e:
+        if not is_cached:
+            raise
+        warnings.warn("Could not revalidate %s (%s), using the cached copy." % (url, e.reason))
+        return data_path
+
+    # refresh fetch time
+    meta["fetched"] = time.time()
+    _write_meta(meta_path, meta)
+    return data_path
+
+
+def cached_paths(urls, cache_dir=None, ttl=None, offline=None):
+    """
+    Get local paths for several urls, downloading them concurrently.
+
+    Parameters
+    ----------
+    urls : list
+        Urls of the files to get.
+    cache_dir : str, optional
+        Cache directory. The default is None (use cache_settings).
+    ttl : float, optional
+        Time to live in seconds of a cached copy. The default is None (use cache_settings).
+    offline : bool, optional
+        Boolean describing whether to never touch the network. The default is None (use cache_settings).
+
+    Returns
+    -------
+    paths : list
+        Paths of the local copies, in the order of the urls.
+    """
+    return fetch_all(lambda url: cached_path(url, cache_dir, ttl, offline), urls)
@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+import pandas as pd
+from .tracing import traced
+
+
+class CovidCube:
+    def __init__(self, countries, dates, values):
+        """
+        Init CovidCube class: a compact country x date matrix of case counts.
+
+        Parameters
+        ----------
+        countries : array
+            Country names, one per row.
+        dates : array
+            Dates, one per column.
+        values : numpy.ndarray
+            Case counts matrix (countries x dates).
+        """
+        self.countries = pd.CategoricalIndex(countries, name="country")
+        self.dates     = pd.DatetimeIndex(dates, name="date")
+        self.values    = values
+
+        # row of each country
+        self._rows = {c: i for i, c in enumerate(self.countries)}
+
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+
+    def __contains__(self, country):
+        return country in self._rows
+
+
+    def row(self, country):
+        """
+        Get the time series of a country.
+
+        Parameters
+        ----------
+        country : str
+            Country name.
+
+        Returns
+        -------
+        array
+            Case counts of the country.
+        """
+        return self.values[self._rows[country]]
+
+
+    def reindex(self, countries=None, dates=None):
+        """
+        Conform the cube to the given countries and dates, missing entries are 0.
+
+        Parameters
+        ----------
+        countries : array, optional
+            Target countries. The default is None (unchanged).
+        dates : array, optional
+            Target dates. The default is None (unchanged).
+
+        Returns
+        -------
+        cube : CovidCube
+            Reindexed cube.
+        """
+        countries = self.countries if countries is None else pd.Index(countries)
+        dates = self.dates if dates is None else pd.DatetimeIndex(dates)
+        if countries.equals(self.countries) and dates.equals(self.dates):
+            return self
+
+        # map target rows and columns to source ones (-1 = missing)
+        ri = pd.Index(self.countries.astype(object)).get_indexer(countries)
+        ci = self.dates.get_indexer(dates)
+        values = np.zeros((len(countries), len(dates)), dtype=self.values.dtype)
+        rmask, cmask = ri >= 0, ci >= 0
+        values[np.ix_(rmask, cmask)] = self.values[np.ix_(ri[rmask], ci[cmask])]
+        return CovidCube(countries, dates, values)
+
+
+    def rollup(self, groups):
+        """
+        Sum the rows of the cube per group (e.g. counties to states).
+
+        Parameters
+        ----------
+        groups : array
+            Group of each row.
+
+        Returns
+        -------
+        cube : CovidCube
+            Group x date cube.
+        """
+        labels, values = group_sum(groups, np.asarray(self.values))
+        return CovidCube(labels, self.dates, values)
+
+
+    @traced("data.melt")
+    def to_long(self, countries=None, value_name="confirmed_cases"):
+        """
+        Build the long (melted) dataframe view of the cube.
+
+        Parameters
+        ----------
+        countries : list, optional
+            Countries to include. The default is None (all countries).
+        value_name : str, optional
+            Name of the values column. The default is "confirmed_cases".
+
+        Returns
+        -------
+        df : pandas.Dataframe
+            Dataframe with the columns country, date and value_name (date-major order).
+        """
+        if countries is None:
+            rows = np.arange(len(self.countries))
+        else:
+            rows = np.array([self._rows[c] for c in countries if c in self._rows], dtype=int)
+
+        # date-major order, same as pandas.melt
+        codes = np.tile(self.countries.codes[rows], len(self.dates))
+        return pd.DataFrame({"country": pd.Categorical.from_codes(codes, self.countries.categories),
+                             "date": np.repeat(self.dates.values, len(rows)),
+                             value_name: self.values[rows].T.ravel()})
+
+
+@traced("data.cube")
+def cube_from_csse(df, dtype=np.int32):
+    """
+    Build a cube from a wide CSSE table, summing the province rows of each country.
+
+    Parameters
+    ----------
+    df : pandas.Dataframe
+        Wide CSSE table (Province/State, Country/Region, Lat, Long, dates...).
+    dtype : numpy.dtype, optional
+        Values dtype. The default is numpy.int32.
+
+    Returns
+    -------
+    cube : CovidCube
+        Country x date cube.
+    """
+    # pre-sum provinces (missing values count as 0)
+    raw = df.iloc[:, 4:].to_numpy(dtype=np.float64, na_value=0)
+    countries, values = group_sum(df["Country/Region"], raw)
+    return CovidCube(countries, parse_dates(df.columns[4:]), values.astype(dtype))
+
+
+def group_sum(keys, values):
+    """
+    Sum the rows sharing a key.
+
+    Parameters
+    ----------
+    keys : array
+        Key of each row.
+    values : numpy.ndarray
+        Values (rows x dates).
+
+    Returns
+    -------
+    groups : pandas.Index
+        Sorted unique keys.
+    sums : numpy.ndarray
+        Summed values (groups x dates).
+    """
+    codes, groups = pd.factorize(np.asarray(keys), sort=True)
+    order = np.argsort(codes, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+    return groups, np.add.reduceat(values[order], starts, axis=0) if len(values) else values
+
+
+@traced("data.to_datetime")
+def parse_dates(columns):
+    """
+    Parse CSSE date headers (month/day/two-digit year).
+
+    Parameters
+    ----------
+    columns : array
+        Date headers.
+
+    Returns
+    -------
+    dates : pandas.DatetimeIndex
+        Parsed dates.
+    """
+    try:
+        return pd.to_datetime(columns, format="%m/%d/%y")
+    except ValueError:
+        return pd.to_datetime(columns)
@@ -5,14 +5,81 @@ Copyright (c) 2020 Ayoub Malek
 This source code is licensed under the terms of the MIT license.
 For a copy, see <https://opensource.org/licenses/MIT>.
 """
-import numpy as np
-import pandas as pd
-
 
 data_urls = {"confirmed_cases": 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_global.csv',
              "recovered_cases": 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_recovered_global.csv',
              "death_cases"    : 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_deaths_global.csv'}
 
+us_data_urls = {"confirmed_cases": 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_confirmed_US.csv',
+                "death_cases"    : 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_deaths_US.csv'}
+
+_dataset = None
+_us_dataset = None
+
+def get_dataset():
+    """
+    Get the process-wide dataset: every CSSE table is downloaded and parsed once
+    and then shared by all CovidCountry and CovidWorld instances.
+
+    Returns
+    -------
+    dataset : CovidDataset
+        Shared dataset.
+    """
+    global _dataset
+    if _dataset is None:
+        # deferred: pulls in pandas and the download layer
+        from .dataset import CovidDataset
+        _dataset = CovidDataset(data_urls)
+    return _dataset
+
+
+def reset_dataset():
+    """
+    Drop the process-wide datasets, the next access reloads the data.
+    """
+    global _dataset, _us_dataset
+    _dataset = None
+    _us_dataset = None
+
+
+def get_us_dataset():
+    """
+    Get the process-wide US dataset (county level data, rolled up to states and country).
+
+    Returns
+    -------
+    dataset : UsDataset
+        Shared US dataset.
+    """
+    global _us_dataset
+    if _us_dataset is None:
+        from .usdata import UsDataset
+        _us_dataset = UsDataset(us_data_urls)
+    return _us_dataset
+
+
+def get_region_data(region, data_type, level="state"):
+    """
+    Get COVID-19 data for a US county, state or for the whole US [source: CSSE at Johns Hopkins University].
+
+    Parameters
+    ----------
+    region : str
+        County (e.g. "Autauga, Alabama, US"), state (e.g. "Alabama") or "US".
+    data_type : str
+        Type of data to collect.
+    level : str, optional
+        Region level: "county", "state" or "country". The default is "state".
+
+    Returns
+    -------
+    df : pandas.Dataframe
+        Dataframe with COVID-19 information.
+    """
+    return get_us_dataset().region_data(region, data_type, level)
+
+
 def get_country_data(country, data_type):
     """
     Get COVID-19 data for a certain country [source: CSSE at Johns Hopkins University].
@@ -29,26 +96,7 @@ def get_country_data(country, data_type):
     df : pandas.Dataframe
         Dataframe with COVID-19 information.
     """
-    # read/download csv
-    df = pd.read_csv(data_urls[data_type])
-
-    # filter data
-    df = df[df['Country/Region'] == country]
-
-    # remove unnecessary columns
-    df.drop(['Province/State', 'Lat','Long'], axis=1, inplace=True)
-
-    # unpivot aka "melt"
-    df = df.melt(id_vars=['Country/Region'], var_name='date', value_name='confirmed_cases')
-
-    # rename column
-    df.rename(columns={'Country/Region': 'country'}, inplace=True)
-
-    # convert date column to date-type
-    df.date = pd.to_datetime(df.date)
-
-    # return data
-    return df
+    return get_dataset().country_data(country, data_type)
 
 
 def get_world_data(data_type):
@@ -65,23 +113,7 @@ def get_world_data(data_type):
     df : pandas.Dataframe
         Dataframe with COVID-19 information.
     """
-    # read/download csv
-    df = pd.read_csv(data_urls[data_type])
-
-    # remove unnecessary columns
-    df.drop(['Province/State', 'Lat','Long'], axis=1, inplace=True)
-
-    # unpivot aka "melt"
-    df = df.melt(id_vars=['Country/Region'], var_name='date', value_name='confirmed_cases')
-
-    # rename column
-    df.rename(columns={'Country/Region': 'country'}, inplace=True)
-
-    # convert date column to date-type
-    df.date = pd.to_datetime(df.date)
-
-    # return data
-    return df
+    return get_dataset().world_data(data_type)
 
 
 def compute_estimated_infected_population(confirmed_cases_df, death_cases_df, g=8, j=20):
@@ -113,14 +145,14 @@ def compute_estimated_infected_population(confirmed_cases_df, death_cases_df, g=
     CFR = D / C
 
     # replace NAN = 0/0 by 0: no fatalities, no cases
-    np.nan_to_num(CFR, 0)
+    CFR = CFR.fillna(0)
 
 
     # compute the estimated number cases
     I = (D/ CFR)
 
     # replace NAN = 0/0 by 0: no fatalities, 0 death rate
-    np.nan_to_num(I, 0)
+    I = I.fillna(0)
 
     # estimate # cases
     I = I.shift(j).fillna(1) * (1 + g)**j
@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import threading
+import pandas as pd
+from .datacache import cached_paths
+from .datacube import cube_from_csse
+from .datastore import store_settings, open_cube
+from .tracing import span
+
+
+class CovidDataset:
+    def __init__(self, urls, store_dir=None):
+        """
+        Init CovidDataset class: loads each CSSE table once and hands out slices.
+
+        Parameters
+        ----------
+        urls : dict
+            Mapping of the data types to their urls.
+        store_dir : str, optional
+            Binary store directory. The default is None (use store_settings).
+        """
+        self.urls = urls
+        self.store_dir = store_dir
+        self._paths = None
+        self._cubes = {}
+        self._aligned = {}
+        self._lock = threading.Lock()
+
+
+    def paths(self):
+        """
+        Get the local paths of all the data types, downloading them concurrently on first use.
+
+        Returns
+        -------
+        paths : dict
+            Local path per data type.
+        """
+        if self._paths is None:
+            data_types = list(self.urls)
+            self._paths = dict(zip(data_types, cached_paths([self.urls[t] for t in data_types])))
+        return self._paths
+
+
+    def cube(self, data_type):
+        """
+        Get the country x date cube of a data type, downloading/parsing it on first use.
+
+        Parameters
+        ----------
+        data_type : str
+            Type of data to get.
+
+        Returns
+        -------
+        cube : CovidCube
+            Country x date cube.
+        """
+        with self._lock:
+            if data_type not in self._cubes:
+                path = self.paths()[data_type]
+                store_dir = self.store_dir or store_settings["store_dir"]
+
+                # memory-mapped store if configured, else parse the csv
+                if store_dir:
+                    self._cubes[data_type] = open_cube(store_dir, data_type, path)
+                else:
+                    with span("data.read_csv", data_type=data_type):
+                        df = pd.read_csv(path)
+                    self._cubes[data_type] = cube_from_csse(df)
+            return self._cubes[data_type]
+
+
+    def cubes(self, base="confirmed_cases"):
+        """
+        Get the cubes of all data types aligned on the countries and dates of one of them.
+
+        Parameters
+        ----------
+        base : str, optional
+            Data type whose countries and dates are used. The default is "confirmed_cases".
+
+        Returns
+        -------
+        cubes : dict
+            Aligned cubes per data type.
+        """
+        if base not in self._aligned:
+            ref = self.cube(base)
+            self._aligned[base] = {data_type: self.cube(data_type).reindex(ref.countries, ref.dates)
+                                   for data_type in self.urls}
+        return self._aligned[base]
+
+
+    def country_data(self, country, data_type):
+        """
+        Get the long dataframe of a country.
+
+        Parameters
+        ----------
+        country : str
+            Country to collect data for.
+        data_type : str
+            Type of data to collect.
+
+        Returns
+        -------
+        df : pandas.Dataframe
+            Dataframe with COVID-19 information.
+        """
+        cube = self.cubes()[data_type]
+        values = cube.row(country) if country in cube else cube.values[:0, 0]
+        dates = cube.dates if country in cube else cube.dates[:0]
+        return pd.DataFrame({"country": country,
+                             "date": dates,
+                             "confirmed_cases": values}).reset_index(drop=True)
+
+
+    def world_data(self, data_type):
+        """
+        Get the long dataframe of all countries.
+
+        Parameters
+        ----------
+        data_type : str
+            Type of data to collect.
+
+        Returns
+        -------
+        df : pandas.Dataframe
+            Dataframe with COVID-19 information.
+        """
+        return self.cubes()[data_type].to_long()
@@ -0,0 +1,397 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import os
+import csv
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from .datacube import CovidCube, cube_from_csse
+from .tracing import span
+
+
+store_settings = {"store_dir": os.environ.get("COVID_STORE_DIR")}
+
+
+def configure_store(store_dir=None):
+    """
+    Set the directory of the binary store used by the dataset.
+
+    Parameters
+    ----------
+    store_dir : str, optional
+        Store directory. The default is None (no store, parse the CSVs).
+    """
+    store_settings["store_dir"] = store_dir
+
+
+def _store_paths(store_dir, data_type):
+    """
+    Get the values and index file paths of a stored data type.
+
+    Parameters
+    ----------
+    store_dir : str
+        Store directory.
+    data_type : str
+        Stored data type.
+
+    Returns
+    -------
+    data_path : str
+        Path of the raw values file.
+    index_path : str
+        Path of the metadata index (countries, dates, dtype, source).
+    """
+    base = os.path.join(store_dir, data_type)
+    return base + ".dat", base + ".json"
+
+
+def read_index(store_dir, data_type):
+    """
+    Read the metadata index of a stored data type.
+
+    Parameters
+    ----------
+    store_dir : str
+        Store directory.
+    data_type : str
+        Stored data type.
+
+    Returns
+    -------
+    index : dict
+        Metadata index, None if the data type is not stored.
+    """
+    try:
+        with open(_store_paths(store_dir, data_type)[1], "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cube(store_dir, data_type, cube, source=None, header=None, keys=None, tail=None, headroom=64):
+    """
+    Persist a cube as a raw row-major values file plus a json metadata index.
+
+    Each row reserves room for headroom more dates so that new days can be
+    appended in place without rewriting the file.
+
+    Parameters
+    ----------
+    store_dir : str
+        Store directory.
+    data_type : str
+        Stored data type.
+    cube : CovidCube
+        Cube to persist.
+    source : dict, optional
+        Description of the source file (path, size, mtime). The default is None.
+    header : list, optional
+        Source CSV header the cube was built from. The default is None.
+    keys : str, optional
+        Digest of the source CSV row keys. The default is None.
+    tail : dict, optional
+        Number of checked trailing date columns and digest of their values. The default is None.
+    headroom : int, optional
+        Number of reserved date columns. The default is 64.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    data_path, index_path = _store_paths(store_dir, data_type)
+    n_countries, n_dates = cube.shape
+    capacity = n_dates + headroom
+
+    # values first, then the index that makes them visible
+    values = np.zeros((n_countries, capacity), dtype=cube.values.dtype)
+    values[:, :n_dates] = cube.values
+    values.tofile(data_path + ".tmp")
+    os.replace(data_path + ".tmp", data_path)
+
+    index = {"countries": [str(c) for c in cube.countries],
+             "dates": [d.strftime("%Y-%m-%d") for d in cube.dates],
+             "capacity": capacity,
+             "dtype": np.dtype(cube.values.dtype).str,
+             "header": header,
+             "keys": keys,
+             "tail": tail,
+             "source": source}
+    _write_index(index_path, index)
+
+
+def _write_index(index_path, index):
+    with open(index_path + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(index_path + ".tmp", index_path)
+
+
+def _open_values(store_dir, data_type, index, mode="r"):
+    """
+    Memory-map the values file of a stored data type.
+
+    Parameters
+    ----------
+    store_dir : str
+        Store directory.
+    data_type : str
+        Stored data type.
+    index : dict
+        Metadata index.
+    mode : str, optional
+        Memory-map mode. The default is "r".
+
+    Returns
+    -------
+    values : numpy.memmap
+        Values including the reserved columns (countries x capacity).
+    """
+    shape = (len(index["countries"]), index.get("capacity", len(index["dates"])))
+    if 0 in shape:
+        return np.zeros(shape, dtype=index["dtype"])
+    return np.memmap(_store_paths(store_dir, data_type)[0], dtype=index["dtype"],
+                     mode=mode, shape=shape)
+
+
+def load_cube(store_dir, data_type):
+    """
+    Open a stored cube, values are memory-mapped and only paged in when read.
+
+    Parameters
+    ----------
+    store_dir : str
+        Store directory.
+    data_type : str
+        Stored data type.
+
+    Returns
+    -------
+    cube : CovidCube
+        Memory-mapped cube, None if the data type is not stored.
+    """
+    index = read_index(store_dir, data_type)
+    if index is None:
+        return None
+
+    values = _open_values(store_dir, data_type, index)[:, :len(index["dates"])]
+    return CovidCube(index["countries"], pd.to_datetime(index["dates"]), values)
+
+
+def source_info(path):
+    """
+    Describe a source file so that a stored cube can be checked against it.
+
+    Parameters
+    ----------
+    path : str
+        Source file path.
+
+    Returns
+    -------
+    info : dict
+        Source path, size and modification time.
+    """
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _keys_digest(df):
+    """
+    Digest the (Province/State, Country/Region) keys of a CSSE table.
+
+    Parameters
+    ----------
+    df : pandas.Dataframe
+        CSSE table with at least its first two columns.
+
+    Returns
+    -------
+    str
+        Hex digest of the row keys.
+    """
+    keys = df.iloc[:, 0].fillna("").astype(str) + "|" + df.iloc[:, 1].astype(str)
+    return hashlib.sha1("\n".join(keys).encode("utf-8")).hexdigest()
+
+
+def _tail_digest(df, columns):
+    """
+    Digest the values of the given date columns of a CSSE table (missing values included).
+
+    Parameters
+    ----------
+    df : pandas.Dataframe
+        CSSE table holding the columns.
+    columns : list
+        Date columns.
+
+    Returns
+    -------
+    str
+        Hex digest of the values.
+    """
+    values = np.ascontiguousarray(df[columns].to_numpy(dtype=np.float64, na_value=np.nan))
+    return hashlib.sha1(values.tobytes()).hexdigest()
+
+
+def _tail(df, header, check_days):
+    """
+    Describe the last check_days date columns of a CSSE table (see write_cube).
+    """
+    columns = header[4:][-check_days:] if check_days else []
+    return {"columns": len(columns), "digest": _tail_digest(df, columns)}
+
+
+def _read_header(path):
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        return next(csv.reader(f))
+
+
+def convert_csse(store_dir, paths, check_days=30):
+    """
+    Convert CSSE time-series CSVs into the binary store.
+
+    Parameters
+    ----------
+    store_dir : str
+        Store directory.
+    paths : dict
+        Mapping of the data types to their local CSV paths.
+    check_days : int, optional
+        Number of trailing date columns whose revisions are detected by update_cube. The default is 30.
+
+    Returns
+    -------
+    cubes : dict
+        Memory-mapped cubes per data type.
+    """
+    cubes = {}
+    for data_type, path in paths.items():
+        with span("data.read_csv", data_type=data_type):
+            df = pd.read_csv(path)
+        header = list(df.columns)
+        write_cube(store_dir, data_type, cube_from_csse(df), source_info(path),
+                   header=header, keys=_keys_digest(df), tail=_tail(df, header, check_days))
+        cubes[data_type] = load_cube(store_dir, data_type)
+    return cubes
+
+
+def update_cube(store_dir, data_type, path, check_days=30):
+    """
+    Bring a stored cube up to date with its CSV by appending only the new dates.
+
+    Only the trailing date columns that are not stored yet and the last
+    check_days stored ones are parsed. The cube is rebuilt from scratch when
+    the stored header is not a prefix of the CSV header, when the CSV rows
+    changed or when the values of the last check_days stored dates were
+    revised. Revisions of older dates are not detected: convert_csse (or
+    clearing the store) picks them up.
+
+    Parameters
+    ----------
+    store_dir : str
+        Store directory.
+    data_type : str
+        Stored data type.
+    path : str
+        Local path of the source CSV.
+    check_days : int, optional
+        Number of trailing stored date columns checked for revisions. The default is 30.
+
+    Returns
+    -------
+    cube : CovidCube
+        Memory-mapped, up to date cube.
+    """
+    index = read_index(store_dir, data_type)
+    header = _read_header(path)
+    stored = (index or {}).get("header")
+
+    tail = (index or {}).get("tail")
+
+    # full reload: nothing stored, header changed or no revision check of the stored dates
+    if not stored or header[:len(stored)] != stored or not tail:
+        return convert_csse(store_dir, {data_type: path}, check_days)[data_type]
+
+    # parse the row keys, the last checked stored columns and the new columns only
+    new_columns = header[len(stored):]
+    checked = stored[4:][len(stored) - 4 - tail["columns"]:]
+    with span("data.read_csv", data_type=data_type):
+        df = pd.read_csv(path, usecols=header[:2] + checked + new_columns)
+
+    # full reload: row set changed or stored values revised
+    if _keys_digest(df) != index["keys"] or _tail_digest(df, checked) != tail["digest"]:
+        return convert_csse(store_dir, {data_type: path}, check_days)[data_type]
+
+    if new_columns:
+        # sum the province rows of the new columns in the stored country order
+        new = cube_from_csse(df.reindex(columns=header[:4] + new_columns))
+        new = new.reindex(countries=index["countries"])
+
+        n_dates = len(index["dates"])
+        if n_dates + len(new_columns) > index["capacity"]:
+            # out of reserved room: rewrite once with fresh headroom
+            old = load_cube(store_dir, data_type)
+            values = np.concatenate([np.asarray(old.values), new.values], axis=1)
+            cube = CovidCube(old.countries, old.dates.append(new.dates), values)
+            write_cube(store_dir, data_type, cube, source_info(path), header, index["keys"],
+                       _tail(df, header, check_days))
+            return load_cube(store_dir, data_type)
+
+        # append in place into the reserved columns
+        values = _open_values(store_dir, data_type, index, mode="r+")
+        values[:, n_dates:n_dates + len(new_columns)] = new.values
+        values.flush()
+        del values
+        index["dates"] += [d.strftime("%Y-%m-%d") for d in new.dates]
+
+    index["header"] = header
+    index["tail"] = _tail(df, header, check_days)
+    index["source"] = source_info(path)
+    _write_index(_store_paths(store_dir, data_type)[1], index)
+    return load_cube(store_dir, data_type)
+
+
+def update_store(store_dir, paths):
+    """
+    Bring the binary store up to date with CSSE CSVs (daily refresh).
+
+    Parameters
+    ----------
+    store_dir : str
+        Store directory.
+    paths : dict
+        Mapping of the data types to their local CSV paths.
+
+    Returns
+    -------
+    cubes : dict
+        Memory-mapped, up to date cubes per data type.
+    """
+    return {data_type: open_cube(store_dir, data_type, path) for data_type, path in paths.items()}
+
+
+def open_cube(store_dir, data_type, path):
+    """
+    Open a stored cube, updating it from its CSV when missing or out of date.
+
+    Parameters
+    ----------
+    store_dir : str
+        Store directory.
+    data_type : str
+        Stored data type.
+    path : str
+        Local path of the source CSV.
+
+    Returns
+    -------
+    cube : CovidCube
+        Memory-mapped cube.
+    """
+    index = read_index(store_dir, data_type)
+    if index is None or index.get("source") != source_info(path):
+        return update_cube(store_dir, data_type, path)
+    return load_cube(store_dir, data_type)
@@ -0,0 +1,349 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import os
+import ssl
+import time
+import zlib
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from .tracing import traced
+
+
+fetch_settings = {"timeout": float(os.environ.get("COVID_FETCH_TIMEOUT", 30)),
+                  "retries": int(os.environ.get("COVID_FETCH_RETRIES", 3)),
+                  "backoff": float(os.environ.get("COVID_FETCH_BACKOFF", 0.5))}
+
+# statuses worth retrying
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def configure_fetch(timeout=None, retries=None, backoff=None):
+    """
+    Update the download settings.
+
+    Parameters
+    ----------
+    timeout : float, optional
+        Socket timeout in seconds. The default is None (unchanged).
+    retries : int, optional
+        Number of retries of a failed download. The default is None (unchanged).
+    backoff : float, optional
+        Delay in seconds before the first retry, doubled at each retry. The default is None (unchanged).
+    """
+    if timeout is not None: fetch_settings["timeout"] = float(timeout)
+    if retries is not None: fetch_settings["retries"] = int(retries)
+    if backoff is not None: fetch_settings["backoff"] = float(backoff)
+
+
+class HttpSession:
+    def __init__(self, timeout=None):
+        """
+        Init HttpSession class: a thread-safe pool of keep-alive connections per host.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Socket timeout in seconds. The default is None (use fetch_settings).
+        """
+        self.timeout = fetch_settings["timeout"] if timeout is None else timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+
+    def _connect(self, key):
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout,
+                                               context=ssl.create_default_context())
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+
+    def _acquire(self, key):
+        """
+        Get an idle connection to (scheme, host, port), or a new one.
+
+        Returns
+        -------
+        connection : http.client.HTTPConnection
+            Connection.
+        reused : bool
+            Boolean describing whether the connection was used before.
+        """
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+
+    def _release(self, key, connection):
+        with self._lock:
+            self._idle.setdefault(key, []).append(connection)
+
+
+    def request(self, url, headers=None):
+        """
+        Send a GET request on a pooled connection.
+
+        Parameters
+        ----------
+        url : str
+            Requested url.
+        headers : dict, optional
+            Request headers. The default is None.
+
+        Returns
+        -------
+        response : http.client.HTTPResponse
+            Response, to be given back with release once read.
+        """
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+
+        connection, reused = self._acquire(key)
+        try:
+            connection.request("GET", target, headers=headers or {})
+            response = connection.getresponse()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            if not reused:
+                raise
+
+            # the server dropped an idle connection: retry once on a new one
+            connection = self._connect(key)
+            connection.request("GET", target, headers=headers or {})
+            response = connection.getresponse()
+
+        response._pool = (key, connection)
+        return response
+
+
+    def release(self, response):
+        """
+        Give the connection of a response back to the pool, or close it.
+
+        Parameters
+        ----------
+        response : http.client.HTTPResponse
+            Response returned by request.
+        """
+        key, connection = response._pool
+        if response.isclosed() and not response.will_close and connection.sock is not None:
+            self._release(key, connection)
+        else:
+            connection.close()
+
+
+    def close(self):
+        """
+        Close all the idle connections.
+        """
+        with self._lock:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+            self._idle.clear()
+
+
+def get_session():
+    """
+    Get the shared HTTP session.
+
+    Returns
+    -------
+    session : HttpSession
+        Shared session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = HttpSession()
+        return _session
+
+
+def _retry_delay(attempt, backoff, response=None):
+    """
+    Delay before a retry: exponential backoff, or the server Retry-After if longer.
+    """
+    delay = backoff * 2 ** attempt
+    retry_after = response.getheader("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, float(retry_after))
+    return delay
+
+
+def _decode(part_path, path, encoding):
+    """
+    Move a complete download to its path, decompressing gzip transfers.
+    """
+    if encoding in ("gzip", "x-gzip"):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        with open(part_path, "rb") as src, open(path + ".tmp", "wb") as dst:
+            for chunk in iter(lambda: src.read(1 << 16), b""):
+                dst.write(decompressor.decompress(chunk))
+            dst.write(decompressor.flush())
+        os.replace(path + ".tmp", path)
+        os.remove(part_path)
+    else:
+        os.replace(part_path, path)
+
+
+@traced("fetch.download")
+def download(url, path, headers=None, session=None, retries=None, backoff=None):
+    """
+    Download a url to a file over a pooled keep-alive connection.
+
+    The transfer is gzip encoded when the server supports it. Connection errors
+    and 408/429/5xx statuses are retried with exponential backoff, and a
+    download cut in the middle resumes with a Range request when the server
+    accepts ranges and gave a validator (ETag or Last-Modified).
+
+    Parameters
+    ----------
+    url : str
+        Url to download.
+    path : str
+        Destination file, only replaced once the download is complete.
+    headers : dict, optional
+        Extra request headers (e.g. If-None-Match). The default is None.
+    session : HttpSession, optional
+        Session to use. The default is None (shared session).
+    retries : int, optional
+        Number of retries. The default is None (use fetch_settings).
+    backoff : float, optional
+        Delay in seconds before the first retry. The default is None (use fetch_settings).
+
+    Returns
+    -------
+    status : int
+        Final status, 304 if the file did not change (nothing written).
+    headers : http.client.HTTPMessage
+        Response headers.
+    """
+    session = get_session() if session is None else session
+    retries = fetch_settings["retries"] if retries is None else retries
+    backoff = fetch_settings["backoff"] if backoff is None else backoff
+
+    part_path = path + ".part"
+    resume = None
+    error = None
+
+    for attempt in range(retries + 1):
+        if attempt:
+            failed = error if isinstance(error, http.client.HTTPResponse) else None
+            time.sleep(_retry_delay(attempt - 1, backoff, failed))
+
+        # resume a partial transfer of the same representation
+        request_headers = dict(headers or {}, **{"Accept-Encoding": "gzip"})
+        offset = os.path.getsize(part_path) if resume and os.path.exists(part_path) else 0
+        if offset:
+            request_headers = {k: v for k, v in request_headers.items()
+                               if k not in ("If-None-Match", "If-Modified-Since")}
+            request_headers.update({"Range": "bytes=%d-" % offset, "If-Range": resume["validator"]})
+
+        try:
+            response = session.request(url, request_headers)
+        except (OSError, http.client.HTTPException) as e:
+            error = e
+            continue
+
+        try:
+            if response.status == 304:
+                response.read()
+                return response.status, response.headers
+
+            if response.status in RETRY_STATUSES or response.status == 416:
+                response.read()
+                error, resume = response, None
+                continue
+
+            if response.status not in (200, 206):
+                response.read()
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+
+            # 206 continues the partial file, 200 restarts it
+            encoding = (response.getheader("Content-Encoding") or "identity").lower()
+            append = response.status == 206 and offset and resume["encoding"] == encoding and \
+                     (response.getheader("Content-Range") or "").startswith("bytes %d-" % offset)
+            if response.status == 206 and not append:
+                response.read()
+                error, resume = response, None
+                continue
+
+            # remember how to resume this representation
+            validator = response.getheader("ETag") or response.getheader("Last-Modified")
+            if response.getheader("Accept-Ranges") == "bytes" and validator and not validator.startswith("W/"):
+                resume = {"validator": validator, "encoding": encoding}
+            elif not append:
+                resume = None
+
+            received = 0
+            with open(part_path, "ab" if append else "wb") as f:
+                for chunk in iter(lambda: response.read(1 << 16), b""):
+                    f.write(chunk)
+                    received += len(chunk)
+
+            # connection closed before the announced length
+            length = response.getheader("Content-Length")
+            if length is not None and received < int(length):
+                raise http.client.IncompleteRead(b"", int(length) - received)
+
+        except urllib.error.HTTPError:
+            raise
+
+        except (OSError, http.client.HTTPException) as e:
+            # the connection may still hold unread body bytes: close it, release does not pool it
+            response.close()
+            response._pool[1].close()
+            error = e
+            continue
+
+        finally:
+            session.release(response)
+
+        _decode(part_path, path, encoding)
+        return response.status, response.headers
+
+    # out of retries
+    if isinstance(error, http.client.HTTPResponse):
+        raise urllib.error.HTTPError(url, error.status, error.reason, error.headers, None)
+    raise urllib.error.URLError(error)
+
+
+def fetch_all(func, items, max_workers=None):
+    """
+    Run a download function over several items concurrently.
+
+    Parameters
+    ----------
+    func : function
+        Function of one item.
+    items : list
+        Items, e.g. urls.
+    max_workers : int, optional
+        Number of threads. The default is None (one per item).
+
+    Returns
+    -------
+    results : list
+        Results in the order of the items.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers or len(items)) as executor:
+        return list(executor.map(func, items))
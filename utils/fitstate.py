@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import os
+import copy
+import json
+import hashlib
+import threading
+from .datacache import cache_settings
+
+
+fit_state_settings = {"state_dir": os.environ.get("COVID_FIT_STATE_DIR"),
+                      "enabled"  : os.environ.get("COVID_FIT_WARM", "1").lower() in ("1", "true", "yes")}
+
+# fit states loaded or saved by this process, per state directory and key
+_states = {}
+_lock = threading.Lock()
+
+
+def configure_fit_state(state_dir=None, enabled=None):
+    """
+    Update the fit state settings.
+
+    Parameters
+    ----------
+    state_dir : str, optional
+        Directory holding the fit states. The default is None (unchanged, initially <cache_dir>/fits).
+    enabled : bool, optional
+        Boolean describing whether fits warm-start from and save their state. The default is None (unchanged).
+    """
+    if state_dir is not None: fit_state_settings["state_dir"] = state_dir
+    if enabled is not None: fit_state_settings["enabled"] = bool(enabled)
+
+
+def _state_dir(state_dir=None):
+    if state_dir is not None:
+        return state_dir
+    return fit_state_settings["state_dir"] or os.path.join(cache_settings["cache_dir"], "fits")
+
+
+def _state_path(key, state_dir):
+    """
+    Get the file of a fit state, e.g. key ("Tunisia", "confirmed_cases").
+    """
+    name = "/".join(str(k) for k in key)
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(state_dir, digest + "_" + "".join(c if c.isalnum() else "_" for c in name)[:64] + ".json")
+
+
+def load_state(key, state_dir=None):
+    """
+    Get the last saved state of a fit.
+
+    Parameters
+    ----------
+    key : tuple
+        Fitted series, e.g. (country, series name).
+    state_dir : str, optional
+        Directory holding the fit states. The default is None (fit_state_settings).
+
+    Returns
+    -------
+    state : dict
+        Copy of the fit state (see LogisticFit.state), None if there is none.
+    """
+    state_dir = _state_dir(state_dir)
+    with _lock:
+        if (state_dir, key) not in _states:
+            try:
+                with open(_state_path(key, state_dir), "r") as f:
+                    _states[state_dir, key] = json.load(f)
+            except (OSError, ValueError):
+                return None
+        return copy.deepcopy(_states[state_dir, key])
+
+
+def save_state(key, state, state_dir=None):
+    """
+    Save the state of a fit, replacing the previous one.
+
+    Parameters
+    ----------
+    key : tuple
+        Fitted series, e.g. (country, series name).
+    state : dict
+        Json serializable fit state.
+    state_dir : str, optional
+        Directory holding the fit states. The default is None (fit_state_settings).
+    """
+    state_dir = _state_dir(state_dir)
+    path = _state_path(key, state_dir)
+    with _lock:
+        _states[state_dir, key] = copy.deepcopy(state)
+        os.makedirs(state_dir, exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+
+def clear_state(key=None, state_dir=None):
+    """
+    Drop a saved fit state, or all of them: the next fits start cold.
+
+    Parameters
+    ----------
+    key : tuple, optional
+        Fitted series. The default is None (all states).
+    state_dir : str, optional
+        Directory holding the fit states. The default is None (fit_state_settings).
+    """
+    state_dir = _state_dir(state_dir)
+    with _lock:
+        for k in [k for k in _states if k[0] == state_dir and key in (None, k[1])]:
+            del _states[k]
+        if key is not None:
+            paths = [_state_path(key, state_dir)]
+        elif os.path.isdir(state_dir):
+            paths = [os.path.join(state_dir, name) for name in os.listdir(state_dir) if name.endswith(".json")]
+        else:
+            paths = []
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -5,32 +5,306 @@ Copyright (c) 2020 Ayoub Malek
 This source code is licensed under the terms of the MIT license.
 For a copy, see <https://opensource.org/licenses/MIT>.
 """
+import os
 import datetime
 import warnings
-import matplotlib.pyplot as plt
-from scipy.optimize import leastsq
+import numpy as np
+from .tracing import span, traced
 
 
 warnings.filterwarnings("ignore", category=RuntimeWarning)
 
 
+def logistic4(x, a, b, c, d):
+    """
+    4PL logistic equation, broadcasting over the parameters.
+
+    Parameters
+    ----------
+    x : array
+        Inputs (days).
+    a : float or array
+        Response at x = 0.
+    b : float or array
+        Slope factor.
+    c : float or array
+        Inflection point (midpoint).
+    d : float or array
+        Response at infinity (plateau).
+
+    Returns
+    -------
+    array
+        4PL values.
+    """
+    # (x / c)**b overflowing to inf (or 0**-b) saturates the curve at d,
+    # a negative midpoint gives nan (trial points the solvers reject)
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        return ((a - d) / (1.0 + ((x / c)**b))) + d
+
+
+def logistic4_jacobian(x, a, b, c, d):
+    """
+    Partial derivatives of the 4PL equation with respect to (a, b, c, d).
+
+    Parameters
+    ----------
+    x : array
+        Inputs (n,).
+    a, b, c, d : float or array
+        4PL parameters, scalars or arrays of shape (m, 1) for m curves.
+
+    Returns
+    -------
+    J : array
+        Jacobian of shape (n, 4) or (m, n, 4).
+    """
+    # u overflows to inf for steep slopes far from the midpoint: w -> 0
+    with np.errstate(over="ignore", divide="ignore"):
+        u = (x / c)**b
+    w = 1.0 / (1.0 + u)
+
+    # bounded form of u w^2, log(x / c) w (1 - w) -> 0 where w (1 - w) = 0 (x = 0, u = 0 or inf)
+    ww = w * (1.0 - w)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        wlog = np.where(ww == 0, 0.0, np.log(x / c) * ww)
+
+    da = w
+    db = -(a - d) * wlog
+    dc = (a - d) * b * ww / c
+    dd = 1.0 - w
+    return np.stack(np.broadcast_arrays(da, db, dc, dd), axis=-1)
+
+
+def initial_guess(x, y):
+    """
+    Data-driven 4PL starting values: start level, slope, midpoint and plateau.
+
+    The plateau is the largest value, the midpoint the first input where half
+    of the increase is reached and the slope follows from the inputs where a
+    quarter and three quarters of it are reached.
+
+    Parameters
+    ----------
+    x : array
+        Inputs (n,), increasing.
+    y : array
+        Series (n,) or (m, n).
+
+    Returns
+    -------
+    p0 : array
+        Starting parameters (a, b, c, d) of shape (4,) or (m, 4).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    Y = np.atleast_2d(y)
+
+    # start level and plateau
+    a = Y.min(axis=1)
+    d = Y.max(axis=1)
+    d = np.where(d > a, d, a + 1.0)
+
+    # first inputs reaching 1/4, 1/2 and 3/4 of the increase
+    frac = (Y - a[:, None]) / (d - a)[:, None]
+    x25, c, x75 = (np.maximum(x[np.argmax(frac >= q, axis=1)], 1.0) for q in (0.25, 0.5, 0.75))
+
+    # slope: x_q = c (q / (1 - q))^(1 / b)
+    with np.errstate(divide="ignore"):
+        b = np.clip(2 * np.log(3) / np.log(x75 / x25), 0.5, 50.0)
+
+    p0 = np.stack([a, b, c, d], axis=1)
+    return p0[0] if y.ndim == 1 else p0
+
+
+@traced("fit.batch_lm")
+def fit_logistic4_batch(x, Y, p0=None, max_iter=200, ftol=1.49012e-08, xtol=1.49012e-08):
+    """
+    Fit the 4PL equation to many series at once with a batched Levenberg-Marquardt solver.
+
+    All series share the inputs x. Every iteration solves the damped normal
+    equations of all still active series together, each series keeps its own
+    damping factor and stops on its own. A step is accepted when the cost drops
+    by a fair part of the reduction predicted by the linearized model, and only
+    accepted, nearly undamped steps can meet the ftol/xtol tests: a series that
+    stalls, or ends on a saturated curve (a step with no input in its transition),
+    is not flagged converged.
+
+    Parameters
+    ----------
+    x : array
+        Inputs shared by all series (n,).
+    Y : array
+        Series to fit (m, n).
+    p0 : array, optional
+        Initial parameters (4,) shared by all series or (m, 4). The default is None (initial_guess).
+    max_iter : int, optional
+        Maximum number of iterations. The default is 200.
+    ftol : float, optional
+        Relative tolerance on the sum of squares. The default is 1.49012e-08 (as leastsq).
+    xtol : float, optional
+        Relative tolerance on the parameters. The default is 1.49012e-08 (as leastsq).
+
+    Returns
+    -------
+    P : array
+        Fitted parameters (m, 4).
+    converged : array
+        Boolean mask of the series that converged (m,).
+    cost : array
+        Final sums of squared residuals (m,).
+    n_iter : array
+        Number of iterations per series (m,).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+    m = Y.shape[0]
+    p0 = initial_guess(x, Y) if p0 is None else p0
+    P = np.array(np.broadcast_to(np.asarray(p0, dtype=np.float64), (m, 4)))
+
+    def evaluate(P, Y):
+        a, b, c, d = (P[:, k:k + 1] for k in range(4))
+        R = Y - logistic4(x, a, b, c, d)
+        return R, (R * R).sum(axis=1)
+
+    R, cost = evaluate(P, Y)
+    lam = np.full(m, 1e-3)
+    converged = np.zeros(m, dtype=bool)
+    n_iter = np.zeros(m, dtype=int)
+    active = np.isfinite(cost)
+
+    for _ in range(max_iter):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        n_iter[idx] += 1
+
+        # damped normal equations of the active series
+        Pa = P[idx]
+        J = logistic4_jacobian(x, *(Pa[:, k:k + 1] for k in range(4)))
+        Jt = J.transpose(0, 2, 1)
+        A = Jt @ J
+        g = (Jt @ R[idx][:, :, None])[:, :, 0]
+        diag = np.maximum(np.diagonal(A, axis1=1, axis2=2), 1e-12)
+        bad = ~np.isfinite(A).all(axis=(1, 2)) | ~np.isfinite(g).all(axis=1)
+        A[bad], g[bad], diag[bad] = np.eye(4), 0, 1
+        A = A + (lam[idx, None] * diag)[:, :, None] * np.eye(4)
+        step = np.linalg.solve(A, g[:, :, None])[:, :, 0]
+
+        # evaluate the trial points: actual against predicted (linearized) reduction of the cost
+        P_new = Pa + step
+        R_new, cost_new = evaluate(P_new, Y[idx])
+        JS = (J @ step[:, :, None])[:, :, 0]
+        predicted = 2 * (step * g).sum(axis=1) - (JS * JS).sum(axis=1)
+        actual = np.where(np.isfinite(cost_new), cost[idx] - cost_new, -np.inf)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(predicted > 0, actual / predicted, -np.inf)
+        better = (ratio > 1e-4) & ~bad
+
+        # convergence tests of the accepted, nearly undamped (Gauss-Newton) steps, as MINPACK:
+        # relative actual and predicted reductions below ftol or relative step below xtol
+        # (a heavily damped step is small and reduces little far from the minimum as well)
+        undamped = better & (lam[idx] <= 1)
+        small_f = undamped & (actual <= ftol * cost[idx]) & (predicted <= ftol * cost[idx]) & (ratio <= 2)
+        small_x = undamped & (np.abs(step) <= xtol * (np.abs(Pa) + xtol)).all(axis=1)
+        done = small_f | small_x
+
+        # saturated curve: no input in the transition (da dd = w (1 - w) ~ 0 everywhere), a step
+        # between two inputs whose slope and midpoint the data does not determine
+        saturated = (J[:, :, 0] * J[:, :, 3]).max(axis=1) < 1e-8
+
+        # accept/reject and update damping (trust the model more when it predicted the reduction well)
+        acc = idx[better]
+        P[acc], R[acc], cost[acc] = P_new[better], R_new[better], cost_new[better]
+        lam[idx] = np.where(ratio > 0.75, lam[idx] / 10, np.where(ratio < 0.25, lam[idx] * 10, lam[idx]))
+
+        converged[idx[done & ~saturated]] = True
+        active[idx[done | bad | (lam[idx] > 1e16)]] = False
+
+    return P, converged, cost, n_iter
+
+
+def refit_logistic4_batch(x, Y, P_prev, max_iter=20, cold_max_iter=200):
+    """
+    Refit many series warm-started from previous parameters (e.g. yesterday's fits), cold-starting
+    the series without previous parameters and those whose warm start does not converge.
+
+    Parameters
+    ----------
+    x : array
+        Inputs shared by all series (n,).
+    Y : array
+        Series to fit (m, n).
+    P_prev : array
+        Previous parameters (m, 4), rows of NaN for the series without a previous fit.
+    max_iter : int, optional
+        Maximum number of iterations of the warm starts. The default is 20.
+    cold_max_iter : int, optional
+        Maximum number of iterations of the cold starts. The default is 200.
+
+    Returns
+    -------
+    P, converged, cost, n_iter : array
+        As fit_logistic4_batch, n_iter counting the iterations of both starts.
+    warm : array
+        Boolean mask of the series fitted from their previous parameters (m,).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+    P_prev = np.atleast_2d(np.asarray(P_prev, dtype=np.float64))
+    P0 = initial_guess(x, Y)
+    warm = np.isfinite(P_prev).all(axis=1)
+
+    P = np.full(P0.shape, np.nan)
+    converged = np.zeros(len(Y), dtype=bool)
+    cost = np.full(len(Y), np.inf)
+    n_iter = np.zeros(len(Y), dtype=int)
+
+    # warm starts, kept when they converge to a fit at least as good as the data-driven start
+    idx = np.flatnonzero(warm)
+    if idx.size:
+        P[idx], converged[idx], cost[idx], n_iter[idx] = fit_logistic4_batch(x, Y[idx], P_prev[idx], max_iter)
+        a, b, c, d = (P0[idx, k:k + 1] for k in range(4))
+        p0_cost = ((Y[idx] - logistic4(x, a, b, c, d))**2).sum(axis=1)
+        warm[idx] = converged[idx] & np.isfinite(P[idx]).all(axis=1) & (cost[idx] <= p0_cost)
+
+    # cold starts
+    idx = np.flatnonzero(~warm)
+    if idx.size:
+        P[idx], converged[idx], cost[idx], cold_iter = fit_logistic4_batch(x, Y[idx], P0[idx], cold_max_iter)
+        n_iter[idx] += cold_iter
+    return P, converged, cost, n_iter, warm
+
+
+def _fit_chunk(args):
+    """
+    Fit a chunk of bootstrap series (process pool task).
+    """
+    x, Y, p0, max_iter = args
+    return fit_logistic4_batch(x, Y, p0, max_iter)
+
+
 class LogisticFit:
-    def __init__(self, x, y, p0):
+    def __init__(self, x, y, p0=None):
         """
         Init LogisticFit class.
 
         Parameters
         ----------
-        x : TYPE
-            DESCRIPTION.
-        y : TYPE
-            DESCRIPTION.
-        p0 : TYPE
-            DESCRIPTION.
+        x : array
+            Inputs (days).
+        y : array
+            Data to fit.
+        p0 : array, optional
+            Initial parameters (a, b, c, d). The default is None (estimated from the data).
         """
         self.x  = x
         self.y  = y
-        self.p0 = p0
+        self.p0 = initial_guess(x, y) if p0 is None else p0
+
+        # fit statistics, warm is True when the fit was warm-started from a previous state
+        self.nfev, self.njev = 0, 0
+        self.warm = False
 
 
     def logistic4(self, x, a, b, c, d):
@@ -57,7 +331,7 @@ class LogisticFit:
             DESCRIPTION.
 
         """
-        return ((a - d) / (1.0 + ((x / c)**b))) + d
+        return logistic4(x, a, b, c, d)
 
 
     def residuals(self, p, y, x):
@@ -107,22 +381,175 @@ class LogisticFit:
         return self.logistic4(x, a, b, c, d)
 
 
-    def fit_data(self):
+    def jacobian(self, p, y, x):
+        """
+        Analytic Jacobian of the residuals with respect to the 4PL parameters.
+
+        Parameters
+        ----------
+        p : array
+            4PL parameters.
+        y : array
+            Data (unused, same signature as residuals).
+        x : array
+            Inputs.
+
+        Returns
+        -------
+        J : array
+            Jacobian of shape (len(x), 4).
+        """
+        return -logistic4_jacobian(np.asarray(x, dtype=np.float64), *p)
+
+
+    def _leastsq(self, p0, maxfev=0):
+        """
+        Run leastsq from p0, parameters scaled by their starting magnitudes.
+        """
+        from scipy.optimize import leastsq
+        scale = 1.0 / np.maximum(np.abs(np.asarray(p0, dtype=np.float64)), 1.0)
+        with span("fit.leastsq"):
+            p, cov, info, message, ier = leastsq(self.residuals, p0, args=(self.y, self.x), Dfun=self.jacobian,
+                                                 diag=scale, full_output=True, maxfev=maxfev)
+        cost = float(np.sum(info["fvec"]**2))
+        return p, cov, info, message, ier, cost
+
+
+    def fit_data(self, state=None, max_nfev=100):
         """
         Fit data to curve, determine curve parameters based on given data.
         keyword: curve fitting.
 
+        With a previous state (e.g. the fit of the series before its last day), the fit
+        warm-starts from its parameters and falls back to a cold start from p0 when it does
+        not converge within max_nfev evaluations or ends worse than p0.
+
+        Parameters
+        ----------
+        state : dict, optional
+            Previous fit state (see state). The default is None (cold start).
+        max_nfev : int, optional
+            Maximum number of function evaluations of a warm start. The default is 100.
+
         Returns
         -------
         array
             Logistic fit parameters.
 
         """
-        # Fit equation using least squares optimization
-        self.plsq = leastsq(self.residuals, self.p0, args=(self.y, self.x))
+        # warm start
+        result = None
+        if state is not None and np.all(np.isfinite(state["params"])):
+            result = self._leastsq(np.asarray(state["params"], dtype=np.float64), max_nfev)
+            p, ier, cost = result[0], result[4], result[5]
+            p0_cost = np.sum(self.residuals(self.p0, self.y, self.x)**2)
+            if ier not in (1, 2, 3, 4) or not np.all(np.isfinite(p)) or not cost <= p0_cost:
+                result = None
+        self.warm = result is not None
+
+        # cold start
+        if result is None:
+            result = self._leastsq(self.p0)
+
+        p, self.cov, info, self.message, ier, self.cost = result
+        self.nfev, self.njev = info["nfev"], info.get("njev", 0)
+        self.plsq = (p, ier)
         return self.plsq
 
 
+    def state(self):
+        """
+        Get the fit state, to warm-start the next fit of the same series.
+
+        Returns
+        -------
+        state : dict
+            Json serializable parameters, covariance, convergence info and number of points.
+        """
+        p, ier = self.plsq
+        return {"params": [float(v) for v in p],
+                "cov": None if self.cov is None else np.asarray(self.cov, dtype=np.float64).tolist(),
+                "ier": int(ier), "message": self.message, "cost": self.cost,
+                "nfev": int(self.nfev), "njev": int(self.njev), "warm": self.warm, "n_points": len(self.y)}
+
+
+    @traced("fit.bootstrap")
+    def bootstrap(self, n_boot=1000, method="residual", quantiles=(0.025, 0.5, 0.975), seed=None,
+                  x_pred=None, max_iter=50, processes=1):
+        """
+        Compute bootstrap prediction bands of the fitted curve.
+
+        All replicates are resampled at once and refitted together with the batched
+        Levenberg-Marquardt solver (warm-started from the fit), optionally split over a process pool.
+        residual: the fitted curve plus resampled residuals, parametric: the fitted curve plus
+        gaussian noise of the residual variance. The predictions add the same kind of noise
+        to the refitted curves.
+
+        Parameters
+        ----------
+        n_boot : int, optional
+            Number of bootstrap replicates. The default is 1000.
+        method : str, optional
+            "residual" or "parametric". The default is "residual".
+        quantiles : tuple, optional
+            Quantiles of the bands. The default is (0.025, 0.5, 0.975).
+        seed : int, optional
+            Random seed. The default is None.
+        x_pred : array, optional
+            Prediction inputs. The default is None (twice the observed length, as plot_results).
+        max_iter : int, optional
+            Maximum number of iterations of the refits. The default is 50.
+        processes : int, optional
+            Number of processes, 1 refits in this process. The default is 1.
+
+        Returns
+        -------
+        bands : dict
+            x (prediction inputs), quantiles, bands (quantiles x inputs), params (replicates x 4)
+            and converged (replicates,) of the refits.
+        """
+        if method not in ("residual", "parametric"):
+            raise ValueError("Unknown bootstrap method: %s (expected residual or parametric)" % method)
+        if not hasattr(self, "plsq"):
+            self.fit_data()
+
+        x = np.asarray(self.x, dtype=np.float64)
+        x_pred = np.arange(2 * len(x), dtype=np.float64) if x_pred is None else np.asarray(x_pred, dtype=np.float64)
+        p = np.asarray(self.plsq[0], dtype=np.float64)
+        fitted = self.peval(x, p)
+        residuals = np.asarray(self.y, dtype=np.float64) - fitted
+        sigma = np.sqrt(np.sum(residuals**2) / max(len(x) - 4, 1))
+        rng = np.random.default_rng(seed)
+
+        def noise(shape):
+            if method == "residual":
+                return residuals[rng.integers(0, len(residuals), shape)]
+            return rng.normal(0, sigma, shape)
+
+        # resampled series, refitted from the fit
+        Y = fitted + noise((n_boot, len(x)))
+        if processes == 1:
+            P, converged, _, _ = fit_logistic4_batch(x, Y, p, max_iter)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            chunks = np.array_split(np.arange(n_boot), processes or os.cpu_count() or 1)
+            with ProcessPoolExecutor(processes) as executor:
+                results = list(executor.map(_fit_chunk, [(x, Y[c], p, max_iter) for c in chunks if len(c)]))
+            P = np.concatenate([r[0] for r in results])
+            converged = np.concatenate([r[1] for r in results])
+
+        # predictions of the replicates
+        ok = np.isfinite(P).all(axis=1)
+        a, b, c, d = (P[ok, k:k + 1] for k in range(4))
+        predictions = logistic4(x_pred, a, b, c, d) + noise((ok.sum(), len(x_pred)))
+        self.bands = {"x": x_pred, "quantiles": np.asarray(quantiles),
+                      "bands": np.quantile(predictions, quantiles, axis=0) if ok.any()
+                               else np.full((len(quantiles), len(x_pred)), np.nan),
+                      "params": P, "converged": converged}
+        return self.bands
+
+
+    @traced("render.logistic_fit")
     def plot_results(self, dates, save=False, fname="logistic_fit.png",
                      title='Least-squares 4PL fit to covid-19 data'):
         """
@@ -141,13 +568,20 @@ class LogisticFit:
             Plot title. The default is 'Least-squares 4PL fit to covid-19 data'.
         """
         # Plot results
-        plt.plot(self.x, self.y, 'x')
+        import matplotlib.pyplot as plt
+        plt.plot(self.x, self.y, 'x', label='Data')
         plt.title(title)
 
         # add future prediction
         x_pred = [i for i in range(2*len(self.x))]
         y_pred = self.peval(x_pred, self.plsq[0])
-        plt.plot(x_pred, y_pred, "-.")
+        plt.plot(x_pred, y_pred, "-.", label='Prediction')
+
+        # add the bootstrap band (outer quantiles) when computed
+        bands = getattr(self, "bands", None)
+        if bands is not None:
+            plt.fill_between(bands["x"], bands["bands"][0], bands["bands"][-1], alpha=0.25,
+                             label="%g%% bootstrap band" % (100 * (bands["quantiles"][-1] - bands["quantiles"][0])))
     
         # define list of dates
         num_of_days = 2*len(self.x)
@@ -159,7 +593,7 @@ class LogisticFit:
         plt.ylabel("predicted number of infections")
         
         # add legend
-        plt.legend(['Data', 'Prediction'], loc='upper left')
+        plt.legend(loc='upper left')
 
         # save plot
         if save:
@@ -0,0 +1,273 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+from . import smoothing
+
+
+def shift(x, n=1, fill=0):
+    """
+    Shift an array along its last (time) axis.
+
+    Parameters
+    ----------
+    x : array
+        Time series or matrix of time series (countries x dates).
+    n : int, optional
+        Number of days to shift by. The default is 1.
+    fill : float, optional
+        Value of the emptied entries. The default is 0.
+
+    Returns
+    -------
+    y : array
+        Shifted array.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.full_like(x, fill)
+    if n < x.shape[-1]:
+        y[..., n:] = x[..., :x.shape[-1] - n]
+    return y
+
+
+def _ratio(a, b):
+    """
+    Compute a / b where 0 / 0 gives 0 and x / 0 gives inf.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = np.asarray(a, dtype=np.float64) / np.asarray(b, dtype=np.float64)
+    r[np.isnan(r)] = 0
+    return r
+
+
+def compute_new_cases(confirmed_cases):
+    """
+    Compute the daily new cases.
+
+    Parameters
+    ----------
+    confirmed_cases : array
+        Confirmed cases (dates or countries x dates).
+
+    Returns
+    -------
+    array
+        New cases.
+    """
+    return np.abs(np.asarray(confirmed_cases, dtype=np.float64) - shift(confirmed_cases))
+
+
+def compute_rate(cases, confirmed_cases):
+    """
+    Compute a rate of the confirmed cases (death rate, recovery rate).
+
+    Parameters
+    ----------
+    cases : array
+        Death or recovered cases (dates or countries x dates).
+    confirmed_cases : array
+        Confirmed cases (same shape).
+
+    Returns
+    -------
+    rate : array
+        Rate, negative values set to 0.
+    """
+    rate = _ratio(cases, confirmed_cases)
+    rate[rate < 0] = 0
+    return rate
+
+
+def compute_daily_growth(confirmed_cases, new_cases=None):
+    """
+    Compute the linear daily growth rate.
+
+    Parameters
+    ----------
+    confirmed_cases : array
+        Confirmed cases (dates or countries x dates).
+    new_cases : array, optional
+        Precomputed new cases. The default is None.
+
+    Returns
+    -------
+    growth : array
+        Daily growth, a growth from 0 cases is set to the new cases.
+    """
+    new_cases = compute_new_cases(confirmed_cases) if new_cases is None else new_cases
+    growth = _ratio(new_cases, shift(confirmed_cases))
+    inf = np.isinf(growth)
+    growth[inf] = new_cases[inf]
+    growth[growth < 0] = 0
+    return growth
+
+
+def compute_growth_factor(new_cases, smooth=True, ws=7, po=3, kernel=None):
+    """
+    Compute the growth factor (ratio of consecutive new cases).
+
+    Parameters
+    ----------
+    new_cases : array
+        New cases (dates or countries x dates).
+    smooth : bool, optional
+        Boolean describing whether or not to smooth the curve. The default is True.
+    ws : int, optional
+        The smoothing window in days. The default is 7.
+    po : int, optional
+        The smoothing polynomial order. The default is 3.
+    kernel : str, optional
+        Smoothing kernel (see smoothing.KERNELS). The default is None (smoothing_settings).
+
+    Returns
+    -------
+    factor : array
+        Growth factor, a growth from 0 new cases is set to the new cases.
+    """
+    new_cases = np.asarray(new_cases, dtype=np.float64)
+    factor = _ratio(new_cases, shift(new_cases))
+    inf = np.isinf(factor)
+    factor[inf] = new_cases[inf]
+
+    # smoothen results along the time axis
+    if smooth: factor = smoothing.smooth(factor, kernel, ws, po)
+
+    factor[factor < 0] = 0
+    return factor
+
+
+def compute_metrics(confirmed_cases, death_cases, recovered_cases, smooth=False, ws=7, po=3, kernel=None):
+    """
+    Compute all metrics for every country at once over country x date matrices.
+
+    Parameters
+    ----------
+    confirmed_cases : array
+        Confirmed cases (countries x dates).
+    death_cases : array
+        Death cases (countries x dates).
+    recovered_cases : array
+        Recovered cases (countries x dates).
+    smooth : bool, optional
+        Boolean describing whether or not to smooth the growth factor. The default is False.
+    ws : int, optional
+        The smoothing window in days. The default is 7.
+    po : int, optional
+        The smoothing polynomial order. The default is 3.
+    kernel : str, optional
+        Smoothing kernel (see smoothing.KERNELS). The default is None (smoothing_settings).
+
+    Returns
+    -------
+    metrics : dict
+        new_cases, death_rate, recovery_rate, daily_growth and growth_factor matrices.
+    """
+    new_cases = compute_new_cases(confirmed_cases)
+    return {"new_cases": new_cases,
+            "death_rate": compute_rate(death_cases, confirmed_cases),
+            "recovery_rate": compute_rate(recovered_cases, confirmed_cases),
+            "daily_growth": compute_daily_growth(confirmed_cases, new_cases),
+            "growth_factor": compute_growth_factor(new_cases, smooth, ws, po, kernel)}
+
+
+def compute_estimated_cases(confirmed_cases, death_cases, g=8, j=20):
+    """
+    Compute the estimated infected population (same estimator as dataproc.compute_estimated_infected_population).
+
+    Parameters
+    ----------
+    confirmed_cases : array
+        Confirmed cases (dates or countries x dates).
+    death_cases : array
+        Death cases (same shape).
+    g : float, optional
+        Assumed average number of days taken for a COVID-19 case to lead to death. The default is 8.
+    j : int, optional
+        Assumed number of days to estimate the rates on. The default is 20.
+
+    Returns
+    -------
+    array
+        Estimated number of cases.
+    """
+    return shift(_estimation_base(confirmed_cases, death_cases), j, fill=1) * (1 + g)**j
+
+
+def _estimation_base(confirmed_cases, death_cases):
+    """
+    Compute D / CFR with CFR = D / C, where 0 / 0 gives 0 (the cases of the days with deaths).
+    """
+    return _ratio(death_cases, _ratio(death_cases, confirmed_cases))
+
+
+def sweep_estimated_cases(confirmed_cases, death_cases, g, j, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95),
+                          smooth=False, ws=7, po=3, kernel=None, dtype=np.float32, chunk=2**24):
+    """
+    Evaluate the estimated infected population over a grid of (g, j) values and summarize it by quantiles.
+
+    The estimate is D / CFR shifted by j days and scaled by (1 + g)**j: the shifted (and smoothed)
+    series are computed once per j, the g values only scale them. The countries x dates x (g, j) grid
+    is broadcast in blocks of about chunk values, sorted along its last axis and reduced to its quantiles.
+
+    Parameters
+    ----------
+    confirmed_cases : array
+        Confirmed cases (dates or countries x dates).
+    death_cases : array
+        Death cases (same shape).
+    g : array
+        Values of g (average number of days taken for a case to lead to death).
+    j : array
+        Values of j (number of days to estimate the rates on).
+    quantiles : array, optional
+        Quantiles computed over the grid (linear interpolation). The default is (0.05, 0.25, 0.5, 0.75, 0.95).
+    smooth : bool, optional
+        Boolean describing whether or not to smooth the estimates (as CovidCountry.compute_estimations). The default is False.
+    ws : int, optional
+        The smoothing window in days. The default is 7.
+    po : int, optional
+        The smoothing polynomial order. The default is 3.
+    kernel : str, optional
+        Smoothing kernel (see smoothing.KERNELS). The default is None (smoothing_settings).
+    dtype : numpy.dtype, optional
+        Grid and result dtype. The default is numpy.float32.
+    chunk : int, optional
+        Approximate number of grid values broadcast at once. The default is 2**24.
+
+    Returns
+    -------
+    array
+        Quantiles of the estimates (quantiles x dates or quantiles x countries x dates).
+    """
+    g = np.atleast_1d(np.asarray(g, dtype=np.float64))
+    j = np.atleast_1d(np.asarray(j, dtype=int))
+    base = np.atleast_2d(_estimation_base(confirmed_cases, death_cases))
+
+    # one shifted series per j (countries x dates x j), smoothed before scaling: smoothing is linear
+    # (a one-off stack, not memoized: hashing and copying it costs more than the smoothing)
+    shifted = np.stack([shift(base, k, fill=1) for k in j])
+    if smooth:
+        shifted = smoothing.smooth(shifted, kernel, ws, po, memoize=False)
+        shifted[shifted < 0] = 0
+    shifted = np.moveaxis(shifted, 0, -1).astype(dtype)
+
+    # scales (g x j) and the positions of the quantiles in the sorted grid
+    scales = ((1 + g[:, None])**j[None, :]).astype(dtype)
+    n_countries, n_days = base.shape
+    k = np.asarray(quantiles, dtype=np.float64) * (scales.size - 1)
+    lo = np.floor(k).astype(int)
+    hi = np.minimum(lo + 1, scales.size - 1)
+    w = (k - lo).astype(dtype)
+
+    summary = np.empty((len(k), n_countries, n_days), dtype=dtype)
+    block = max(1, chunk // max(1, scales.size * n_days))
+    for start in range(0, n_countries, block):
+        rows = slice(start, start + block)
+        grid = (shifted[rows, :, None, :] * scales).reshape(-1, n_days, scales.size)
+        grid.sort(axis=-1)
+        summary[:, rows] = np.moveaxis(grid[..., lo] + w * (grid[..., hi] - grid[..., lo]), -1, 0)
+    return summary if np.ndim(confirmed_cases) > 1 else summary[:, 0]
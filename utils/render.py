@@ -0,0 +1,291 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from . import metrics, rt, smoothing, tracing
+from .visproc import plot_data, plot_points_cloud
+from .dataproc import get_dataset
+
+
+# country charts: title and curves (column, plot_data arguments)
+CHARTS = {"death_rate"     : ("Covid-19 death rate",
+                              [("death_rate", {"label": "Death rate of COVID-19", "color": "grey", "ls": "--"})]),
+          "recovery_rate"  : ("Covid-19 recovery rate",
+                              [("recovery_rate", {"label": "Recovery rate of COVID-19", "color": "grey", "ls": "--"})]),
+          "estimated_cases": ("Estimated number of Covid-19 infections",
+                              [("confirmed_cases", {"label": "Confirmed COVID-19 cases", "color": "orange", "smooth": True}),
+                               ("estimated_cases", {"label": "Estimated COVID-19 cases", "color": "purple", "ls": "--"})]),
+          "daily_growth"   : ("Covid-19 daily growth",
+                              [("daily_growth", {"label": "Daily growth of COVID-19 cases", "color": "grey", "ls": "--"})]),
+          "growth_factor"  : ("Growth factor of Covid-19",
+                              [("growth_factor", {"label": "Growth factor of COVID-19 cases", "color": "grey", "ls": "--"})]),
+          "rt"             : ("Covid-19 reproduction number (Rt)",
+                              [("rt", {"label": "Rt of COVID-19", "color": "grey", "smooth": False}),
+                               ("rt_lower", {"label": "95% credible interval", "color": "grey", "ls": ":", "smooth": False}),
+                               ("rt_upper", {"label": "_nolegend_", "color": "grey", "ls": ":", "smooth": False})])}
+
+# per process state: shared data and reusable figures
+_worker = {}
+
+
+def new_figure(figsize=(8, 5), dpi=100):
+    """
+    Create a figure on an Agg canvas, independent of the pyplot state.
+
+    Parameters
+    ----------
+    figsize : tuple, optional
+        Figure size in inches. The default is (8, 5).
+    dpi : int, optional
+        Figure resolution. The default is 100.
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        Figure.
+    ax : matplotlib.axes.Axes
+        Figure axes.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+
+    # fixed margins (room for the rotated dates) instead of a per-draw layout pass
+    fig.subplots_adjust(left=0.1, right=0.97, bottom=0.2, top=0.92)
+    return fig, fig.add_subplot(111)
+
+
+def draw_chart(ax, chart, dates, columns, smooth=True, title=None, kernel=None, ws=None, po=None):
+    """
+    Draw a country chart.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+        Axes to draw on.
+    chart : str
+        Chart name (key of CHARTS).
+    dates : array
+        x-axis dates.
+    columns : pandas.Dataframe or dict
+        Data columns of the chart.
+    smooth : bool, optional
+        Boolean describing whether or not to smooth the curves. The default is True.
+    title : str, optional
+        Plot title. The default is None (CHARTS title).
+    kernel : str, optional
+        Smoothing kernel (see smoothing.KERNELS). The default is None (smoothing_settings).
+    ws : int, optional
+        The smoothing window in days. The default is None (smoothing_settings).
+    po : int, optional
+        The smoothing polynomial order. The default is None (smoothing_settings).
+    """
+    default_title, curves = CHARTS[chart]
+    for column, kwargs in curves:
+        plot_data(dates, columns[column], **dict({"smooth": smooth}, **kwargs), ax=ax, kernel=kernel, ws=ws, po=po)
+    ax.set_title(default_title if title is None else title)
+
+
+def estimate_cases(confirmed_cases, death_cases, g=14, j=1, ws=7, po=3, kernel="savgol"):
+    """
+    Estimated infections of a country, smoothed and clipped at 0 (as CovidCountry.compute_estimations).
+
+    Parameters
+    ----------
+    confirmed_cases : array
+        Confirmed cases.
+    death_cases : array
+        Death cases.
+    g : int, optional
+        Assumed average number of days taken for a COVID-19 case to lead to death. The default is 14.
+    j : int, optional
+        Assumed number of days to estmate the rates on. The default is 1.
+    ws : int, optional
+        The smoothing window in days. The default is 7.
+    po : int, optional
+        The smoothing polynomial order. The default is 3.
+    kernel : str, optional
+        The smoothing kernel (see smoothing.KERNELS). The default is "savgol".
+
+    Returns
+    -------
+    array
+        Estimated infections.
+    """
+    I = metrics.compute_estimated_cases(confirmed_cases, death_cases, g=g, j=j)
+    I = smoothing.smooth(I, kernel, ws, po)
+    I[I < 0] = 0
+    return I
+
+
+def _template(name):
+    """
+    Get the reusable figure of a chart in this process, cleared.
+    """
+    if name not in _worker["figures"]:
+        _worker["figures"][name] = new_figure()
+    fig, ax = _worker["figures"][name]
+    ax.cla()
+    return fig, ax
+
+
+def _safe_name(name):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(name))
+
+
+def _init_worker(data, options):
+    _worker.clear()
+    _worker.update(data=data, options=options, figures={})
+
+    # forked workers start with a copy of the parent spans
+    if options["pool"]: tracing.reset()
+
+
+def _render_task(task):
+    """
+    Render a task in a span.
+
+    Parameters
+    ----------
+    task : tuple
+        ("country", row index) or ("world", date index).
+
+    Returns
+    -------
+    paths : list
+        Written files.
+    spans : list
+        Spans recorded by a worker process, to be merged in the parent.
+    """
+    with tracing.span("render." + task[0]):
+        paths = _render(task)
+    return paths, tracing.drain() if _worker["options"]["pool"] else []
+
+
+def _render(task):
+    """
+    Render the charts of one country or the world cloud of one date.
+
+    Parameters
+    ----------
+    task : tuple
+        ("country", row index) or ("world", date index).
+
+    Returns
+    -------
+    paths : list
+        Written files.
+    """
+    kind, k = task
+    data, options = _worker["data"], _worker["options"]
+    paths = []
+
+    if kind == "country":
+        country = data["countries"][k]
+        confirmed, deaths, recovered = data["confirmed"][k], data["deaths"][k], data["recovered"][k]
+        columns = metrics.compute_metrics(confirmed, deaths, recovered, smooth=options["smooth"])
+        columns.update(confirmed_cases=confirmed,
+                       estimated_cases=estimate_cases(confirmed, deaths, options["g"], options["j"]))
+        if "rt" in data:
+            columns.update(rt=data["rt"]["mean"][k], rt_lower=data["rt"]["lower"][k], rt_upper=data["rt"]["upper"][k])
+
+        folder = os.path.join(options["out_dir"], _safe_name(country))
+        os.makedirs(folder, exist_ok=True)
+        for chart in options["charts"]:
+            fig, ax = _template(chart)
+            draw_chart(ax, chart, data["dates"], columns, smooth=options["smooth"],
+                       title=CHARTS[chart][0] + " - " + country)
+            paths.append(os.path.join(folder, chart + ".png"))
+            fig.savefig(paths[-1])
+
+    else:
+        date = pd.Timestamp(data["dates"][k]).strftime("%Y-%m-%d")
+        df = pd.DataFrame({"country": data["countries"],
+                           "confirmed_cases": data["confirmed"][:, k],
+                           "death_cases": data["deaths"][:, k]})
+        df = df[df.country.isin(options["world_countries"]) & (df.confirmed_cases > 0) & (df.death_cases > 0)]
+
+        folder = os.path.join(options["out_dir"], "world")
+        os.makedirs(folder, exist_ok=True)
+        fig, ax = _template("world")
+        plot_points_cloud(df, "Covid-19 Confirmed cases to death cases on " + date,
+                          "death_cases", "confirmed_cases", "country", color="red", ax=ax)
+        paths.append(os.path.join(folder, date + ".png"))
+        fig.savefig(paths[-1])
+
+    return paths
+
+
+def render_charts(out_dir, countries=None, dates=None, charts=tuple(CHARTS), world_countries=None,
+                  smooth=True, g=14, j=1, processes=None):
+    """
+    Render all the country charts and world point clouds to PNG files in one batch.
+
+    Rendering uses Agg canvases only (no pyplot state, no windows) and is spread
+    over a process pool, every process reusing one figure per chart.
+
+    Parameters
+    ----------
+    out_dir : str
+        Output directory (out_dir/<country>/<chart>.png and out_dir/world/<date>.png).
+    countries : list, optional
+        Countries to render the charts of. The default is None (all countries).
+    dates : list, optional
+        Dates to render the world cloud of. The default is None (last date).
+    charts : tuple, optional
+        Country charts to render. The default is all CHARTS.
+    world_countries : list, optional
+        Countries shown in the world clouds. The default is None (all countries).
+    smooth : bool, optional
+        Boolean describing whether or not to smooth the curves. The default is True.
+    g : int, optional
+        Estimation parameter g (see CovidCountry). The default is 14.
+    j : int, optional
+        Estimation parameter j (see CovidCountry). The default is 1.
+    processes : int, optional
+        Number of processes, 1 renders in this process. The default is None (one per CPU).
+
+    Returns
+    -------
+    paths : list
+        Written files.
+    """
+    cubes = get_dataset().cubes()
+    cube = cubes["confirmed_cases"]
+    names = [str(c) for c in cube.countries]
+    data = {"countries": names, "dates": cube.dates.values,
+            "confirmed": np.asarray(cube.values), "deaths": np.asarray(cubes["death_cases"].values),
+            "recovered": np.asarray(cubes["recovered_cases"].values)}
+    # Rt of all countries at once
+    if "rt" in charts:
+        data["rt"] = rt.estimate_rt(metrics.compute_new_cases(data["confirmed"]))
+
+    options = {"out_dir": out_dir, "charts": list(charts), "smooth": smooth, "g": g, "j": j,
+               "pool": processes != 1,
+               "world_countries": names if world_countries is None else list(world_countries)}
+
+    # one task per country and per date
+    rows = {c: i for i, c in enumerate(names)}
+    countries = names if countries is None else countries
+    dates = cube.dates[-1:] if dates is None else pd.to_datetime(dates)
+    tasks = [("country", rows[c]) for c in countries if c in rows]
+    tasks += [("world", k) for k in cube.dates.get_indexer(dates) if k >= 0]
+
+    if processes == 1:
+        _init_worker(data, options)
+        results = [_render_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(data, options)) as executor:
+            results = list(executor.map(_render_task, tasks, chunksize=max(1, len(tasks) // (4 * (processes or os.cpu_count() or 1)))))
+    # spans recorded in the workers
+    for _, spans in results:
+        tracing.merge(spans)
+    return [path for paths, _ in results for path in paths]
@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+from .tracing import span
+
+
+# serial interval gamma (mean and standard deviation in days), estimation window in days
+# and gamma prior of Rt (shape, scale) of Cori et al. (2013)
+rt_settings = {"si_mean": 4.7, "si_sd": 2.9, "window": 7, "prior_shape": 1.0, "prior_scale": 5.0}
+
+
+def configure_rt(si_mean=None, si_sd=None, window=None, prior_shape=None, prior_scale=None):
+    """
+    Update the default Rt estimation settings.
+
+    Parameters
+    ----------
+    si_mean : float, optional
+        Mean of the serial interval in days. The default is None (unchanged).
+    si_sd : float, optional
+        Standard deviation of the serial interval in days. The default is None (unchanged).
+    window : int, optional
+        Number of days Rt is assumed constant over. The default is None (unchanged).
+    prior_shape : float, optional
+        Shape of the gamma prior of Rt. The default is None (unchanged).
+    prior_scale : float, optional
+        Scale of the gamma prior of Rt. The default is None (unchanged).
+    """
+    for name, value in (("si_mean", si_mean), ("si_sd", si_sd), ("window", window),
+                        ("prior_shape", prior_shape), ("prior_scale", prior_scale)):
+        if value is not None: rt_settings[name] = value
+
+
+def serial_interval(mean=None, sd=None, coverage=0.999):
+    """
+    Discretize a gamma serial interval distribution.
+
+    Parameters
+    ----------
+    mean : float, optional
+        Mean in days. The default is None (rt_settings).
+    sd : float, optional
+        Standard deviation in days. The default is None (rt_settings).
+    coverage : float, optional
+        Probability mass kept before truncating the tail. The default is 0.999.
+
+    Returns
+    -------
+    w : numpy.ndarray
+        Probability of a serial interval of k days, w[0] = 0.
+    """
+    # deferred: scipy is only needed by the estimation
+    from scipy import stats
+    mean = rt_settings["si_mean"] if mean is None else mean
+    sd = rt_settings["si_sd"] if sd is None else sd
+
+    # P(k - 1/2 < SI <= k + 1/2) for k >= 1 (keeps the mean)
+    dist = stats.gamma((mean / sd)**2, scale=sd**2 / mean)
+    n_days = max(2, int(np.ceil(dist.ppf(coverage))))
+    w = np.diff(dist.cdf(np.arange(n_days + 1) - 0.5))
+    w[0] = 0
+    return w / w.sum()
+
+
+def _window_sum(x, n):
+    """
+    Sum x over the last n days (fewer at the start) along its last axis, with cumulative sums.
+    """
+    c = np.concatenate([np.zeros(x.shape[:-1] + (1,)), np.cumsum(x, axis=-1)], axis=-1)
+    t = np.arange(1, x.shape[-1] + 1)
+    return c[..., t] - c[..., np.maximum(t - n, 0)]
+
+
+def _gamma_quantile(shape, q, exact_below=50):
+    """
+    Quantile q of gamma(shape, 1) distributions: Wilson-Hilferty approximation refined by one Newton step
+    for large shapes (relative error below 1e-6), exact inverse of the incomplete gamma function below exact_below.
+    """
+    from scipy.special import gammainc, gammaincinv, gammaln, ndtri
+    large = shape >= exact_below
+    a = shape[large]
+    x = a * (1 - 1 / (9 * a) + ndtri(q) / (3 * np.sqrt(a)))**3
+    x -= (gammainc(a, x) - q) / np.exp((a - 1) * np.log(x) - x - gammaln(a))
+
+    quantile = np.empty_like(shape)
+    quantile[large] = x
+    quantile[~large] = gammaincinv(shape[~large], q)
+    return quantile
+
+
+def infection_pressure(incidence, si=None):
+    """
+    Compute the total infectiousness Lambda_t = sum_k I_{t-k} w_k of the past incidence.
+
+    Parameters
+    ----------
+    incidence : array
+        Daily new cases (dates or countries x dates).
+    si : array, optional
+        Discretized serial interval (see serial_interval). The default is None (rt_settings).
+
+    Returns
+    -------
+    array
+        Infection pressure, same shape as the incidence.
+    """
+    from scipy.signal import fftconvolve
+    incidence = np.asarray(incidence, dtype=np.float64)
+    w = serial_interval() if si is None else np.asarray(si, dtype=np.float64)
+
+    # one FFT convolution along the time axis for all countries
+    kernel = w.reshape((1,) * (incidence.ndim - 1) + (-1,))
+    pressure = fftconvolve(incidence, kernel, axes=-1)[..., :incidence.shape[-1]]
+    pressure[pressure < 0] = 0
+    return pressure
+
+
+def estimate_rt(incidence, si=None, window=None, interval=0.95, prior_shape=None, prior_scale=None):
+    """
+    Estimate the time-varying reproduction number Rt with the renewal equation (Cori et al. 2013).
+
+    Over a window of tau days ending at t, the incidence I is assumed to be Poisson with mean
+    Rt * Lambda, so that the gamma prior (a, b) gives a gamma posterior of shape a + sum(I)
+    and rate 1 / b + sum(Lambda). The first window days and the days with no infection
+    pressure in their window are NaN.
+
+    Parameters
+    ----------
+    incidence : array
+        Daily new cases (dates or countries x dates).
+    si : array, optional
+        Discretized serial interval (see serial_interval). The default is None (rt_settings).
+    window : int, optional
+        Number of days Rt is assumed constant over. The default is None (rt_settings).
+    interval : float, optional
+        Probability of the equal-tailed credible interval. The default is 0.95.
+    prior_shape : float, optional
+        Shape of the gamma prior. The default is None (rt_settings).
+    prior_scale : float, optional
+        Scale of the gamma prior. The default is None (rt_settings).
+
+    Returns
+    -------
+    rt : dict
+        mean, std, lower and upper bounds of the posterior of Rt, same shape as the incidence.
+    """
+    incidence = np.asarray(incidence, dtype=np.float64)
+    w = serial_interval() if si is None else np.asarray(si, dtype=np.float64)
+    window = rt_settings["window"] if window is None else window
+    a = rt_settings["prior_shape"] if prior_shape is None else prior_shape
+    b = rt_settings["prior_scale"] if prior_scale is None else prior_scale
+
+    with span("rt.estimate", shape=incidence.shape):
+        # gamma posterior of every window
+        shape = a + _window_sum(incidence, window)
+        rate = 1 / b + _window_sum(infection_pressure(incidence, w), window)
+
+        # no pressure: no case in the window shifted by the serial interval support (exact integer sums)
+        unknown = _window_sum(incidence, window + len(w) - 2)
+        unknown = np.concatenate([np.zeros(unknown.shape[:-1] + (1,)), unknown[..., :-1]], axis=-1) == 0
+        unknown[..., :window] = True
+
+        mean, std = shape / rate, np.sqrt(shape) / rate
+        lower = _gamma_quantile(shape, (1 - interval) / 2) / rate
+        upper = _gamma_quantile(shape, (1 + interval) / 2) / rate
+        for x in (mean, std, lower, upper):
+            x[unknown] = np.nan
+    return {"mean": mean, "std": std, "lower": lower, "upper": upper}
@@ -0,0 +1,320 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+from .tracing import traced
+
+
+def _sensitivity_deriv(y, N, beta, gamma, out):
+    """
+    Compute the SIR derivatives and their forward sensitivities for an ensemble.
+
+    Parameters
+    ----------
+    y : array
+        State (9 x members): S, I, R, dS/dbeta, dI/dbeta, dR/dbeta, dS/dgamma, dI/dgamma, dR/dgamma.
+    N : array
+        Total populations.
+    beta : array
+        Contract rates.
+    gamma : array
+        Recovery rates.
+    out : array
+        Derivatives buffer, same layout as y.
+
+    Returns
+    -------
+    out : array
+        Derivatives.
+    """
+    S, I, R, Sb, Ib, Rb, Sg, Ig, Rg = y
+    SI = S * I / N
+    infections = beta * SI
+
+    # d infections / d(S, I) applied to the sensitivities
+    dS, dI = beta * I / N, beta * S / N
+    inf_b = dS * Sb + dI * Ib + SI
+    inf_g = dS * Sg + dI * Ig
+
+    gI, gIb, gIg = gamma * I, gamma * Ib, gamma * Ig + I
+    out[0], out[1], out[2] = -infections, infections - gI, gI
+    out[3], out[4], out[5] = -inf_b, inf_b - gIb, gIb
+    out[6], out[7], out[8] = -inf_g, inf_g - gIg, gIg
+    return out
+
+
+def sir_sensitivities(number_of_days, N, S0, I0, R0, beta, gamma, substeps=4):
+    """
+    Integrate SIR models together with their sensitivities to beta and gamma.
+
+    All members advance together with a classic fixed-step Runge-Kutta scheme
+    (substeps per day), so a fast member does not force small steps on the
+    others. Applied to the sensitivity equations, the scheme gives the exact
+    derivatives of the computed trajectories.
+
+    Parameters
+    ----------
+    number_of_days : int
+        Number of days to integrate (outputs at days 0, 1, ...).
+    N, S0, I0, R0, beta, gamma : array
+        Per member populations, initial conditions and rates.
+    substeps : int, optional
+        Runge-Kutta steps per day. The default is 4.
+
+    Returns
+    -------
+    X : array
+        S, I, R trajectories (members x 3 x days).
+    dX : array
+        Sensitivities of S, I, R to (beta, gamma) (members x 3 x 2 x days).
+    """
+    y = np.zeros((9, len(N)))
+    y[0], y[1], y[2] = S0, I0, R0
+    out = np.empty((number_of_days,) + y.shape)
+    out[0] = y
+    h = 1.0 / substeps
+
+    k1, k2, k3, k4 = (np.empty_like(y) for _ in range(4))
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        for day in range(1, number_of_days):
+            for _ in range(substeps):
+                _sensitivity_deriv(y, N, beta, gamma, k1)
+                _sensitivity_deriv(y + h / 2 * k1, N, beta, gamma, k2)
+                _sensitivity_deriv(y + h / 2 * k2, N, beta, gamma, k3)
+                _sensitivity_deriv(y + h * k3, N, beta, gamma, k4)
+                k2 += k3
+                k2 *= 2
+                k1 += k2
+                k1 += k4
+                y += h / 6 * k1
+            out[day] = y
+
+    out = out.transpose(2, 1, 0)
+    return out[:, :3], out[:, 3:].reshape(len(N), 2, 3, number_of_days).transpose(0, 2, 1, 3)
+
+
+def initial_rates(infected, removed, N, length=None):
+    """
+    Data-driven guesses of beta and gamma from the integrated SIR balances.
+
+    R(T) - R(0) = gamma sum(I) and (I + R)(T) - (I + R)(0) = beta sum(S I / N),
+    summed over the observed days.
+
+    Parameters
+    ----------
+    infected : array
+        Observed active cases (members x days).
+    removed : array
+        Observed recoveries plus deaths (same shape).
+    N : array
+        Total populations (members,).
+    length : array, optional
+        Number of observed days per member. The default is None (all days).
+
+    Returns
+    -------
+    beta : array
+        Guessed contract rates.
+    gamma : array
+        Guessed recovery rates.
+    """
+    m, n_days = infected.shape
+    length = np.full(m, n_days) if length is None else np.asarray(length)
+    rows, last = np.arange(m), length - 1
+
+    # sums over the observed days but the last one
+    valid = np.arange(n_days)[None, :] < last[:, None]
+    S = N[:, None] - infected - removed
+    sum_I = (infected * valid).sum(axis=1)
+    sum_SI = (S * infected / N[:, None] * valid).sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gamma = (removed[rows, last] - removed[:, 0]) / sum_I
+        beta = (infected[rows, last] + removed[rows, last] - infected[:, 0] - removed[:, 0]) / sum_SI
+    gamma = np.clip(np.nan_to_num(gamma, nan=1/14), 1e-3, 2.0)
+    beta = np.clip(np.nan_to_num(beta, nan=0.3), 1e-3, 5.0)
+    return beta, gamma
+
+
+@traced("sir.calibrate")
+def calibrate_sir(infected, removed, total_population, min_cases=10, start_offsets=(0,), max_days=120,
+                  spread=(0.5, 1.0, 2.0), prune_after=3, max_iter=50, tol=1e-6):
+    """
+    Estimate the SIR contract rate (beta) and recovery rate (gamma) of one or many countries.
+
+    The rates are assumed constant over the fitted window: by default the last
+    max_days days, as later waves or policy changes make them vary over a whole series.
+    Every (country, start, initial guess) combination is one member of a batch:
+    all members are integrated together with their forward sensitivities (no
+    finite differences) and
+    refined with a Levenberg-Marquardt step on (log beta, log gamma), each
+    member with its own damping. The best fit over the initial guesses (and the
+    start offsets) is kept per country. The initial guesses are the data-driven
+    rates of initial_rates multiplied by every pair of spread factors; after a
+    few iterations only the best start of each (country, offset) is refined.
+
+    Parameters
+    ----------
+    infected : array
+        Observed active cases (days) or (countries x days).
+    removed : array
+        Observed recoveries plus deaths (same shape).
+    total_population : float or array
+        Population of each country.
+    min_cases : int, optional
+        Cases (infected + removed) at which the fitted window starts. The default is 10.
+    start_offsets : tuple, optional
+        Candidate delays in days of the window start, the best one is kept. The default is (0,).
+    max_days : int, optional
+        Maximum number of fitted days, the window starts at most max_days days before the
+        last day. The default is 120, None fits from the first day with min_cases cases.
+    spread : tuple, optional
+        Factors applied to the guessed beta and gamma (multi-start). The default is (0.5, 1.0, 2.0).
+    prune_after : int, optional
+        Iterations after which only the best start is refined. The default is 3.
+    max_iter : int, optional
+        Maximum number of iterations. The default is 50.
+    tol : float, optional
+        Relative tolerance on the cost. The default is 1e-6.
+
+    Returns
+    -------
+    result : dict
+        beta, gamma, start (index of the first fitted day), cost (mean squared
+        scaled residual) and converged, one entry per country.
+    """
+    infected = np.atleast_2d(np.asarray(infected, dtype=np.float64))
+    removed = np.atleast_2d(np.asarray(removed, dtype=np.float64))
+    n_countries, n_days = infected.shape
+    N = np.broadcast_to(np.asarray(total_population, dtype=np.float64), (n_countries,))
+
+    # window starts per country and offset, within the last max_days days
+    reached = (infected + removed) >= min_cases
+    base = np.where(reached.any(axis=1), np.argmax(reached, axis=1), n_days - 2)
+    if max_days is not None: base = np.maximum(base, n_days - max_days)
+    offsets = np.asarray(start_offsets, dtype=int)
+    starts = np.minimum(base[:, None] + offsets[None, :], n_days - 2)
+
+    # members: country x offset x (beta, gamma) spread
+    factors = np.array([(b, g) for b in spread for g in spread])
+    shape = (n_countries, len(offsets), len(factors))
+    country = np.broadcast_to(np.arange(n_countries)[:, None, None], shape).ravel()
+    start = np.broadcast_to(starts[:, :, None], shape).ravel()
+    factors = np.broadcast_to(factors[None, None], shape + (2,)).reshape(-1, 2)
+
+    # observations aligned on each member's start, masked after the data ends
+    length = n_days - start
+    n_fit = length.max()
+    tau = np.arange(n_fit)
+    idx = np.minimum(start[:, None] + tau[None, :], n_days - 1)
+    mask = tau[None, :] < length[:, None]
+    obs_I = infected[country[:, None], idx] * mask
+    obs_R = removed[country[:, None], idx] * mask
+
+    # residual scales of each country over its fitted days
+    fitted = np.arange(n_days)[None, :] >= starts.min(axis=1)[:, None]
+    scale_I = np.maximum(np.abs(infected * fitted).max(axis=1), 1)[country][:, None]
+    scale_R = np.maximum(np.abs(removed * fitted).max(axis=1), 1)[country][:, None]
+
+    # initial conditions from the data at the window start
+    I0 = np.maximum(obs_I[:, 0], 1)
+    R0 = np.maximum(obs_R[:, 0], 0)
+    Nm = N[country]
+    S0 = Nm - I0 - R0
+
+    # multi-start around the data-driven rates
+    theta = np.log(np.stack(initial_rates(obs_I, obs_R, Nm, length), axis=1) * factors)
+
+    def evaluate(members, theta):
+        beta, gamma = np.exp(theta).T
+        X, dX = sir_sensitivities(n_fit, Nm[members], S0[members], I0[members], R0[members], beta, gamma)
+        w = mask[members]
+        r = np.concatenate([w * (X[:, 1] - obs_I[members]) / scale_I[members],
+                            w * (X[:, 2] - obs_R[members]) / scale_R[members]], axis=1)
+
+        # d residuals / d log(theta)
+        dlog = np.exp(theta)[:, :, None]
+        J = np.concatenate([w[:, None] * dX[:, 1] * dlog / scale_I[members][:, None],
+                            w[:, None] * dX[:, 2] * dlog / scale_R[members][:, None]], axis=2)
+        r = np.nan_to_num(r, nan=np.inf)
+        return r, J.transpose(0, 2, 1), (r * r).sum(axis=1)
+
+    m = len(country)
+    r, J, cost = evaluate(np.arange(m), theta)
+    lam = np.full(m, 1e-3)
+
+    # residuals within tol of the data scale: nothing left to fit, no active case in the window: nothing to fit
+    fits_data = lambda cost, members: cost <= tol**2 * 2 * length[members]
+    converged = fits_data(cost, np.arange(m)) | ~obs_I.any(axis=1)
+    active = np.isfinite(cost) & ~converged
+
+    for it in range(max_iter):
+        # keep refining the best start of each (country, offset) only
+        if it == prune_after:
+            grouped = np.where(np.isfinite(cost), cost, np.inf).reshape(-1, len(factors))
+            keep = np.zeros(grouped.shape, dtype=bool)
+            keep[np.arange(len(grouped)), np.argmin(grouped, axis=1)] = True
+            active &= keep.ravel()
+
+        members = np.flatnonzero(active)
+        if members.size == 0:
+            break
+
+        # damped Gauss-Newton step on the active members
+        Ja, ra = J[members], r[members]
+        A = Ja.transpose(0, 2, 1) @ Ja
+        g = (Ja.transpose(0, 2, 1) @ ra[:, :, None])[:, :, 0]
+        diag = np.maximum(np.diagonal(A, axis1=1, axis2=2), 1e-12)
+        step = -np.linalg.solve(A + (lam[members, None] * diag)[:, :, None] * np.eye(2), g[:, :, None])[:, :, 0]
+        step = np.clip(np.nan_to_num(step), -2, 2)
+
+        # trial point (with sensitivities, reused on acceptance)
+        r_new, J_new, cost_new = evaluate(members, theta[members] + step)
+        better = np.isfinite(cost_new) & (cost_new < cost[members])
+        done = better & (cost[members] - cost_new <= tol * cost[members])
+        done |= better & ((np.abs(step).max(axis=1) < tol) | fits_data(cost_new, members))
+
+        acc = members[better]
+        theta[acc], r[acc], J[acc], cost[acc] = theta[members][better] + step[better], r_new[better], J_new[better], cost_new[better]
+        lam[members] = np.where(better, lam[members] / 10, lam[members] * 10)
+
+        converged[members[done]] = True
+        active[members[done | (lam[members] > 1e12)]] = False
+
+    # best member per country (mean cost over the fitted days)
+    mean_cost = (cost / (2 * length)).reshape(n_countries, -1)
+    best = np.nanargmin(np.where(np.isfinite(mean_cost), mean_cost, np.inf), axis=1)
+    pick = np.arange(n_countries) * mean_cost.shape[1] + best
+    beta, gamma = np.exp(theta[pick]).T
+    return {"beta": beta, "gamma": gamma, "start": start[pick],
+            "cost": mean_cost[np.arange(n_countries), best], "converged": converged[pick]}
+
+
+def calibrate_country(covid_df, total_population, **kwargs):
+    """
+    Estimate the SIR rates of a country from its CovidCountry.covid_df.
+
+    Parameters
+    ----------
+    covid_df : pandas.Dataframe
+        Country dataframe with the confirmed_cases, death_cases and recovered_cases columns.
+    total_population : int
+        Population of the country.
+    **kwargs :
+        Extra arguments passed to calibrate_sir.
+
+    Returns
+    -------
+    result : dict
+        beta, gamma, start date, start index, cost and converged of the country.
+    """
+    confirmed = covid_df["confirmed_cases"].values.astype(np.float64)
+    removed = (covid_df["recovered_cases"].values + covid_df["death_cases"].values).astype(np.float64)
+    result = {k: v[0] for k, v in calibrate_sir(confirmed - removed, removed, total_population, **kwargs).items()}
+    result["date"] = covid_df["date"].values[result["start"]]
+    return result
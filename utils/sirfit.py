@@ -6,8 +6,7 @@ This source code is licensed under the terms of the MIT license.
 For a copy, see <https://opensource.org/licenses/MIT>.
 """
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.integrate import odeint
+from .tracing import span, traced
 
 
 class SirFit:
@@ -66,7 +65,9 @@ class SirFit:
         y0 = self.S0, self.I0, self.R0
 
         # Integrate the SIR equations over the time grid, t.
-        ret = odeint(self.deriv, y0, self.t, args=(self.N, self.beta, self.gamma))
+        from scipy.integrate import odeint
+        with span("sir.odeint"):
+            ret = odeint(self.deriv, y0, self.t, args=(self.N, self.beta, self.gamma))
         S, I, R = ret.T
         return self.t, S, I, R
 
@@ -105,6 +106,7 @@ class SirFit:
         return dSdt, dIdt, dRdt
 
 
+    @traced("render.sir")
     def plot_fit(self, t, S, I, R, title="SIR model applied on Covid data"):
         """
         Plot fit/model results.
@@ -123,11 +125,131 @@ class SirFit:
             Plot title. The default is "SIR model applied on Covid data".
         """
         # Plot the data on three separate curves for S(t), I(t) and R(t)
+        import matplotlib.pyplot as plt
         plt.plot(t, S, 'b', alpha=0.5, lw=1)
         plt.plot(t, I, 'r', alpha=0.5, lw=1)
         plt.plot(t, R, 'g', alpha=0.5, lw=1)
         plt.xlabel('Number of days')
         plt.ylabel('Number of individuals')
-        plt.grid(b=True, which='major', c='w', lw=1, ls='-')
-        plt.legend(['Susceptible', 'Infected', 'Recovered'], loc='right middle')
+        plt.grid(True, which='major', c='w', lw=1, ls='-')
+        plt.legend(['Susceptible', 'Infected', 'Recovered'], loc='center right')
+        plt.title(title)
+
+
+class SirEnsemble:
+    def __init__(self, total_population, I0, R0, contract_rate, recovery_rate,
+                 number_of_days):
+        """
+        Init SIR ensemble class: many SIR models integrated together.
+
+        Every parameter is a scalar or an array, they are broadcast to the
+        ensemble size.
+
+        Parameters
+        ----------
+        total_population : int or array
+            Total count of the study population.
+        I0 : int or array
+            Initial number of infected.
+        R0 : int or array
+            Initial number of recoveries.
+        contract_rate : float or array
+            Contract/ disease propagation rate (beta).
+        recovery_rate : float or array
+            Rate of recoveries (gamma).
+        number_of_days : int
+            Number od days to foresee in the model (shared).
+        """
+        N, I0, R0, beta, gamma = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in
+                                                       (total_population, I0, R0, contract_rate, recovery_rate)))
+        self.N, self.I0, self.R0 = N.ravel(), I0.ravel(), R0.ravel()
+        self.S0 = self.N - self.I0 - self.R0
+        self.beta, self.gamma = beta.ravel(), gamma.ravel()
+        self.t = np.linspace(0, number_of_days, number_of_days)
+
+
+    def __len__(self):
+        return len(self.N)
+
+
+    def deriv(self, y, t, N, beta, gamma):
+        """
+        Compute the SIR derivatives of the whole ensemble.
+
+        Parameters
+        ----------
+        y : array
+            Flat state, (S, I, R) of each member one after the other.
+        t : float
+            Time in days.
+        N : array
+            Total populations.
+        beta : array
+            Contract rates.
+        gamma : array
+            Recovery rates.
+
+        Returns
+        -------
+        array
+            Flat derivatives, same layout as y.
+        """
+        S, I, R = y.reshape(-1, 3).T
+        infections = beta * S * I / N
+        recoveries = gamma * I
+        return np.stack([-infections, infections - recoveries, recoveries], axis=1).ravel()
+
+
+    def fit(self):
+        """
+        Integrate all the SIR models.
+
+        Each member only couples its own three compartments, so the system is
+        handed to the solver as banded (two sub- and super-diagonals).
+
+        Returns
+        -------
+        t : array
+            Time array in days.
+        S : array
+            Susceptible predicted counts (members x days).
+        I : array
+            Infected predicted counts (members x days).
+        R : array
+            Recovered predicted counts (members x days).
+        """
+        y0 = np.stack([self.S0, self.I0, self.R0], axis=1).ravel()
+        from scipy.integrate import odeint
+        with span("sir.odeint", members=len(self)):
+            ret = odeint(self.deriv, y0, self.t, args=(self.N, self.beta, self.gamma), ml=2, mu=2)
+        S, I, R = ret.reshape(len(self.t), -1, 3).transpose(2, 1, 0)
+        return self.t, S, I, R
+
+
+    @traced("render.sir")
+    def plot_fit(self, t, S, I, R, title="SIR model applied on Covid data"):
+        """
+        Plot the results of all the ensemble members.
+
+        Parameters
+        ----------
+        t : array
+            Time array in days.
+        S : array
+            Susceptible predicted counts (members x days).
+        I : array
+            Infected predicted counts (members x days).
+        R : array
+            Recovered predicted counts (members x days).
+        title : str, optional
+            Plot title. The default is "SIR model applied on Covid data".
+        """
+        import matplotlib.pyplot as plt
+        plt.plot(t, S.T, 'b', alpha=0.5, lw=1)
+        plt.plot(t, I.T, 'r', alpha=0.5, lw=1)
+        plt.plot(t, R.T, 'g', alpha=0.5, lw=1)
+        plt.xlabel('Number of days')
+        plt.ylabel('Number of individuals')
+        plt.grid(True, which='major', c='w', lw=1, ls='-')
+        plt.legend(plt.gca().lines[-3 * len(S)::len(S)], ['Susceptible', 'Infected', 'Recovered'], loc='center right')
         plt.title(title)
@@ -0,0 +1,327 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import hashlib
+import threading
+import collections
+import numpy as np
+from .tracing import span
+
+
+smoothing_settings = {"kernel": "savgol", "ws": 7, "po": 3, "cache_size": 256}
+
+# memoized results: (kernel, params, shape, digest) -> read-only array
+_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def configure_smoothing(kernel=None, ws=None, po=None, cache_size=None):
+    """
+    Update the default smoothing settings.
+
+    Parameters
+    ----------
+    kernel : str, optional
+        Default kernel (key of KERNELS). The default is None (unchanged).
+    ws : int, optional
+        Default smoothing window in days. The default is None (unchanged).
+    po : int, optional
+        Default smoothing polynomial order. The default is None (unchanged).
+    cache_size : int, optional
+        Number of memoized results, 0 disables the cache. The default is None (unchanged).
+    """
+    if kernel is not None: smoothing_settings["kernel"] = kernel
+    if ws is not None: smoothing_settings["ws"] = int(ws)
+    if po is not None: smoothing_settings["po"] = int(po)
+    if cache_size is not None:
+        smoothing_settings["cache_size"] = int(cache_size)
+        clear_cache()
+
+
+def clear_cache():
+    """
+    Drop all memoized smoothing results.
+    """
+    with _cache_lock:
+        _cache.clear()
+
+
+def _window_mean(x, lo, hi):
+    """
+    Mean over the window [t - lo, t + hi] of every date, clipped to the series.
+
+    Parameters
+    ----------
+    x : array
+        Time series or matrix of time series (countries x dates).
+    lo : int
+        Number of past days in the window.
+    hi : int
+        Number of future days in the window.
+
+    Returns
+    -------
+    array
+        Windowed means.
+    """
+    n = x.shape[-1]
+    c = np.concatenate([np.zeros(x.shape[:-1] + (1,)), np.cumsum(x, axis=-1)], axis=-1)
+    t = np.arange(n)
+    start, stop = np.maximum(t - lo, 0), np.minimum(t + hi + 1, n)
+    return (c[..., stop] - c[..., start]) / (stop - start)
+
+
+def _causal_fir(x, ws, weights):
+    """
+    Apply a causal filter whose weights depend on the available history.
+
+    Parameters
+    ----------
+    x : array
+        Time series or matrix of time series (countries x dates).
+    ws : int
+        Window in days.
+    weights : function
+        weights(m) returns the m weights applied to the last m days.
+
+    Returns
+    -------
+    y : array
+        Filtered series.
+    """
+    n = x.shape[-1]
+    y = np.empty_like(x)
+
+    # warm-up: fewer than ws days available
+    for t in range(min(ws - 1, n)):
+        y[..., t] = x[..., :t + 1] @ weights(t + 1)
+
+    # full windows in one pass
+    if n >= ws:
+        y[..., ws - 1:] = np.lib.stride_tricks.sliding_window_view(x, ws, axis=-1) @ weights(ws)
+    return y
+
+
+def _savgol_weights(m, po):
+    """
+    Savitzky-Golay weights evaluating the fit of the last m days at the last day.
+    """
+    if m == 1:
+        return np.ones(1)
+    import scipy.signal
+    return scipy.signal.savgol_coeffs(m, min(po, m - 1), pos=m - 1, use="dot")
+
+
+def _savgol(x, ws, po, causal):
+    """
+    Savitzky-Golay filter, centered (scipy, interp mode) or causal (end point fits).
+    """
+    if causal:
+        return _causal_fir(x, ws, lambda m: _savgol_weights(m, po))
+    import scipy.signal
+    return scipy.signal.savgol_filter(x, ws, po, axis=-1)
+
+
+def _rolling(x, ws, po, causal):
+    """
+    Rolling mean, centered or causal (trailing), shrunk at the edges.
+    """
+    if causal:
+        return _window_mean(x, ws - 1, 0)
+    return _window_mean(x, (ws - 1) // 2, ws // 2)
+
+
+def _ewma(x, ws, po, causal):
+    """
+    Exponentially weighted moving average with span ws (always causal).
+    """
+    a = 2.0 / (ws + 1)
+    if x.shape[-1] == 0:
+        return x.copy()
+    import scipy.signal
+    y, _ = scipy.signal.lfilter([a], [1, a - 1], x, axis=-1, zi=(1 - a) * x[..., :1])
+    return y
+
+
+def _ewma_step(y, x, ws):
+    a = 2.0 / (ws + 1)
+    return x if y is None else a * x + (1 - a) * y
+
+
+# kernels: batch function (x, ws, po, causal) and causal update
+#   weights(m, ws, po): weights of the last m days (finite windows)
+#   step(y, x, ws): next value from the previous one (recursive filters)
+KERNELS = {"savgol" : {"smooth": _savgol,  "weights": lambda m, ws, po: _savgol_weights(m, po)},
+           "rolling": {"smooth": _rolling, "weights": lambda m, ws, po: np.full(m, 1.0 / m)},
+           "ewma"   : {"smooth": _ewma,    "step": _ewma_step}}
+
+
+def register_kernel(name, smooth, weights=None, step=None):
+    """
+    Register a smoothing kernel.
+
+    Parameters
+    ----------
+    name : str
+        Kernel name.
+    smooth : function
+        smooth(x, ws, po, causal) smoothing x along its last axis.
+    weights : function, optional
+        weights(m, ws, po) causal weights of the last m days, used in streaming mode. The default is None.
+    step : function, optional
+        step(y, x, ws) causal recursive update, used in streaming mode. The default is None.
+    """
+    KERNELS[name] = {"smooth": smooth}
+    if weights is not None: KERNELS[name]["weights"] = weights
+    if step is not None: KERNELS[name]["step"] = step
+
+
+def _params(kernel, ws, po):
+    kernel = smoothing_settings["kernel"] if kernel is None else kernel
+    ws = smoothing_settings["ws"] if ws is None else int(ws)
+    po = smoothing_settings["po"] if po is None else int(po)
+    if kernel not in KERNELS:
+        raise KeyError("Unknown smoothing kernel: " + str(kernel))
+    return kernel, ws, po
+
+
+def smooth(x, kernel=None, ws=None, po=None, causal=False, memoize=True):
+    """
+    Smooth a time series, or every row of a country x date matrix at once.
+
+    Results are memoized per (data, kernel, parameters) so repeated calls on the
+    same series (metrics, estimations, plots) are only computed once.
+
+    Parameters
+    ----------
+    x : array
+        Time series or matrix of time series (countries x dates).
+    kernel : str, optional
+        Smoothing kernel: "savgol", "rolling" or "ewma". The default is None (smoothing_settings).
+    ws : int, optional
+        The smoothing window in days. The default is None (smoothing_settings).
+    po : int, optional
+        The smoothing polynomial order (savgol). The default is None (smoothing_settings).
+    causal : bool, optional
+        Boolean describing whether to only use past days. The default is False.
+    memoize : bool, optional
+        Boolean describing whether to memoize the result, False for large one-off arrays
+        whose hashing and copies cost more than the smoothing. The default is True.
+
+    Returns
+    -------
+    y : array
+        Smoothed series (a new array).
+    """
+    kernel, ws, po = _params(kernel, ws, po)
+    x = np.ascontiguousarray(x, dtype=np.float64)
+
+    size = smoothing_settings["cache_size"]
+    if size <= 0 or not memoize:
+        with span("smooth." + kernel):
+            return KERNELS[kernel]["smooth"](x, ws, po, causal)
+
+    # look up the memoized result
+    key = (kernel, ws, po, bool(causal), x.shape, hashlib.blake2b(x.tobytes(), digest_size=16).digest())
+    with _cache_lock:
+        y = _cache.get(key)
+        if y is not None:
+            _cache.move_to_end(key)
+            return y.copy()
+
+    with span("smooth." + kernel):
+        y = KERNELS[kernel]["smooth"](x, ws, po, causal)
+    y.flags.writeable = False
+
+    # store, dropping the least recently used results
+    with _cache_lock:
+        _cache[key] = y
+        while len(_cache) > size:
+            _cache.popitem(last=False)
+    return y.copy()
+
+
+class StreamingSmoother:
+    def __init__(self, kernel=None, ws=None, po=None):
+        """
+        Init StreamingSmoother class: causal smoothing of series growing one day at a time.
+
+        Appending days only computes the new smoothed values from the kept tail
+        (last ws days or last smoothed value), the result matches smooth(x, causal=True).
+
+        Parameters
+        ----------
+        kernel : str, optional
+            Smoothing kernel. The default is None (smoothing_settings).
+        ws : int, optional
+            The smoothing window in days. The default is None (smoothing_settings).
+        po : int, optional
+            The smoothing polynomial order. The default is None (smoothing_settings).
+        """
+        self.kernel, self.ws, self.po = _params(kernel, ws, po)
+        spec = KERNELS[self.kernel]
+        if "weights" not in spec and "step" not in spec:
+            raise ValueError("Kernel has no causal update: " + self.kernel)
+
+        # causal weights per available history length
+        self._weights = {}
+        self.n = 0
+        self._tail = None
+        self._last = None
+        self._values = []
+
+
+    def _fir(self, m):
+        if m not in self._weights:
+            self._weights[m] = KERNELS[self.kernel]["weights"](m, self.ws, self.po)
+        return self._weights[m]
+
+
+    def append(self, x):
+        """
+        Append new days and smooth them.
+
+        Parameters
+        ----------
+        x : array
+            New days (days, or countries x days), or the values of one new day (scalar or countries).
+            The first call sets the layout.
+
+        Returns
+        -------
+        y : array
+            Smoothed values of the new days.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        single = x.ndim == 0 or (self._tail is not None and x.ndim < self._tail.ndim)
+        columns = x[..., None] if single else x
+        if self._tail is None:
+            self._tail = columns[..., :0]
+
+        spec = KERNELS[self.kernel]
+        y = np.empty_like(columns)
+        for k in range(columns.shape[-1]):
+            self._tail = np.concatenate([self._tail, columns[..., k:k + 1]], axis=-1)[..., -self.ws:]
+            if "weights" in spec:
+                y[..., k] = self._tail @ self._fir(self._tail.shape[-1])
+            else:
+                self._last = spec["step"](self._last, columns[..., k], self.ws)
+                y[..., k] = self._last
+            self.n += 1
+
+        self._values.append(y)
+        return y[..., 0] if single else y
+
+
+    @property
+    def values(self):
+        """
+        Smoothed values of all the appended days.
+        """
+        if not self._values:
+            return np.zeros(0)
+        return np.concatenate(self._values, axis=-1)
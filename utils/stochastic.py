@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import numpy as np
+from .tracing import traced
+
+
+class StochasticSir:
+    def __init__(self, total_population, I0, R0, contract_rate, recovery_rate,
+                 number_of_days, n_runs=10000, substeps=4, seed=None):
+        """
+        Init the stochastic SIR model class: a binomial chain (tau-leaping) version of SirFit.
+
+        Parameters
+        ----------
+        total_population : int
+            Total count of the study population.
+        I0 : int
+            Initial number of infected.
+        R0 : int
+            Initial number of recoveries.
+        contract_rate : float
+            Contract/ disease propagation rate (beta).
+        recovery_rate : float
+            Rate of recoveries (gamma).
+        number_of_days : int
+            Number of days to simulate.
+        n_runs : int, optional
+            Number of simulated outbreaks. The default is 10000.
+        substeps : int, optional
+            Number of steps per day. The default is 4.
+        seed : int or numpy.random.SeedSequence, optional
+            Seed of the random generator. The default is None.
+        """
+        self.N = int(total_population)
+        self.I0, self.R0 = int(round(I0)), int(round(R0))
+        self.S0 = self.N - self.I0 - self.R0
+        self.beta, self.gamma = contract_rate, recovery_rate
+        self.number_of_days = number_of_days
+        self.n_runs, self.substeps = n_runs, substeps
+        self.rng = np.random.default_rng(seed)
+
+
+    @traced("sir.stochastic")
+    def simulate(self, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), major_outbreak=0.01):
+        """
+        Simulate all the outbreaks together, keeping only running statistics.
+
+        Every step, the new infections of each run are Binomial(S, 1 - exp(-beta I / N dt)) and
+        the recoveries Binomial(I, 1 - exp(-gamma dt)). The runs are advanced as arrays, the
+        daily infected counts are reduced to their quantiles over the runs.
+
+        Parameters
+        ----------
+        quantiles : tuple, optional
+            Quantiles of the summaries. The default is (0.05, 0.25, 0.5, 0.75, 0.95).
+        major_outbreak : float, optional
+            Share of the population a run has to infect to count as a major outbreak. The default is 0.01.
+
+        Returns
+        -------
+        summary : dict
+            quantiles, peak_size, peak_day and final_size (quantiles over the runs, the final size
+            counting everyone infected including I0),
+            extinction_probability (share of the runs that died out, no infected left, before infecting
+            major_outbreak of the population; the major outbreaks that burnt out are not extinctions),
+            major_outbreak_probability (share of the runs that infected at least major_outbreak of the population),
+            final_size_major (quantiles of the final size over the major outbreaks only, nan if there is none),
+            t (days) and infected (quantiles x days, daily quantiles of the infected).
+        """
+        dt = 1.0 / self.substeps
+        p_recovery = 1 - np.exp(-self.gamma * dt)
+
+        # state of every run
+        S = np.full(self.n_runs, self.S0, dtype=np.int64)
+        I = np.full(self.n_runs, self.I0, dtype=np.int64)
+        peak_size, peak_day = I.copy(), np.zeros(self.n_runs, dtype=np.int64)
+
+        infected = np.empty((len(quantiles), self.number_of_days))
+        infected[:, 0] = self.I0
+        for day in range(1, self.number_of_days):
+            # all the runs are extinct: nothing changes anymore
+            if not I.any():
+                infected[:, day:] = 0
+                break
+
+            for _ in range(self.substeps):
+                infections = self.rng.binomial(S, -np.expm1(-self.beta * dt * I / self.N))
+                recoveries = self.rng.binomial(I, p_recovery)
+                S -= infections
+                I += infections - recoveries
+
+            # running statistics
+            higher = I > peak_size
+            peak_size[higher], peak_day[higher] = I[higher], day
+            infected[:, day] = np.quantile(I, quantiles)
+
+        # no infected left is absorbing: a run that ended below the threshold died out,
+        # one above it is a major outbreak whether it burnt out or is still going
+        final_size = self.N - self.R0 - S
+        major = final_size >= major_outbreak * self.N
+        extinct = (I == 0) & ~major
+        return {"quantiles": np.asarray(quantiles),
+                "peak_size": np.quantile(peak_size, quantiles),
+                "peak_day": np.quantile(peak_day, quantiles),
+                "final_size": np.quantile(final_size, quantiles),
+                "extinction_probability": float(np.mean(extinct)),
+                "major_outbreak_probability": float(np.mean(major)),
+                "final_size_major": np.quantile(final_size[major], quantiles) if major.any() else np.full(len(quantiles), np.nan),
+                "t": np.arange(self.number_of_days),
+                "infected": infected}
+
+
+    @traced("render.sir")
+    def plot_fit(self, summary, title="Stochastic SIR model applied on Covid data", ax=None):
+        """
+        Plot the median of the infected and the bands of the other quantiles.
+
+        Parameters
+        ----------
+        summary : dict
+            Summary returned by simulate.
+        title : str, optional
+            Plot title. The default is "Stochastic SIR model applied on Covid data".
+        ax : matplotlib.axes.Axes, optional
+            Axes to draw on. The default is None (current pyplot axes).
+        """
+        if ax is None:
+            import matplotlib.pyplot as plt
+            ax = plt.gca()
+
+        t, infected, q = summary["t"], summary["infected"], summary["quantiles"]
+        for k in range(len(q) // 2):
+            ax.fill_between(t, infected[k], infected[-1 - k], color='r', alpha=0.15,
+                            label="%g%% of the runs" % (100 * (q[-1 - k] - q[k])))
+        ax.plot(t, infected[len(q) // 2], 'r', lw=1, label="Infected (median)")
+        ax.set_xlabel('Number of days')
+        ax.set_ylabel('Number of individuals')
+        ax.legend(loc='upper right')
+        ax.set_title(title)
@@ -0,0 +1,286 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import threading
+import tracemalloc
+
+
+trace_settings = {"enabled": os.environ.get("COVID_TRACE", "0").lower() in ("1", "true", "yes"),
+                  "memory" : os.environ.get("COVID_TRACE_MEMORY", "0").lower() in ("1", "true", "yes"),
+                  "output" : os.environ.get("COVID_TRACE_FILE")}
+
+# finished spans: dicts with name, args, start/duration (ns), pid, tid and memory peak
+_events = []
+_local = threading.local()
+
+
+def configure_tracing(enabled=None, memory=None, output=None):
+    """
+    Update the tracing settings.
+
+    Parameters
+    ----------
+    enabled : bool, optional
+        Boolean describing whether to record spans. The default is None (unchanged).
+    memory : bool, optional
+        Boolean describing whether to record the tracemalloc peak of each span (slower). The default is None (unchanged).
+    output : str, optional
+        File written at exit, chrome trace if it ends with .trace.json, else json. The default is None (unchanged).
+    """
+    if enabled is not None: trace_settings["enabled"] = bool(enabled)
+    if memory is not None: trace_settings["memory"] = bool(memory)
+    if output is not None: trace_settings["output"] = output
+    if trace_settings["enabled"] and trace_settings["memory"] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def reset():
+    """
+    Drop the recorded spans.
+    """
+    del _events[:]
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class _Span:
+    __slots__ = ("name", "args", "start", "base", "child_peak")
+
+    def __init__(self, name, args):
+        self.name, self.args = name, args
+
+
+    def __enter__(self):
+        self.base = self.child_peak = None
+        if trace_settings["memory"] and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+
+            # keep the peak reached so far by the enclosing span, then measure from here
+            stack = _stack()
+            if stack and stack[-1].base is not None:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            self.base, self.child_peak = current, current
+            stack.append(self)
+
+        self.start = time.perf_counter_ns()
+        return self
+
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter_ns() - self.start
+        event = {"name": self.name, "args": self.args, "start": self.start, "duration": duration,
+                 "pid": os.getpid(), "tid": threading.get_ident()}
+
+        if self.base is not None:
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            event["memory"] = peak - self.base
+
+            # report the peak to the enclosing span
+            stack = _stack()
+            stack.pop()
+            if stack and stack[-1].base is not None:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+
+        _events.append(event)
+        return False
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def span(name, **args):
+    """
+    Context manager timing a stage when tracing is enabled, a no-op otherwise.
+
+    Parameters
+    ----------
+    name : str
+        Stage name, e.g. "data.read_csv".
+    **args : dict
+        Extra values recorded with the span (url, country...).
+
+    Returns
+    -------
+    context manager
+        Span.
+    """
+    if not trace_settings["enabled"]:
+        return _null_span
+    return _Span(name, args)
+
+
+def traced(name):
+    """
+    Decorator wrapping every call of a function in a span.
+
+    Parameters
+    ----------
+    name : str
+        Stage name.
+
+    Returns
+    -------
+    function
+        Decorator.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not trace_settings["enabled"]:
+                return func(*args, **kwargs)
+            with _Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def events():
+    """
+    Get the recorded spans.
+
+    Returns
+    -------
+    list
+        Spans in the order they finished.
+    """
+    return list(_events)
+
+
+def drain():
+    """
+    Get the recorded spans and drop them (e.g. to send them from a worker process).
+
+    Returns
+    -------
+    list
+        Spans in the order they finished.
+    """
+    drained = _events[:len(_events)]
+    del _events[:len(drained)]
+    return drained
+
+
+def merge(spans):
+    """
+    Add spans recorded elsewhere (e.g. in a worker process).
+
+    Parameters
+    ----------
+    spans : list
+        Spans returned by drain.
+    """
+    _events.extend(spans)
+
+
+def summarize():
+    """
+    Aggregate the recorded spans per stage.
+
+    Returns
+    -------
+    stats : dict
+        Per stage: calls, total, mean and max seconds, and max memory peak in bytes (None if not traced).
+    """
+    stats = {}
+    for event in _events:
+        s = stats.setdefault(event["name"], {"calls": 0, "total": 0.0, "max": 0.0, "memory": None})
+        seconds = event["duration"] * 1e-9
+        s["calls"] += 1
+        s["total"] += seconds
+        s["max"] = max(s["max"], seconds)
+        if "memory" in event:
+            s["memory"] = max(s["memory"] or 0, event["memory"])
+    for s in stats.values():
+        s["mean"] = s["total"] / s["calls"]
+    return stats
+
+
+def summary_table():
+    """
+    Format the per stage summary as a text table, slowest stages first.
+
+    Returns
+    -------
+    str
+        Summary table.
+    """
+    lines = ["%-28s %7s %10s %10s %10s %11s" % ("stage", "calls", "total (s)", "mean (ms)", "max (ms)", "peak (MiB)")]
+    for name, s in sorted(summarize().items(), key=lambda item: -item[1]["total"]):
+        memory = "-" if s["memory"] is None else "%.1f" % (s["memory"] / 2 ** 20)
+        lines.append("%-28s %7d %10.4f %10.3f %10.3f %11s" % (name, s["calls"], s["total"],
+                                                               1e3 * s["mean"], 1e3 * s["max"], memory))
+    return "\n".join(lines)
+
+
+def export_json(path):
+    """
+    Write the spans and their summary as json.
+
+    Parameters
+    ----------
+    path : str
+        Output file.
+    """
+    with open(path, "w") as f:
+        json.dump({"events": _events, "summary": summarize()}, f, indent=1, default=str)
+
+
+def export_chrome_trace(path):
+    """
+    Write the spans in the Chrome trace event format (chrome://tracing, Perfetto).
+
+    Parameters
+    ----------
+    path : str
+        Output file.
+    """
+    trace = [{"name": e["name"], "ph": "X", "ts": e["start"] / 1e3, "dur": e["duration"] / 1e3,
+              "pid": e["pid"], "tid": e["tid"],
+              "args": dict(e["args"], **({"memory": e["memory"]} if "memory" in e else {}))}
+             for e in _events]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f, default=str)
+
+
+def _report():
+    """
+    Exit hook: write the output file and print the summary when tracing is enabled.
+    """
+    if not trace_settings["enabled"] or not _events:
+        return
+    output = trace_settings["output"]
+    if output:
+        if output.endswith(".trace.json"):
+            export_chrome_trace(output)
+        else:
+            export_json(output)
+    print(summary_table(), file=sys.stderr)
+
+
+atexit.register(_report)
+configure_tracing()
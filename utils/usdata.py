@@ -0,0 +1,170 @@
+#!/usr/bin/python3
+"""
+Copyright (c) 2020 Ayoub Malek
+
+This source code is licensed under the terms of the MIT license.
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import re
+import numpy as np
+import pandas as pd
+from .dataset import CovidDataset
+from .datacube import CovidCube, parse_dates
+from .tracing import span
+
+
+# region levels of the US data, finest first
+LEVELS = ("county", "state", "country")
+
+# CSSE date headers (month/day/two-digit year)
+_DATE = re.compile(r"^\d{1,2}/\d{1,2}/\d{2,4}$")
+
+
+def read_us_csse(path, chunksize=2000, dtype=np.int32):
+    """
+    Read a CSSE US time-series CSV in row chunks into a county x date cube.
+
+    Only the county metadata and one compact block of values per chunk are kept,
+    the wide table is never held as a whole nor melted.
+
+    Parameters
+    ----------
+    path : str
+        Local path of time_series_covid19_{confirmed,deaths}_US.csv.
+    chunksize : int, optional
+        Number of rows parsed at once. The default is 2000.
+    dtype : numpy.dtype, optional
+        Values dtype. The default is numpy.int32.
+
+    Returns
+    -------
+    cube : CovidCube
+        County x date cube, rows labelled by Combined_Key.
+    meta : pandas.Dataframe
+        County metadata (UID, FIPS, county, state, country, Population when available), one row per cube row.
+    """
+    header = list(pd.read_csv(path, nrows=0).columns)
+    date_columns = [c for c in header if _DATE.match(c)]
+    meta_columns = [c for c in header[:header.index(date_columns[0])]
+                    if c in ("UID", "FIPS", "Admin2", "Province_State", "Country_Region", "Combined_Key", "Population")]
+
+    metas, blocks = [], []
+    with span("data.read_csv", path=path):
+        for chunk in pd.read_csv(path, chunksize=chunksize, dtype={c: np.float64 for c in date_columns}):
+            metas.append(chunk[meta_columns])
+            blocks.append(chunk[date_columns].to_numpy(dtype=np.float64, na_value=0).astype(dtype))
+
+    meta = pd.concat(metas, ignore_index=True).rename(columns={"Admin2": "county", "Province_State": "state",
+                                                                "Country_Region": "country"})
+    values = np.concatenate(blocks) if blocks else np.zeros((0, len(date_columns)), dtype=dtype)
+    return CovidCube(meta["Combined_Key"], parse_dates(date_columns), values), meta
+
+
+class UsDataset(CovidDataset):
+    def __init__(self, urls, chunksize=2000):
+        """
+        Init UsDataset class: county level CSSE US data, rolled up to states and country.
+
+        Parameters
+        ----------
+        urls : dict
+            Mapping of the data types (confirmed_cases, death_cases) to their urls.
+        chunksize : int, optional
+            Number of CSV rows parsed at once. The default is 2000.
+        """
+        CovidDataset.__init__(self, urls)
+        self.chunksize = chunksize
+        self.meta = {}
+        self._levels = {}
+
+
+    def cube(self, data_type):
+        """
+        Get the county x date cube of a data type, downloading/parsing it on first use.
+
+        Parameters
+        ----------
+        data_type : str
+            Type of data to get.
+
+        Returns
+        -------
+        cube : CovidCube
+            County x date cube.
+        """
+        with self._lock:
+            if data_type not in self._cubes:
+                self._cubes[data_type], self.meta[data_type] = read_us_csse(self.paths()[data_type], self.chunksize)
+            return self._cubes[data_type]
+
+
+    @property
+    def counties(self):
+        """
+        County metadata, in the row order of the aligned cubes.
+        """
+        self.cubes()
+        meta = self.meta["confirmed_cases"].set_index("Combined_Key")
+
+        # population is only given in the deaths file
+        deaths = self.meta.get("death_cases")
+        if deaths is not None and "Population" in deaths:
+            meta["Population"] = deaths.set_index("Combined_Key")["Population"].reindex(meta.index)
+        return meta
+
+
+    def level_cubes(self, level="county"):
+        """
+        Get the aligned cubes of all data types at a region level.
+
+        Parameters
+        ----------
+        level : str, optional
+            Region level: "county", "state" or "country". The default is "county".
+
+        Returns
+        -------
+        cubes : dict
+            Region x date cubes per data type.
+        """
+        if level not in LEVELS:
+            raise ValueError("Unknown region level: %s (expected one of %s)" % (level, ", ".join(LEVELS)))
+        if level == "county":
+            return self.cubes()
+
+        # sum the county rows of each state/country
+        if level not in self._levels:
+            cubes = self.cubes()
+            groups = self.meta["confirmed_cases"][level].to_numpy()
+            self._levels[level] = {data_type: cube.rollup(groups) for data_type, cube in cubes.items()}
+        return self._levels[level]
+
+
+    def region_data(self, region, data_type, level="state"):
+        """
+        Get the long dataframe of a county, state or of the country.
+
+        The US files have no recovered cases, they are reported as 0.
+
+        Parameters
+        ----------
+        region : str
+            County (Combined_Key, e.g. "Autauga, Alabama, US"), state (e.g. "Alabama") or country ("US").
+        data_type : str
+            Type of data to collect.
+        level : str, optional
+            Region level: "county", "state" or "country". The default is "state".
+
+        Returns
+        -------
+        df : pandas.Dataframe
+            Dataframe with COVID-19 information (same columns as country data).
+        """
+        cubes = self.level_cubes(level)
+        cube = cubes.get(data_type, cubes["confirmed_cases"])
+        values = cube.row(region) if region in cube else cube.values[:0, 0]
+        if data_type not in cubes:
+            values = np.zeros_like(values)
+        return pd.DataFrame({"country": region,
+                             "date": cube.dates if region in cube else cube.dates[:0],
+                             "confirmed_cases": values}).reset_index(drop=True)
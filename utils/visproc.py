@@ -5,12 +5,12 @@ Copyright (c) 2020 Ayoub Malek
 This source code is licensed under the terms of the MIT license.
 For a copy, see <https://opensource.org/licenses/MIT>.
 """
-import scipy.signal
-import matplotlib.pyplot as plt
+from .smoothing import smooth as smooth_series
 
 
 def plot_data(t, y, smooth=True, label="Covid data plot",
-              color="r", ls="-", save=False, fname='confirmed_coronavirus.png'):
+              color="r", ls="-", save=False, fname='confirmed_coronavirus.png', ax=None,
+              kernel=None, ws=None, po=None):
     """
     Plot data.
 
@@ -30,20 +30,32 @@ def plot_data(t, y, smooth=True, label="Covid data plot",
         Boolean describing whether to save plot or not. The default is False.
     fname : str, optional
         Name of plot. The default is "death_rate.png".
+    ax : matplotlib.axes.Axes, optional
+        Axes to draw on. The default is None (current pyplot axes).
+    kernel : str, optional
+        Smoothing kernel (see smoothing.KERNELS). The default is None (smoothing_settings).
+    ws : int, optional
+        The smoothing window in days. The default is None (smoothing_settings).
+    po : int, optional
+        The smoothing polynomial order. The default is None (smoothing_settings).
     """
+    if ax is None:
+        import matplotlib.pyplot as plt
+        ax = plt.gca()
+
     # plot data
-    if smooth: y = scipy.signal.savgol_filter(y, 7, 3)
-    plt.plot(t, y, linestyle=ls, color=color, label=label)
-    _ = plt.xticks(rotation=45)
-    plt.legend()
+    if smooth: y = smooth_series(y, kernel, ws, po)
+    ax.plot(t, y, linestyle=ls, color=color, label=label)
+    ax.tick_params(axis="x", labelrotation=45)
+    ax.legend()
 
     # save file
     if save:
-        plt.savefig(fname)
+        ax.figure.savefig(fname)
 
 
 def plot_points_cloud(df, title, x_label, y_label, id_label,
-                      marker='x', color='red'):
+                      marker='x', color='red', ax=None):
     """
     Plot points labels graph.
 
@@ -59,17 +71,28 @@ def plot_points_cloud(df, title, x_label, y_label, id_label,
         Y-data column name.
     id_label : str
         country id.
-    marker : TYPE, optional
-        DESCRIPTION. The default is 'x'.
-    color : TYPE, optional
-        DESCRIPTION. The default is 'red'.
+    marker : str, optional
+        Points marker. The default is 'x'.
+    color : str, optional
+        Points color. The default is 'red'.
+    ax : matplotlib.axes.Axes, optional
+        Axes to draw on, nothing is shown when given. The default is None (new pyplot figure).
     """
-    ax = df.plot.scatter(x=x_label, y=y_label, c=color)
-    df[[x_label, y_label, id_label]].apply(lambda x: ax.text(*x), axis=1)
-    plt.title(title)
+    show = ax is None
+    if show:
+        import matplotlib.pyplot as plt
+        _, ax = plt.subplots()
+
+    ax.scatter(df[x_label], df[y_label], c=color, marker=marker)
+    for x, y, label in df[[x_label, y_label, id_label]].values:
+        ax.text(x, y, label)
+    ax.set_xlabel(x_label)
+    ax.set_ylabel(y_label)
+    ax.set_title(title)
 
     # scale axis
-    plt.xscale('log', basex=10)
-    plt.yscale('log', basey=10)
+    ax.set_xscale('log', base=10)
+    ax.set_yscale('log', base=10)
 
-    plt.show()
+    if show:
+        plt.show()